@@ -0,0 +1,123 @@
+"""Stage-level checkpoints for pipeline jobs.
+
+Every completed pipeline stage (and every drafted section) is written to
+``outputs/checkpoints/<job_id>/`` as JSON. A manifest records the job's
+inputs and their hash; checkpoints written for different inputs are ignored,
+so resuming a job only ever reuses work done for the same request.
+"""
+import json
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from config import get_config
+from tools.cache import make_key
+
+MANIFEST = "manifest.json"
+
+
+def _write_json(path: Path, data: Any) -> None:
+    """Write JSON atomically so a crash never leaves a torn checkpoint."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=str(path.parent), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp, path)
+    except Exception:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def _read_json(path: Path) -> Optional[Any]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+class CheckpointStore:
+    """Reads and writes the checkpoints of one job."""
+
+    def __init__(self, job_id: str, inputs: Dict[str, Any], root: Optional[str] = None):
+        """
+        Args:
+            job_id: Identifier of the job
+            inputs: Request parameters that determine the stage outputs
+            root: Checkpoint directory (default: pipeline.checkpoint_dir)
+        """
+        self.job_id = job_id
+        self.inputs = dict(inputs)
+        self.input_hash = make_key(self.inputs)
+        self.dir = Path(root or get_config()["pipeline"]["checkpoint_dir"]) / job_id
+        manifest = _read_json(self.dir / MANIFEST)
+        if manifest is None or manifest.get("input_hash") != self.input_hash:
+            manifest = {
+                "job_id": job_id,
+                "inputs": self.inputs,
+                "input_hash": self.input_hash,
+                "completed": [],
+            }
+        self.manifest = manifest
+
+    @classmethod
+    def open(cls, job_id: str, root: Optional[str] = None) -> Optional["CheckpointStore"]:
+        """Open the store of an existing job, or return None if it has none."""
+        directory = Path(root or get_config()["pipeline"]["checkpoint_dir"]) / job_id
+        manifest = _read_json(directory / MANIFEST)
+        if manifest is None:
+            return None
+        return cls(job_id, manifest["inputs"], root=root)
+
+    @classmethod
+    def remove(cls, job_id: str, root: Optional[str] = None) -> None:
+        """Delete every checkpoint of a job."""
+        shutil.rmtree(Path(root or get_config()["pipeline"]["checkpoint_dir"]) / job_id, ignore_errors=True)
+
+    def _save_manifest(self) -> None:
+        self.manifest["updated"] = time.time()
+        _write_json(self.dir / MANIFEST, self.manifest)
+
+    def completed(self) -> List[str]:
+        """Names of the stages completed for the current inputs, in order."""
+        return list(self.manifest["completed"])
+
+    def save(self, stage: str, data: Dict[str, Any]) -> None:
+        """Persist a stage's output and mark the stage completed."""
+        _write_json(self.dir / f"{stage}.json", {"input_hash": self.input_hash, "data": data})
+        if stage not in self.manifest["completed"]:
+            self.manifest["completed"].append(stage)
+        self._save_manifest()
+
+    def load(self, stage: str) -> Optional[Dict[str, Any]]:
+        """Return a stage's saved output, or None if it must be recomputed."""
+        if stage not in self.manifest["completed"]:
+            return None
+        record = _read_json(self.dir / f"{stage}.json")
+        if record is None or record.get("input_hash") != self.input_hash:
+            return None
+        return record["data"]
+
+    def save_section(self, name: str, data: Dict[str, Any]) -> None:
+        """Persist one drafted section before the drafting stage completes."""
+        _write_json(self.dir / "sections" / f"{make_key(name)[:16]}.json",
+                    {"input_hash": self.input_hash, "name": name, "data": data})
+
+    def load_sections(self) -> Dict[str, Dict[str, Any]]:
+        """Drafted sections saved for the current inputs, keyed by section name."""
+        sections = {}
+        for path in (self.dir / "sections").glob("*.json"):
+            record = _read_json(path)
+            if record and record.get("input_hash") == self.input_hash:
+                sections[record["name"]] = record["data"]
+        return sections
+
+    def ensure_manifest(self) -> None:
+        """Write the manifest so the job can be resumed even before its first stage ends."""
+        if not (self.dir / MANIFEST).exists():
+            self._save_manifest()
@@ -1,4 +1,4 @@
-from google.adk.agents import Agent
+from agents.factory import AgentSpec
 
 _citation_prompt = """
 You are the Citation Specialist for an academic paper. Your task is to add citations to the drafted text and create a corresponding reference list.
@@ -21,9 +21,11 @@ You are the Citation Specialist for an academic paper. Your task is to add citat
 - Ensure the numbering in the text matches the final reference list.
 """
 
-citation_agent = Agent(
+citation_spec = AgentSpec(
     name="citation_agent",
     model="gemini-2.5-flash-preview-04-17", # Consider more powerful model if needed
     description="Adds IEEE numeric citations to drafted text and generates a numbered reference list based *only* on provided sources.",
     instruction=_citation_prompt,
-) 
\ No newline at end of file
+)
+
+citation_agent = citation_spec.build() 
@@ -1,19 +1,21 @@
-from google.adk.agents import Agent
+from agents.factory import AgentSpec
 from agents.outline_agent import outline_agent
 from agents.literature_agent import literature_agent
 from agents.drafting_agent import drafting_agent
 from agents.citation_agent import citation_agent
 from agents.formatting_agent import formatting_agent
+from agents.drafting_scheduler import draft_sections
+from tools.retrieval import select_papers
 
 _coordinator_prompt = """
 You are the Research Coordinator, orchestrating the creation of an academic paper.
 
 **Workflow & Data Flow:**
 1.  **Outline:** On receiving the research topic, delegate to `outline_agent` to get the paper outline.
-2.  **Literature Review:** Pass the outline to `literature_agent`. It will return a JSON list of 50 relevant source papers.
-3.  **Drafting (Iterative):** For each section in the outline:
-    *   Pass the specific outline section AND the **full list of 50 source papers** to `drafting_agent`.
-    *   Receive the drafted text for that section (which should be grounded ONLY in the sources).
+2.  **Literature Review:** Pass the topic AND the full outline to `literature_agent`. It searches every outline section concurrently and will return a JSON list of 50 relevant source papers.
+3.  **Drafting (Concurrent):**
+    *   Call the `draft_sections_func` tool ONCE with the topic and the full outline. It drafts every section concurrently with `drafting_agent`, grounding each section in the source papers most relevant to it, and returns the drafts in outline order.
+    *   For any section listed under "failed" (or for every section if the tool returns an error), fall back to drafting it yourself: call `select_papers_func` with the section name and its outline bullet points, then pass the outline section AND **only the selected papers** to `drafting_agent`. If `select_papers_func` also returns an error, pass the full list of 50 source papers instead.
 4.  **Citation:** Once all sections are drafted:
     *   Assemble the complete drafted text.
     *   Pass the **complete drafted text** AND the **original list of 50 source papers** to `citation_agent`.
@@ -24,13 +26,18 @@ You are the Research Coordinator, orchestrating the creation of an academic pape
     *   **Crucially, explicitly instruct `formatting_agent` to call the `paper_to_pdf` tool** with the provided dictionary and filename.
 6.  **Completion:** Once `formatting_agent` confirms PDF generation (returning the filename), respond to the user confirming completion and stating the output filename.
 
-**Important:** Ensure the list of 50 source papers is consistently passed between relevant stages (literature -> drafting -> citation).
+**Important:** Ensure the list of 50 source papers is passed to `citation_agent` in full; drafting only needs the per-section selection.
 """
 
-coordinator_agent = Agent(
+coordinator_spec = AgentSpec(
     name="research_coordinator",
     model="gemini-2.5-flash-preview-04-17",
     description="Top‑level orchestrator that delegates stages and manages data flow for research paper generation.",
     instruction=_coordinator_prompt,
+    sub_agents=("outline_agent", "literature_agent", "drafting_agent", "citation_agent", "formatting_agent"),
+    tools=(draft_sections, select_papers),
+)
+
+coordinator_agent = coordinator_spec.build(
     sub_agents=[outline_agent, literature_agent, drafting_agent, citation_agent, formatting_agent],
-)
\ No newline at end of file
+)
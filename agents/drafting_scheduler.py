@@ -0,0 +1,236 @@
+"""Concurrent section drafting.
+
+Sections of a paper are drafted independently from the same source list, so
+there is no reason to send them to drafting_agent one after another. The
+scheduler dispatches every section on a bounded thread pool, retries failed
+sections individually with exponential backoff, and returns the drafts in
+outline order regardless of completion order. ``draft_streaming`` does the
+same while literature results are still arriving, starting each section as
+soon as the searches behind it have returned.
+"""
+import json
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from google.adk.tools import FunctionTool, ToolContext
+
+from agents.drafting_agent import drafting_agent
+from agents.factory import MODEL_STATE_KEY, get_agent
+from agents.runtime import run_agent
+from callbacks.tracing import propagating
+from config import get_config
+from tools.literature_fanout import LiteratureStream
+from tools.outline_utils import is_content_section, parse_outline_sections
+from tools.retrieval import PAPERS_STATE_KEY, get_retriever
+
+# Paper fields that drafting needs; the rest only cost prompt tokens
+DRAFTING_PAPER_FIELDS = ("title", "authors", "abstract", "arxiv_id", "published_date")
+
+
+@dataclass
+class SectionDraft:
+    """The outcome of drafting one section."""
+
+    name: str
+    text: str = ""
+    papers: List[Dict[str, Any]] = field(default_factory=list)
+    attempts: int = 0
+    error: str = ""
+
+    @property
+    def ok(self) -> bool:
+        return not self.error
+
+
+def drafting_message(topic: str, section: Dict[str, str], papers: List[Dict[str, Any]]) -> str:
+    """Build the drafting_agent input for one section."""
+    sources = [{k: p.get(k) for k in DRAFTING_PAPER_FIELDS if p.get(k)} for p in papers]
+    return (
+        f"Section: {section['name']}\n"
+        f"Topic: {topic}\n"
+        f"Outline for this section:\n{section.get('text', '').strip()}\n\n"
+        f"Source papers (JSON):\n{json.dumps(sources, indent=1)}"
+    )
+
+
+class DraftingScheduler:
+    """Drafts outline sections concurrently with per-section retries."""
+
+    def __init__(
+        self,
+        agent=None,
+        max_concurrency: Optional[int] = None,
+        max_retries: Optional[int] = None,
+        retry_backoff: Optional[float] = None,
+        top_k: Optional[int] = None,
+        run: Callable[..., str] = run_agent,
+    ):
+        """
+        Args:
+            agent: Agent used for drafting (default: drafting_agent)
+            max_concurrency: Maximum sections drafted at once
+            max_retries: Extra attempts for a section after its first failure
+            retry_backoff: Base delay in seconds, doubled after each retry
+            top_k: Papers selected per section; 0 passes the full list
+            run: Callable with run_agent's signature, used to invoke the agent
+        """
+        settings = get_config()["pipeline"]["drafting"]
+        self.agent = agent or drafting_agent
+        self.max_concurrency = max_concurrency or settings["max_concurrency"]
+        self.max_retries = settings["max_retries"] if max_retries is None else max_retries
+        self.retry_backoff = settings["retry_backoff_seconds"] if retry_backoff is None else retry_backoff
+        self.top_k = get_config()["tools"]["retrieval"]["top_k"] if top_k is None else top_k
+        self.run = run
+
+    def _draft_one(self, topic: str, section: Dict[str, str], papers: List[Dict[str, Any]]) -> SectionDraft:
+        draft = SectionDraft(name=section["name"], papers=papers)
+        message = drafting_message(topic, section, papers)
+        for attempt in range(self.max_retries + 1):
+            draft.attempts = attempt + 1
+            try:
+                draft.text = self.run(self.agent, message, state={"section_name": section["name"]})
+                draft.error = ""
+                return draft
+            except Exception as e:
+                draft.error = str(e) or type(e).__name__
+                print(f"Drafting '{section['name']}' failed (attempt {draft.attempts}): {draft.error}")
+                if attempt < self.max_retries:
+                    time.sleep(self.retry_backoff * (2 ** attempt))
+        return draft
+
+    def _task(
+        self,
+        topic: str,
+        select: Callable[[str], List[Dict[str, Any]]],
+        on_section_done: Optional[Callable[[SectionDraft], None]],
+    ) -> Callable[[Dict[str, str]], SectionDraft]:
+        def task(section: Dict[str, str]) -> SectionDraft:
+            draft = self._draft_one(topic, section, select(f"{section['name']} {section.get('text', '')}"))
+            if on_section_done is not None:
+                on_section_done(draft)
+            return draft
+        return propagating(task)
+
+    def draft(
+        self,
+        topic: str,
+        sections: List[Dict[str, str]],
+        papers: List[Dict[str, Any]],
+        on_section_done: Optional[Callable[[SectionDraft], None]] = None,
+    ) -> List[SectionDraft]:
+        """
+        Draft every section and return the results in the given order.
+
+        Args:
+            topic: The research topic
+            sections: Section dictionaries from parse_outline_sections
+            papers: The job's full literature list
+            on_section_done: Optional callback invoked as each section finishes
+
+        Returns:
+            One SectionDraft per section, in the same order as ``sections``
+        """
+        retriever = get_retriever(papers) if papers and self.top_k else None
+        task = self._task(topic, lambda query: retriever.top_k(query, self.top_k) if retriever else papers,
+                          on_section_done)
+        if not sections:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(sections))) as pool:
+            return list(pool.map(task, sections))
+
+    def draft_streaming(
+        self,
+        topic: str,
+        sections: List[Dict[str, str]],
+        stream: LiteratureStream,
+        on_section_done: Optional[Callable[[SectionDraft], None]] = None,
+        on_literature_done: Optional[Callable[[], None]] = None,
+    ) -> List[SectionDraft]:
+        """
+        Draft every section while the literature search is still running.
+
+        A section is started as soon as ``stream.ready`` reports that the
+        searches for it have returned, grounded in the top-k papers collected
+        so far. Sections still waiting when the stream ends start then.
+
+        Args:
+            topic: The research topic
+            sections: Section dictionaries from parse_outline_sections
+            stream: Literature results, consumed by this call
+            on_section_done: Optional callback invoked as each section finishes
+            on_literature_done: Optional callback invoked once the stream is
+                exhausted; an exception raised there cancels sections that
+                have not started and is propagated
+
+        Returns:
+            One SectionDraft per section, in the same order as ``sections``
+        """
+        if not self.top_k:
+            # Every section needs the full list anyway
+            for _ in stream:
+                pass
+            if on_literature_done is not None:
+                on_literature_done()
+            return self.draft(topic, sections, stream.papers(), on_section_done)
+
+        task = self._task(topic, lambda query: stream.top_k(query, self.top_k), on_section_done)
+        futures: Dict[int, Future] = {}
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_concurrency, len(sections)))) as pool:
+            def submit_ready() -> None:
+                for i, section in enumerate(sections):
+                    if i not in futures and stream.ready(section):
+                        futures[i] = pool.submit(task, section)
+
+            try:
+                for _ in stream:
+                    if len(stream):
+                        submit_ready()
+                if on_literature_done is not None:
+                    on_literature_done()
+                submit_ready()
+            except BaseException:
+                for future in futures.values():
+                    future.cancel()
+                wait(futures.values())
+                raise
+            return [futures[i].result() for i in range(len(sections))]
+
+
+def draft_sections_func(topic: str, outline: str, tool_context: Optional[ToolContext] = None) -> Dict[str, Any]:
+    """Draft every content section of the outline concurrently with drafting_agent.
+
+    Each section is grounded only in the source papers most relevant to it,
+    selected from the literature list gathered earlier in this job.
+
+    Args:
+        topic: The research topic
+        outline: Full outline text from the outline agent
+
+    Returns:
+        Dictionary with "sections" (name and drafted text, in outline order)
+        and "failed" (names of sections that could not be drafted)
+    """
+    state = tool_context.state if tool_context is not None else {}
+    papers = state.get(PAPERS_STATE_KEY)
+    if not papers:
+        return {
+            "status": "error",
+            "message": "No literature list stored for this job; draft sections with drafting_agent instead.",
+        }
+    sections = [s for s in parse_outline_sections(outline) if is_content_section(s["name"])]
+    model = state.get(MODEL_STATE_KEY)
+    scheduler = DraftingScheduler(agent=get_agent("drafting_agent", model) if model else None)
+    drafts = scheduler.draft(topic, sections, papers)
+    return {
+        "status": "success" if all(d.ok for d in drafts) else "partial",
+        "sections": [{"name": d.name, "text": d.text} for d in drafts if d.ok],
+        "failed": [d.name for d in drafts if not d.ok],
+    }
+
+
+# Create the FunctionTool instance
+draft_sections = FunctionTool(
+    func=draft_sections_func,
+)
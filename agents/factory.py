@@ -0,0 +1,129 @@
+"""Immutable agent specifications and a cached agent factory.
+
+Each agent module declares its configuration once as a frozen ``AgentSpec``.
+Callers that need an agent tree with a different model ask the factory for
+one instead of deep-copying and mutating the shared module-level agents.
+Trees are built from the specs on first request and cached per
+(agent, model), so concurrent jobs reuse the same read-only tree and never
+race on each other's settings.
+"""
+import threading
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Mapping, Optional, Sequence, Tuple
+
+from google.adk.agents import Agent
+
+from callbacks import metrics, tracing
+
+
+def _chain(*callbacks: Callable[..., Any]) -> Callable[..., Any]:
+    """Combine ADK callbacks; the first non-None result wins, as with a single callback."""
+
+    def run(**kwargs: Any) -> Any:
+        for callback in callbacks:
+            result = callback(**kwargs)
+            if result is not None:
+                return result
+        return None
+
+    return run
+
+
+# Tracing spans for agents, model calls and tools, plus per-agent token metrics
+AGENT_CALLBACKS = {
+    **tracing.AGENT_CALLBACKS,
+    "after_model_callback": _chain(tracing.after_model, metrics.after_model),
+}
+
+
+# Session state key naming the model a job's agent tree was built with, so
+# tools that run agents themselves (e.g. draft_sections) use the same model
+MODEL_STATE_KEY = "agent_model"
+
+
+@dataclass(frozen=True)
+class AgentSpec:
+    """Everything needed to build one agent; sub-agents are referenced by name."""
+
+    name: str
+    model: str
+    description: str
+    instruction: str
+    tools: Tuple[Any, ...] = ()
+    sub_agents: Tuple[str, ...] = ()
+
+    def build(self, model: Optional[str] = None, sub_agents: Sequence[Agent] = ()) -> Agent:
+        """
+        Create a new Agent from this spec, with the tracing and metrics callbacks attached.
+
+        Args:
+            model: Model overriding the spec's default
+            sub_agents: Already built sub-agents; they must not have a parent yet
+
+        Returns:
+            A freshly constructed Agent
+        """
+        return Agent(
+            name=self.name,
+            model=model or self.model,
+            description=self.description,
+            instruction=self.instruction,
+            tools=list(self.tools),
+            sub_agents=list(sub_agents),
+            **AGENT_CALLBACKS,
+        )
+
+
+_specs: Optional[Mapping[str, AgentSpec]] = None
+_agents: Dict[Tuple[str, Optional[str]], Agent] = {}
+_lock = threading.Lock()
+
+
+def agent_specs() -> Mapping[str, AgentSpec]:
+    """Return the read-only registry of every agent spec, keyed by agent name."""
+    global _specs
+    if _specs is None:
+        # Imported lazily: the agent modules themselves import AgentSpec from here
+        from agents.citation_agent import citation_spec
+        from agents.coordinator import coordinator_spec
+        from agents.drafting_agent import drafting_spec
+        from agents.formatting_agent import formatting_spec
+        from agents.literature_agent import literature_spec
+        from agents.outline_agent import outline_spec
+
+        specs = (coordinator_spec, outline_spec, literature_spec, drafting_spec, citation_spec, formatting_spec)
+        _specs = MappingProxyType({spec.name: spec for spec in specs})
+    return _specs
+
+
+def _build_tree(name: str, model: Optional[str]) -> Agent:
+    spec = agent_specs()[name]
+    # Sub-agents are always new instances: an ADK agent can only have one parent
+    sub_agents = [_build_tree(sub_name, model) for sub_name in spec.sub_agents]
+    return spec.build(model=model, sub_agents=sub_agents)
+
+
+def get_agent(name: str, model: Optional[str] = None) -> Agent:
+    """
+    Return the agent tree rooted at ``name`` configured for ``model``.
+
+    The tree is built once per (name, model) and shared afterwards; treat it
+    as read-only.
+
+    Args:
+        name: Agent name, e.g. "research_coordinator"
+        model: Model used by every agent in the tree; None keeps each spec's default
+
+    Returns:
+        The cached Agent
+
+    Raises:
+        KeyError: If no spec is registered under ``name``
+    """
+    key = (name, model)
+    with _lock:
+        agent = _agents.get(key)
+        if agent is None:
+            agent = _agents[key] = _build_tree(name, model)
+        return agent
@@ -1,4 +1,4 @@
-from google.adk.agents import Agent
+from agents.factory import AgentSpec
 from tools.pdf_export import tex_to_pdf, paper_to_pdf
 
 _formatting_prompt = """
@@ -28,10 +28,12 @@ paper_to_pdf(paper_content=your_structured_dict, output_filename="research_paper
 The success of the entire research process depends on you properly structuring the content and explicitly calling paper_to_pdf with the right parameters.
 """
 
-formatting_agent = Agent(
+formatting_spec = AgentSpec(
     name="formatting_agent",
     model="gemini-2.5-flash-preview-04-17",
     description="Renders the finished manuscript into PDF using the paper_to_pdf tool with precise dictionary structure.",
     instruction=_formatting_prompt,
-    tools=[tex_to_pdf, paper_to_pdf]
-)
\ No newline at end of file
+    tools=(tex_to_pdf, paper_to_pdf)
+)
+
+formatting_agent = formatting_spec.build()
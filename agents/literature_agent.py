@@ -1,18 +1,23 @@
-from google.adk.agents import Agent
+from agents.factory import AgentSpec
 from tools.arxiv_search import search_arxiv
-from tools.semantic_scholar import search_semantic
+from tools.literature_fanout import search_literature
+from tools.local_corpus import search_local_corpus
 
-literature_agent = Agent(
+literature_spec = AgentSpec(
     name="literature_agent",
     model="gemini-2.5-flash-preview-04-17",
-    description="Fetches and summarizes relevant prior work specifically from arXiv.",
+    description="Fetches relevant prior work from arXiv and Semantic Scholar with one query per outline section.",
     instruction=(
         "Your goal is to gather a comprehensive list of relevant research for the given topic/outline. "
-        "1. **Use the 'search_arxiv' tool EXCLUSIVELY.** Do NOT use semantic scholar."
-        "2. **Search for exactly 50 papers.** Ensure the tool's limit parameter is set to 50."
+        "1. **Call the 'search_literature_func' tool ONCE** with the research topic, the FULL outline text, and max_results set to 50. "
+        "It searches every outline section concurrently and returns a merged, deduplicated list. "
+        "2. Only if it returns fewer than 50 papers, top up using a more specific query: first with 'search_local_corpus_func' "
+        "(an offline index, free to call, empty if none has been built), then with 'search_arxiv_func'."
         "3. **Focus on relevance** to the research topic and outline sections provided."
         "4. **Return a JSON list** of the 50 papers found. Each item must include keys: 'title', 'authors', 'abstract', 'arxiv_id', 'published_date'."
         "5. **Crucially, the downstream drafting agent MUST ground its writing in these 50 papers.** This list is the foundation for the entire research paper."
     ),
-    tools=[search_arxiv] # Only allow arXiv search tool
-) 
\ No newline at end of file
+    tools=(search_literature, search_local_corpus, search_arxiv)
+)
+
+literature_agent = literature_spec.build()
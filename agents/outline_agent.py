@@ -1,6 +1,6 @@
-from google.adk.agents import Agent
+from agents.factory import AgentSpec
 
-outline_agent = Agent(
+outline_spec = AgentSpec(
     name="outline_agent",
     model="gemini-2.5-flash-preview-04-17",  # higher‑quality model for planning
     description="Drafts a detailed section‑by‑section outline for an academic research paper.",
@@ -10,4 +10,6 @@ outline_agent = Agent(
         "Results, Discussion, Conclusion, and References placeholder. Each heading "
         "should include bullet‑level talking points to guide subsequent drafting."
     ),
-) 
\ No newline at end of file
+)
+
+outline_agent = outline_spec.build() 
@@ -0,0 +1,419 @@
+"""Deterministic research pipeline.
+
+The coordinator agent decides stage order itself and shuttles the literature
+list through its own context for every delegation. This module runs the same
+stages as plain Python calls instead:
+
+    outline -> literature -> drafting -> citation -> formatting
+
+Only outline, drafting and citation involve an LLM. Literature search and PDF
+formatting are direct tool calls, and data moves between stages as typed
+results rather than through coordinator turns. With
+``pipeline.drafting.early_start`` the literature and drafting stages
+overlap: literature results stream in and a section is drafted once the
+searches behind it have returned. When given a CheckpointStore,
+each stage's result is persisted as it completes and restored on the next
+run, so an interrupted job resumes from its last completed stage.
+"""
+import json
+import re
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from agents.checkpoints import CheckpointStore
+from agents.drafting_scheduler import DraftingScheduler, SectionDraft
+from agents.factory import get_agent
+from agents.runtime import run_agent
+from callbacks.metrics import STAGE_DURATION
+from callbacks.tracing import NOOP_SPAN, current_span, get_tracer, span
+from config import get_config
+from tools.literature_fanout import LiteratureStream, search_literature_func
+from tools.outline_utils import is_content_section, parse_outline_sections
+from tools.pdf_export import render_paper
+from tools.template_utils import escape_latex
+
+STAGES = ("outline", "literature", "drafting", "citation", "formatting")
+
+# Template keys for the section names outline_agent usually produces
+SECTION_KEYS = {
+    "abstract": "abstract",
+    "introduction": "introduction",
+    "related work": "related_work",
+    "literature review": "related_work",
+    "background": "related_work",
+    "methodology": "methodology",
+    "methods": "methodology",
+    "method": "methodology",
+    "experiments": "experiments",
+    "experimental setup": "experiments",
+    "results": "results",
+    "discussion": "discussion",
+    "limitations": "limitations",
+    "future work": "future_work",
+    "conclusion": "conclusion",
+    "conclusions": "conclusion",
+}
+
+_TITLE_LINE = re.compile(r"^\W*title\s*[:\-]\W*(\S.*)$", re.IGNORECASE | re.MULTILINE)
+_REFERENCE_LINE = re.compile(r"^\s*\[(\d+)\]\s*(.+?)\s*$")
+_BOLD = re.compile(r"\*\*(.+?)\*\*")
+
+
+class PipelineError(RuntimeError):
+    """Raised when a pipeline stage cannot produce its output."""
+
+
+@dataclass
+class OutlineResult:
+    title: str
+    text: str
+    sections: List[Dict[str, str]]
+
+
+@dataclass
+class LiteratureResult:
+    papers: List[Dict[str, Any]]
+
+
+@dataclass
+class DraftsResult:
+    sections: List[Dict[str, str]]
+
+
+@dataclass
+class CitationResult:
+    sections: List[Dict[str, str]]
+    references: List[str]
+
+
+@dataclass
+class PipelineResult:
+    output_file: str
+    paper_content: Dict[str, Any]
+    timings: Dict[str, float] = field(default_factory=dict)
+
+
+def extract_title(outline_text: str, sections: List[Dict[str, str]], topic: str) -> str:
+    """Find the paper title in the outline, falling back to the topic."""
+    for section in sections:
+        if section["name"].lower() == "title" and section["text"].strip():
+            return section["text"].strip().splitlines()[0].strip("-*# ")
+    match = _TITLE_LINE.search(outline_text)
+    if match:
+        return match.group(1).strip("* ")
+    return topic
+
+
+def split_marked_sections(text: str) -> List[Tuple[str, str]]:
+    """Split text on '## ' heading lines into (name, body) pairs."""
+    parts: List[Tuple[str, str]] = []
+    for line in text.splitlines():
+        if line.startswith("## "):
+            parts.append((line[3:].strip(), ""))
+        elif parts:
+            name, body = parts[-1]
+            parts[-1] = (name, body + line + "\n")
+    return [(name, body.strip()) for name, body in parts]
+
+
+def to_latex(text: str) -> str:
+    """Convert lightly formatted model output into LaTeX body text."""
+    lines = []
+    for line in text.splitlines():
+        stripped = line.strip()
+        if stripped.startswith("#"):
+            lines.append(f"\\subsection*{{{escape_latex(stripped.lstrip('#').strip())}}}")
+        else:
+            lines.append(_BOLD.sub(r"\\textbf{\1}", escape_latex(line)))
+    return "\n".join(lines)
+
+
+def build_paper_content(title: str, sections: List[Dict[str, str]], references: List[str]) -> Dict[str, Any]:
+    """
+    Map drafted sections onto the keys paper_to_pdf expects.
+
+    Sections without a dedicated template slot are appended to the preceding
+    section as an unnumbered subsection so no drafted content is lost.
+    """
+    content: Dict[str, Any] = {"title": escape_latex(title)}
+    previous = "introduction"
+    for section in sections:
+        key = SECTION_KEYS.get(section["name"].strip().lower())
+        body = to_latex(section["text"])
+        if key is None:
+            key = previous
+            body = f"\\subsection*{{{escape_latex(section['name'])}}}\n{body}"
+        content[key] = f"{content[key]}\n\n{body}" if content.get(key) else body
+        previous = key
+    content["references"] = "\n".join(
+        f"\\bibitem{{ref{i}}} {escape_latex(reference)}" for i, reference in enumerate(references, 1)
+    )
+    return content
+
+
+def job_checkpoints(
+    job_id: str,
+    topic: str,
+    output_filename: str,
+    model: Optional[str] = None,
+    template: Optional[str] = None,
+    renderer: Optional[str] = None,
+) -> CheckpointStore:
+    """
+    Open the checkpoint store for a pipeline job with the given inputs.
+
+    Every setting that changes a stage's output is part of the inputs, so a
+    job resumed under a different model, template or renderer starts over
+    instead of reusing stages produced with the old ones.
+
+    Args:
+        job_id: Identifier of the job
+        topic: Research topic
+        output_filename: Name of the PDF
+        model: Model used by every agent; None keeps each agent's default
+        template: LaTeX template (default: paper.template)
+        renderer: "latex" or "fast" (default: paper.renderer)
+    """
+    config = get_config()
+    return CheckpointStore(job_id, {
+        "topic": topic,
+        "output_filename": output_filename,
+        "max_papers": config["pipeline"]["max_papers"],
+        "model": model,
+        "template": template or config["paper"]["template"],
+        "renderer": renderer or config["paper"]["renderer"],
+    })
+
+
+class ResearchPipeline:
+    """Runs the research stages as direct Python calls."""
+
+    def __init__(
+        self,
+        on_event: Optional[Callable[[str, str], None]] = None,
+        max_papers: Optional[int] = None,
+        checkpoints: Optional[CheckpointStore] = None,
+        output_dir: Optional[Path] = None,
+        renderer: Optional[str] = None,
+        model: Optional[str] = None,
+    ):
+        """
+        Args:
+            on_event: Optional callback receiving (stage, message) progress updates
+            max_papers: Size of the literature list (default: pipeline.max_papers)
+            checkpoints: Optional store used to persist and restore stage results
+            output_dir: Directory the PDF and its debug files are written to
+                (default: the shared outputs directory)
+            renderer: "latex" or "fast" (default: paper.renderer)
+            model: Model used by every agent; None keeps each agent's default
+        """
+        self.on_event = on_event
+        self.max_papers = max_papers or get_config()["pipeline"]["max_papers"]
+        self.checkpoints = checkpoints
+        self.output_dir = output_dir
+        self.renderer = renderer
+        self.model = model
+        self.timings: Dict[str, float] = {}
+
+    def emit(self, stage: str, message: str) -> None:
+        if self.on_event is not None:
+            self.on_event(stage, message)
+
+    def _timed(self, stage: str, func: Callable[..., Any], *args: Any) -> Any:
+        self.emit(stage, f"Starting {stage} stage")
+        start = time.perf_counter()
+        with span(f"stage {stage}", **{"pipeline.stage": stage}):
+            result = func(*args)
+        self.timings[stage] = time.perf_counter() - start
+        STAGE_DURATION.observe(self.timings[stage], stage=stage)
+        self.emit(stage, f"Finished {stage} stage in {self.timings[stage]:.1f}s")
+        return result
+
+    def _stage(self, stage: str, result_type: type, func: Callable[..., Any], *args: Any) -> Any:
+        """Restore a stage's result from its checkpoint, or run and checkpoint it."""
+        if self.checkpoints is not None:
+            saved = self.checkpoints.load(stage)
+            if saved is not None:
+                self.emit(stage, f"Restored {stage} stage from checkpoint")
+                return result_type(**saved)
+        result = self._timed(stage, func, *args)
+        if self.checkpoints is not None:
+            self.checkpoints.save(stage, asdict(result))
+        return result
+
+    def outline_stage(self, topic: str) -> OutlineResult:
+        text = run_agent(get_agent("outline_agent", self.model), topic)
+        sections = parse_outline_sections(text)
+        content_sections = [s for s in sections if is_content_section(s["name"])]
+        if not content_sections:
+            # Unparseable outline: draft the configured sections from the raw text
+            content_sections = [
+                {"name": name, "text": text}
+                for name in get_config()["paper"]["section_order"]
+                if is_content_section(name)
+            ]
+        return OutlineResult(
+            title=extract_title(text, sections, topic),
+            text=text,
+            sections=content_sections,
+        )
+
+    def literature_stage(self, topic: str, outline: OutlineResult) -> LiteratureResult:
+        papers = search_literature_func(topic, outline.text, max_results=self.max_papers)
+        if not papers:
+            raise PipelineError("Literature search returned no papers")
+        self.emit("literature", f"Collected {len(papers)} source papers")
+        return LiteratureResult(papers=papers)
+
+    def _restored_sections(self) -> Dict[str, Dict[str, str]]:
+        # Sections drafted before an interruption are not sent to the model again
+        done = self.checkpoints.load_sections() if self.checkpoints is not None else {}
+        if done:
+            self.emit("drafting", f"Restored {len(done)} drafted section(s) from checkpoint")
+        return done
+
+    def _on_section_done(self, draft: SectionDraft) -> None:
+        if draft.ok and self.checkpoints is not None:
+            self.checkpoints.save_section(draft.name, {"name": draft.name, "text": draft.text})
+        self.emit(
+            "drafting",
+            f"Drafted section '{draft.name}'" if draft.ok else f"Section '{draft.name}' failed: {draft.error}",
+        )
+
+    def _drafts_result(
+        self, outline: OutlineResult, done: Dict[str, Dict[str, str]], drafts: List[SectionDraft]
+    ) -> DraftsResult:
+        failed = [d.name for d in drafts if not d.ok]
+        if failed:
+            raise PipelineError(f"Drafting failed for sections: {', '.join(failed)}")
+        done.update((d.name, {"name": d.name, "text": d.text}) for d in drafts)
+        return DraftsResult(sections=[done[s["name"]] for s in outline.sections])
+
+    def drafting_stage(self, topic: str, outline: OutlineResult, literature: LiteratureResult) -> DraftsResult:
+        done = self._restored_sections()
+        pending = [s for s in outline.sections if s["name"] not in done]
+        scheduler = DraftingScheduler(agent=get_agent("drafting_agent", self.model))
+        drafts = scheduler.draft(topic, pending, literature.papers, on_section_done=self._on_section_done)
+        return self._drafts_result(outline, done, drafts)
+
+    def streaming_stages(self, topic: str, outline: OutlineResult) -> Tuple[LiteratureResult, DraftsResult]:
+        """
+        Run the literature and drafting stages concurrently.
+
+        Literature results are indexed as they arrive, and each section is
+        drafted once the searches for it have returned. Both stage timings
+        start together: literature ends when the last search returns,
+        drafting when the last section is drafted.
+        """
+        done = self._restored_sections()
+        pending = [s for s in outline.sections if s["name"] not in done]
+        stream = LiteratureStream(topic, outline.text)
+        scheduler = DraftingScheduler(agent=get_agent("drafting_agent", self.model))
+        tracer = get_tracer()
+        literature_span = (
+            tracer.start_span("stage literature", parent=current_span(), **{"pipeline.stage": "literature"})
+            if tracer is not None else NOOP_SPAN
+        )
+
+        def on_literature_done() -> None:
+            self.timings["literature"] = time.perf_counter() - start
+            STAGE_DURATION.observe(self.timings["literature"], stage="literature")
+            literature_span.set_attribute("literature.papers", len(stream))
+            literature_span.end()
+            if not len(stream):
+                raise PipelineError("Literature search returned no papers")
+            self.emit("literature", f"Finished literature stage in {self.timings['literature']:.1f}s")
+
+        self.emit("literature", "Starting literature stage")
+        self.emit("drafting", "Starting drafting stage as literature results arrive")
+        start = time.perf_counter()
+        with span("stage drafting", **{"pipeline.stage": "drafting", "pipeline.early_start": True}):
+            try:
+                drafts = scheduler.draft_streaming(
+                    topic, pending, stream,
+                    on_section_done=self._on_section_done, on_literature_done=on_literature_done,
+                )
+            finally:
+                literature_span.end()
+            # Papers a draft was grounded in stay citable even if they fall past the cap
+            literature = LiteratureResult(
+                papers=stream.papers(self.max_papers, keep=[p for d in drafts for p in d.papers])
+            )
+            self.emit("literature", f"Collected {len(literature.papers)} source papers")
+            if self.checkpoints is not None:
+                self.checkpoints.save("literature", asdict(literature))
+            result = self._drafts_result(outline, done, drafts)
+        self.timings["drafting"] = time.perf_counter() - start
+        STAGE_DURATION.observe(self.timings["drafting"], stage="drafting")
+        self.emit("drafting", f"Finished drafting stage in {self.timings['drafting']:.1f}s")
+        if self.checkpoints is not None:
+            self.checkpoints.save("drafting", asdict(result))
+        return literature, result
+
+    def citation_stage(self, drafts: DraftsResult, literature: LiteratureResult) -> CitationResult:
+        draft_text = "\n\n".join(f"## {s['name']}\n{s['text']}" for s in drafts.sections)
+        sources = [
+            {"n": i, "title": p.get("title"), "authors": p.get("authors"),
+             "arxiv_id": p.get("arxiv_id"), "published_date": p.get("published_date")}
+            for i, p in enumerate(literature.papers, 1)
+        ]
+        message = (
+            "Drafted paper (each section starts with a '## ' heading):\n\n"
+            f"{draft_text}\n\n"
+            "Source papers (JSON, use the given numbers 'n' as citation numbers):\n"
+            f"{json.dumps(sources, indent=1)}\n\n"
+            "Return the complete text with inline IEEE citations, keeping every '## ' heading unchanged, "
+            "and finish with a '## References' section listing one reference per line in the form "
+            "'[n] Authors, \"Title,\" arXiv:ID, Year.'"
+        )
+        reply = dict(split_marked_sections(run_agent(get_agent("citation_agent", self.model), message)))
+        references = []
+        for line in reply.pop("References", "").splitlines():
+            match = _REFERENCE_LINE.match(line)
+            if match:
+                references.append(match.group(2))
+        # Keep the uncited draft for any section the model dropped
+        sections = [{"name": s["name"], "text": reply.get(s["name"]) or s["text"]} for s in drafts.sections]
+        return CitationResult(sections=sections, references=references)
+
+    def formatting_stage(self, title: str, citation: CitationResult, output_filename: str) -> PipelineResult:
+        paper_content = build_paper_content(title, citation.sections, citation.references)
+        output_file = render_paper(
+            paper_content, output_filename=output_filename, output_dir=self.output_dir, renderer=self.renderer
+        )
+        return PipelineResult(output_file=output_file, paper_content=paper_content)
+
+    def run(self, topic: str, output_filename: str = "research_paper.pdf") -> PipelineResult:
+        """
+        Generate a paper end to end.
+
+        Args:
+            topic: The research topic
+            output_filename: Name of the PDF written to the outputs directory
+
+        Stages already recorded in ``checkpoints`` are restored instead of run.
+
+        Returns:
+            PipelineResult with the output filename, structured content and
+            per-stage wall times in seconds
+        """
+        if self.checkpoints is not None:
+            self.checkpoints.ensure_manifest()
+        outline = self._stage("outline", OutlineResult, self.outline_stage, topic)
+        early_start = get_config()["pipeline"]["drafting"]["early_start"]
+        if early_start and (self.checkpoints is None or self.checkpoints.load("literature") is None):
+            literature, drafts = self.streaming_stages(topic, outline)
+        else:
+            literature = self._stage("literature", LiteratureResult, self.literature_stage, topic, outline)
+            drafts = self._stage("drafting", DraftsResult, self.drafting_stage, topic, outline, literature)
+        citation = self._stage("citation", CitationResult, self.citation_stage, drafts, literature)
+        # Rendering is cheap and writes outside the checkpoint directory, so it
+        # always runs; the structured content is still checkpointed for reuse.
+        result = self._timed("formatting", self.formatting_stage, outline.title, citation, output_filename)
+        if self.checkpoints is not None:
+            self.checkpoints.save("formatting", {"output_file": result.output_file,
+                                                 "paper_content": result.paper_content})
+        result.timings = dict(self.timings)
+        return result
@@ -0,0 +1,130 @@
+"""Helpers for invoking a single agent directly, outside the coordinator.
+
+Replies are memoized in the shared response cache, keyed on the agent's
+name, model and instruction and on the exact input (message and session
+state). Re-running a topic therefore replays identical sub-agent calls from
+disk instead of sending them to the model again.
+"""
+import uuid
+from typing import Any, Dict, Optional
+
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+from callbacks.tracing import span, trace_state
+from tools.cache import get_response_cache, make_key
+
+APP_NAME = "ai_researcher"
+
+
+class AgentRunError(RuntimeError):
+    """Raised when an agent run produces no usable response."""
+
+
+def event_text(event) -> str:
+    """Extract the text of the first content part of an ADK event, if any."""
+    if not (event.content and event.content.parts):
+        return ""
+    first_part = event.content.parts[0]
+    if isinstance(first_part, dict):
+        return first_part.get("text") or ""
+    return getattr(first_part, "text", None) or ""
+
+
+def detached(agent):
+    """
+    Return a copy of a sub-agent that runs as its own root.
+
+    Sub-agents keep a reference to the coordinator; running one directly
+    would otherwise let the model transfer control back up the tree.
+    """
+    if getattr(agent, "parent_agent", None) is None:
+        return agent
+    return agent.model_copy(update={
+        "parent_agent": None,
+        "disallow_transfer_to_parent": True,
+        "disallow_transfer_to_peers": True,
+    })
+
+
+def response_key(agent, message: str, state: Optional[Dict[str, Any]] = None) -> str:
+    """Build the response cache key for one agent call."""
+    model = getattr(agent, "model", "")
+    model_name = model if isinstance(model, str) else getattr(model, "model", type(model).__name__)
+    instruction = agent.instruction if isinstance(agent.instruction, str) else repr(agent.instruction)
+    return make_key(
+        agent.name,
+        model_name,
+        make_key(instruction),
+        make_key(message, state or {}),
+    )
+
+
+def run_agent(
+    agent,
+    message: str,
+    state: Optional[Dict[str, Any]] = None,
+    user_id: str = "LOCAL_USER",
+    use_cache: bool = True,
+) -> str:
+    """
+    Run one agent on one message in a fresh session and return its reply.
+
+    Args:
+        agent: The ADK agent to run
+        message: User message sent to the agent
+        state: Initial session state, e.g. values for instruction placeholders
+        user_id: User ID recorded on the session
+        use_cache: Set to False to bypass the response cache for this call;
+            the cache is also bypassed when pipeline.response_cache is disabled
+
+    Returns:
+        The text of the agent's final response(s)
+
+    Raises:
+        AgentRunError: If the agent finished without any final text
+    """
+    with span(f"run {agent.name}", **{"agent.name": agent.name, "message.chars": len(message)}) as run_span:
+        cache = get_response_cache() if use_cache else None
+        key = response_key(agent, message, state) if cache is not None else None
+        if cache is not None:
+            cached = cache.get(key)
+            run_span.set_attribute("cache.hit", cached is not None)
+            if cached is not None:
+                return cached
+
+        reply = _run_uncached(agent, message, state, user_id)
+        run_span.set_attribute("reply.chars", len(reply))
+        if cache is not None:
+            try:
+                cache.set(key, reply)
+            except Exception as e:
+                print(f"Could not cache response of '{agent.name}': {e}")
+        return reply
+
+
+def _run_uncached(agent, message: str, state: Optional[Dict[str, Any]], user_id: str) -> str:
+    session_service = InMemorySessionService()
+    session_id = f"session_{uuid.uuid4().hex}"
+    session_service.create_session(
+        app_name=APP_NAME,
+        user_id=user_id,
+        # The trace parent is not part of the cache key: it differs on every call
+        state={**(state or {}), **trace_state()},
+        session_id=session_id,
+    )
+    runner = Runner(agent=detached(agent), app_name=APP_NAME, session_service=session_service)
+    content = types.Content(role="user", parts=[types.Part(text=message)])
+
+    replies = []
+    # Runner.run swallows errors raised in its worker thread and simply
+    # stops yielding, so an empty reply is the only failure signal.
+    for event in runner.run(user_id=user_id, session_id=session_id, new_message=content):
+        if event.author == agent.name and event.is_final_response():
+            text = event_text(event)
+            if text:
+                replies.append(text)
+    if not replies:
+        raise AgentRunError(f"Agent '{agent.name}' returned no response")
+    return "\n".join(replies).strip()
@@ -3,20 +3,33 @@
 import os
 import json
 import time
-import threading
-import queue
+import uuid
 from pathlib import Path
-from flask import Flask, request, jsonify, send_file, send_from_directory
+from flask import Flask, Response, request, jsonify, send_file, send_from_directory, stream_with_context
 from flask_cors import CORS
+from werkzeug.utils import safe_join
 from dotenv import load_dotenv
 
 # Load environment
 load_dotenv()
 
 # Import core components
-from agents.coordinator import coordinator_agent
+from agents.checkpoints import CheckpointStore
+from agents.factory import MODEL_STATE_KEY, get_agent
+from callbacks import metrics
+from callbacks.tracing import SERVER, span, trace_state
 from config import get_config, load_config_from_file
+from server.events import EventBroker, EventLog
+from server.job_queue import COMPLETED, ERROR, QUEUED, RUNNING, JobQueue, QueueFullError
 from tools.arxiv_search import search_arxiv_func  # Direct function for testing
+from tools.cache import get_response_cache, get_search_cache
+from tools.compile_pool import get_compile_pool
+from tools.http_client import get_http_client
+from tools.pdf_cache import get_pdf_cache
+from tools.pdf_export import (
+    OUTPUT_DIR_STATE_KEY, RENDERER_STATE_KEY, RENDERERS, job_output_dir, remove_job_output, safe_filename
+)
+from tools.rate_limit import circuit_states
 
 # Create Flask app
 app = Flask(__name__)
@@ -30,24 +43,17 @@ config = load_config_from_file()
 output_dir = Path(config["output"]["output_dir"])
 output_dir.mkdir(exist_ok=True, parents=True)
 
-OUTPUTS_FOLDER = os.path.join(os.getcwd(), 'outputs')
+OUTPUTS_FOLDER = str(job_output_dir())
 
-# Active jobs tracking
-active_jobs = {}
-message_queues = {}
+# Replayable status updates per job, read by /api/status and /api/events;
+# finished jobs' logs are periodically spilled to disk to bound memory
+events = EventBroker()
+events.start_reaper()
 
-def update_agent_models_recursively(agent, model_name):
-    """Recursively update the model for an agent and all its sub-agents."""
-    # Update this agent's model
-    agent.model = model_name
-    print(f"Updated agent '{agent.name}' to use model: {model_name}")
-    
-    # Update all sub-agents recursively if they exist
-    if hasattr(agent, 'sub_agents') and agent.sub_agents:
-        for sub_agent in agent.sub_agents:
-            update_agent_models_recursively(sub_agent, model_name)
+# Model used by every agent in coordinator-mode jobs
+MODEL_NAME = "gemini-2.5-flash-preview-04-17"
 
-def generate_paper(job_id, topic, output_filename):
+def generate_paper(job_id, topic, output_filename, mode="coordinator", renderer=None):
     """Background worker to generate a paper"""
     
     # Import here to avoid import errors until needed
@@ -63,39 +69,59 @@ def generate_paper(job_id, topic, output_filename):
             
     try:
         # Log start
-        message_queues[job_id].put({
+        events.publish(job_id, {
             "status": "running",
             "message": f"Starting research on topic: {topic}"
         })
         
+        if mode == "pipeline":
+            # Code-driven stages; no coordinator round-trips. Completed stages
+            # are checkpointed so the job can be resumed via /api/resume.
+            from agents.pipeline import ResearchPipeline, job_checkpoints
+            
+            def on_event(stage, message):
+                events.publish(job_id, {
+                    "status": "running",
+                    "stage": stage,
+                    "message": message
+                })
+            
+            checkpoints = job_checkpoints(job_id, topic, output_filename, renderer=renderer)
+            ResearchPipeline(
+                on_event=on_event,
+                checkpoints=checkpoints,
+                output_dir=job_output_dir(job_id),
+                renderer=renderer
+            ).run(topic, output_filename)
+        
         # Initialize with updated ADK pattern
-        if 'Runner' in locals():
+        elif 'Runner' in locals():
             # Use newer ADK pattern
             from google.adk.sessions import InMemorySessionService
-            from google.adk.agents import Agent
-            from copy import deepcopy
-            
-            # Define the model to use
-            MODEL_NAME = "gemini-2.5-flash-preview-04-17"
             
-            # Create a modified version of the coordinator agent
-            modified_agent = deepcopy(coordinator_agent)
-            
-            # Recursively update all models in the agent hierarchy
-            update_agent_models_recursively(modified_agent, MODEL_NAME)
+            # Shared, read-only coordinator tree configured for MODEL_NAME
+            # (built once per model by the agent factory)
+            agent = get_agent("research_coordinator", MODEL_NAME)
             
             # Create session service and runner
             session_service = InMemorySessionService()
             runner = Runner(
-                agent=modified_agent,
+                agent=agent,
                 app_name="ai_researcher",
                 session_service=session_service
             )
             
             # Create a unique session for this job
+            # (the PDF tools write into this job's output directory)
             session = session_service.create_session(
                 app_name="ai_researcher",
                 user_id=f"API_USER_{job_id}",
+                state={
+                    OUTPUT_DIR_STATE_KEY: job_id,
+                    RENDERER_STATE_KEY: renderer,
+                    MODEL_STATE_KEY: MODEL_NAME,
+                    **trace_state()
+                },
                 session_id=f"session_{job_id}"
             )
             
@@ -119,18 +145,13 @@ def generate_paper(job_id, topic, output_filename):
                         message = first_part.text
                     
                     if message:
-                        message_queues[job_id].put({
+                        events.publish(job_id, {
                             "status": "running",
                             "message": message
                         })
         else:
             # Use original AdkApp pattern if available
-            app = AdkApp(agent=coordinator_agent)
-            # Override the model to use
-            MODEL_NAME = "gemini-2.5-flash-preview-04-17"
-            
-            # Recursively update all models in the agent hierarchy
-            update_agent_models_recursively(app.agent, MODEL_NAME)
+            app = AdkApp(agent=get_agent("research_coordinator", MODEL_NAME))
             
             # Run the agent with original pattern
             for event in app.stream_query(
@@ -146,13 +167,13 @@ def generate_paper(job_id, topic, output_filename):
                         message = first_part.text
                     
                     if message:
-                        message_queues[job_id].put({
+                        events.publish(job_id, {
                             "status": "running",
                             "message": message
                         })
         
         # Debugging: Check if file is present before completing
-        full_output_path = os.path.join(OUTPUTS_FOLDER, output_filename)
+        full_output_path = os.path.join(job_output_dir(job_id), output_filename)
         print(f"Checking for output file: {full_output_path}")
         
         # If file doesn't exist, create a simple dummy PDF for testing
@@ -164,11 +185,13 @@ def generate_paper(job_id, topic, output_filename):
                 try:
                     from reportlab.pdfgen import canvas
                     
-                    # Create a simple PDF with the topic
-                    c = canvas.Canvas(full_output_path)
+                    # Create a simple PDF with the topic, renamed into place when complete
+                    partial_path = f"{full_output_path}.partial"
+                    c = canvas.Canvas(partial_path)
                     c.drawString(100, 750, f"Research on: {topic}")
                     c.drawString(100, 700, "This is a placeholder PDF while we debug the issue.")
                     c.save()
+                    os.replace(partial_path, full_output_path)
                     print(f"Successfully created dummy PDF at {full_output_path}")
                 except ImportError:
                     # If reportlab is not available, create an empty file
@@ -182,23 +205,52 @@ def generate_paper(job_id, topic, output_filename):
             print(f"Output file exists at: {full_output_path}")
                 
         # Complete
-        message_queues[job_id].put({
+        events.publish(job_id, {
             "status": "completed",
             "message": f"Research paper generation complete!",
-            "output_file": output_filename
+            # Relative to the outputs directory
+            "output_file": f"{job_id}/{output_filename}"
         })
         
     except Exception as e:
         # Handle errors
         error_message = f"Error generating paper: {str(e)}"
         print(f"Error in generate_paper: {error_message}")
-        message_queues[job_id].put({
+        events.publish(job_id, {
             "status": "error",
             "message": error_message
         })
-    
-    # Mark job as inactive
-    active_jobs[job_id] = False
+        # Let the job queue record the failure
+        raise
+
+def run_job(job_id, topic, output_filename, mode="coordinator", **options):
+    """Job queue handler: generate a paper under the job's root trace span"""
+    metrics.JOBS_STARTED.inc(mode=mode)
+    try:
+        with span("job", SERVER, **{"job.id": job_id, "job.mode": mode}), metrics.JOB_DURATION.time(mode=mode):
+            generate_paper(job_id, topic, output_filename, mode, **options)
+    except Exception:
+        metrics.JOBS_FAILED.inc(mode=mode)
+        raise
+    metrics.JOBS_COMPLETED.inc(mode=mode)
+
+def remove_job_files(job_id):
+    """Delete everything a pruned job left on disk: events, checkpoints and outputs"""
+    events.discard(job_id)
+    CheckpointStore.remove(job_id)
+    remove_job_output(job_id)
+
+# Bounded worker pool draining the persistent job queue
+job_queue = JobQueue(handler=run_job, on_prune=remove_job_files)
+
+def queue_full_response(error):
+    """429 response telling the client when to retry"""
+    response = jsonify({
+        "status": "error",
+        "message": f"Server is busy ({error}); please retry later"
+    })
+    response.headers["Retry-After"] = str(config["server"]["job_queue"]["retry_after_seconds"])
+    return response, 429
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
@@ -218,63 +270,181 @@ def start_job():
             "message": "Topic is required"
         }), 400
     
-    # Generate job ID based on timestamp
-    job_id = str(int(time.time()))
+    mode = data.get('mode', config["pipeline"]["mode"])
+    if mode not in ("coordinator", "pipeline"):
+        return jsonify({
+            "status": "error",
+            "message": "Mode must be 'coordinator' or 'pipeline'"
+        }), 400
     
-    # Set output filename
-    output_filename = data.get('filename', config["output"]["default_pdf_name"])
-    output_path = output_dir / output_filename
+    # "fast" skips LaTeX for a quick preview PDF
+    renderer = data.get('renderer', config["paper"]["renderer"])
+    if renderer not in RENDERERS:
+        return jsonify({
+            "status": "error",
+            "message": "Renderer must be 'latex' or 'fast'"
+        }), 400
+    
+    # Unique job ID; every job writes into its own outputs/<job_id>/ directory
+    job_id = uuid.uuid4().hex
     
-    # Create message queue for this job
-    message_queues[job_id] = queue.Queue()
+    # Set output filename (a plain basename inside the job directory)
+    output_filename = safe_filename(data.get('filename') or config["output"]["default_pdf_name"])
     
-    # Start job in background thread
-    active_jobs[job_id] = True
-    thread = threading.Thread(
-        target=generate_paper,
-        args=(job_id, topic, output_filename),
-        daemon=True
-    )
-    thread.start()
+    # Queue the job for the worker pool
+    try:
+        position = job_queue.submit(job_id, topic, output_filename, mode, {"renderer": renderer})
+    except QueueFullError as e:
+        return queue_full_response(e)
     
     return jsonify({
         "status": "started",
         "job_id": job_id,
+        "mode": mode,
+        "renderer": renderer,
+        "queue_position": position,
         "message": f"Started research on topic: {topic}"
     })
 
+@app.route('/api/resume/<job_id>', methods=['POST'])
+def resume_job(job_id):
+    """Resume an interrupted pipeline job from its last completed stage"""
+    job = job_queue.get(job_id)
+    if job and job["status"] in (QUEUED, RUNNING):
+        return jsonify({
+            "status": "error",
+            "message": "Job is still running"
+        }), 409
+    
+    checkpoints = CheckpointStore.open(job_id)
+    if checkpoints is None:
+        return jsonify({
+            "status": "error",
+            "message": "No checkpoints found for job (only pipeline-mode jobs can be resumed)"
+        }), 404
+    
+    topic = checkpoints.inputs["topic"]
+    output_filename = checkpoints.inputs["output_filename"]
+    # The resumed run renders as the original did, so its checkpoints stay valid
+    options = dict(job["options"]) if job else {}
+    if checkpoints.inputs.get("renderer"):
+        options["renderer"] = checkpoints.inputs["renderer"]
+    
+    # Updates of the resumed run are appended to the job's existing event log
+    try:
+        position = job_queue.submit(job_id, topic, output_filename, "pipeline", options)
+    except QueueFullError as e:
+        return queue_full_response(e)
+    
+    return jsonify({
+        "status": "resumed",
+        "job_id": job_id,
+        "mode": "pipeline",
+        "queue_position": position,
+        "completed_stages": checkpoints.completed(),
+        "message": f"Resumed research on topic: {topic}"
+    })
+
 @app.route('/api/status/<job_id>', methods=['GET'])
 def job_status(job_id):
-    """Get status updates for a job"""
-    if job_id not in message_queues:
+    """Get status updates for a job
+    
+    Without parameters each update is returned once, to whichever poller asks
+    first. Pass ?since=<event id> to read the log with your own cursor instead.
+    """
+    job = job_queue.get(job_id)
+    if job is None:
         return jsonify({
             "status": "error",
             "message": "Job not found"
         }), 404
     
-    # Collect all available messages
-    messages = []
-    try:
-        while not message_queues[job_id].empty():
-            messages.append(message_queues[job_id].get_nowait())
-    except queue.Empty:
-        pass
+    # Only live jobs get a fresh log; finished ones are reloaded from disk if evicted
+    log = events.log(job_id, create=job["status"] in (QUEUED, RUNNING)) or EventLog()
+    since = request.args.get('since', type=int)
+    updates = log.drain() if since is None else log.since(since)
     
     # Return status
     return jsonify({
         "job_id": job_id,
-        "active": active_jobs.get(job_id, False),
-        "updates": messages
+        "active": job["status"] in (QUEUED, RUNNING),
+        "state": job["status"],
+        "queue_position": job_queue.position(job_id),
+        "updates": [update for _, update in updates],
+        "last_event_id": updates[-1][0] if updates else (log.last_id if since is None else since)
     })
 
-@app.route('/api/download/<filename>', methods=['GET'])
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    """List jobs newest first (?page=, ?per_page=, ?status=)"""
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 20, type=int), 1), 100)
+    status = request.args.get('status')
+    if status is not None and status not in (QUEUED, RUNNING, COMPLETED, ERROR):
+        return jsonify({
+            "status": "error",
+            "message": "Status must be one of queued, running, completed, error"
+        }), 400
+    
+    jobs, total = job_queue.list(offset=(page - 1) * per_page, limit=per_page, status=status)
+    for job in jobs:
+        job["queue_position"] = job_queue.position(job["job_id"]) if job["status"] == QUEUED else 0
+    return jsonify({
+        "jobs": jobs,
+        "page": page,
+        "per_page": per_page,
+        "total": total,
+        "pages": (total + per_page - 1) // per_page
+    })
+
+@app.route('/api/events/<job_id>', methods=['GET'])
+def job_events(job_id):
+    """Stream a job's status updates as Server-Sent Events
+    
+    Every subscriber receives every update. Reconnecting clients send the
+    standard Last-Event-ID header (or ?last_event_id=) to replay only what
+    they missed. The stream ends after the job completes or fails.
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({
+            "status": "error",
+            "message": "Job not found"
+        }), 404
+    # A finished job whose events are gone has nothing to stream
+    live = job["status"] in (QUEUED, RUNNING)
+    has_log = events.log(job_id, create=live) is not None
+    
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id') or 0
+    try:
+        last_event_id = int(last_event_id)
+    except ValueError:
+        last_event_id = 0
+    
+    def stream():
+        yield "retry: 3000\n\n"
+        for item in events.subscribe(job_id, last_event_id) if has_log else ():
+            if item is None:
+                # Comment line keeps proxies from closing an idle connection
+                yield ": keep-alive\n\n"
+                continue
+            event_id, update = item
+            yield f"id: {event_id}\nevent: update\ndata: {json.dumps(update)}\n\n"
+        yield "event: end\ndata: {}\n\n"
+    
+    return Response(stream_with_context(stream()), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+@app.route('/api/download/<path:filename>', methods=['GET'])
 def download_file(filename):
-    """Download a generated PDF file"""
-    # Use the OUTPUTS_FOLDER constant defined above
-    file_path = Path(OUTPUTS_FOLDER) / filename
+    """Download a generated PDF file (e.g. <job_id>/research_paper.pdf)"""
+    # safe_join refuses paths that escape the outputs directory
+    file_path = safe_join(OUTPUTS_FOLDER, filename)
     
-    if not file_path.exists():
-        print(f"ERROR: File {file_path} not found")
+    if file_path is None or not os.path.isfile(file_path):
+        print(f"ERROR: File {filename} not found")
         return jsonify({
             "status": "error",
             "message": f"File {filename} not found"
@@ -283,7 +453,7 @@ def download_file(filename):
     # Return the file directly
     return send_file(file_path, as_attachment=True)
 
-@app.route('/outputs/<filename>')
+@app.route('/outputs/<path:filename>')
 def serve_output_file(filename):
     """Serve files from the outputs directory."""
     try:
@@ -298,6 +468,82 @@ def serve_output_file(filename):
         print(f"ERROR: File {filename} not found in outputs directory")
         return jsonify({"error": "File not found"}), 404
 
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    """Hit/miss counters for the shared caches (?name=search, responses or pdf)"""
+    name = request.args.get('name', 'search')
+    caches = {"search": get_search_cache, "responses": get_response_cache, "pdf": get_pdf_cache}
+    if name not in caches:
+        return jsonify({
+            "status": "error",
+            "message": "Cache name must be 'search', 'responses' or 'pdf'"
+        }), 400
+    cache = caches[name]()
+    if cache is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **cache.stats()})
+
+@app.route('/api/compile/stats', methods=['GET'])
+def compile_stats():
+    """Queue depth and counters of the shared LaTeX compile pool"""
+    return jsonify(get_compile_pool().stats())
+
+@app.route('/api/http/stats', methods=['GET'])
+def http_stats():
+    """Request and connection counters of the shared literature HTTP client"""
+    return jsonify({**get_http_client().stats(), "circuits": circuit_states()})
+
+def cache_lookups():
+    """Hit/miss totals of the shared caches, keyed by metric labels"""
+    totals = {}
+    for name, get_cache in (("search", get_search_cache), ("responses", get_response_cache), ("pdf", get_pdf_cache)):
+        cache = get_cache()
+        if cache is not None:
+            stats = cache.stats()
+            totals[metrics.labels(cache=name, result="hit")] = stats["hits"]
+            totals[metrics.labels(cache=name, result="miss")] = stats["misses"]
+    return totals
+
+def compile_pool_reading(*names):
+    """Read the given compile pool counters as metric values"""
+    def read():
+        stats = get_compile_pool().stats()
+        return {metrics.labels(state=name): stats[name] for name in names}
+    return read
+
+# Scrape-time readings of values their owners already track
+metrics.REGISTRY.reading(
+    "research_job_queue_jobs", "Jobs in the persistent queue by status.",
+    lambda: {metrics.labels(status=status): count for status, count in job_queue.depth().items()}
+)
+metrics.REGISTRY.reading(
+    "research_compile_pool_compiles", "LaTeX compiles waiting or running in the compile pool.",
+    compile_pool_reading("queued", "running")
+)
+metrics.REGISTRY.reading(
+    "research_compile_pool_compiles_total", "LaTeX compiles finished by the compile pool, by outcome.",
+    compile_pool_reading("completed", "failed", "timed_out"), kind="counter"
+)
+metrics.REGISTRY.reading(
+    "research_http_connections_total", "Connections used by the shared HTTP client, opened or reused from the pool.",
+    lambda: {metrics.labels(event=event): get_http_client().stats()[f"connections_{event}"]
+             for event in ("opened", "reused")},
+    kind="counter"
+)
+metrics.REGISTRY.reading(
+    "research_search_circuit_open", "1 while a literature API's circuit breaker is failing calls fast.",
+    lambda: {metrics.labels(source=source): int(state == "open") for source, state in circuit_states().items()}
+)
+metrics.REGISTRY.reading(
+    "research_cache_lookups_total", "Lookups in the shared caches by cache and result.",
+    cache_lookups, kind="counter"
+)
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Counters and histograms in the Prometheus text format"""
+    return Response(metrics.REGISTRY.exposition(), content_type=metrics.CONTENT_TYPE)
+
 @app.route('/api/test/arxiv', methods=['GET'])
 def test_arxiv():
     """Test endpoint for arXiv search"""
@@ -318,4 +564,8 @@ def test_arxiv():
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
+    # With the debug reloader only the serving child runs jobs; elsewhere the
+    # workers start on the first submission
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        job_queue.start()
     app.run(host='0.0.0.0', port=port, debug=True)
\ No newline at end of file
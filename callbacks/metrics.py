@@ -0,0 +1,285 @@
+"""Process-wide counters and histograms exposed in the Prometheus text format.
+
+Recording is on the hot path of every search, compile and model call, so it
+takes no lock: each thread updates its own shard (a plain dict reached
+through ``threading.local``) and only the scrape merges them. A lock is taken
+once per thread, when its shard is created, and during collection. Shards of
+threads that have exited are folded into a retired shard at scrape time, so
+short-lived pool threads do not accumulate.
+
+Values that something else already tracks (queue depth, cache hit counters)
+are not recorded at all; they are read from their owner when ``/metrics`` is
+scraped.
+"""
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Label sets are stored as sorted (name, value) tuples
+Labels = Tuple[Tuple[str, str], ...]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(labels: Labels, extra: Labels = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    escaped = (
+        '{}="{}"'.format(name, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in pairs
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+class _Shard:
+    """One thread's samples: counter totals and histogram [bucket counts..., sum, count]."""
+
+    __slots__ = ("values", "thread", "__weakref__")
+
+    def __init__(self, thread: Optional[threading.Thread]):
+        self.values: Dict[Tuple[str, Labels], Any] = {}
+        self.thread = weakref.ref(thread) if thread is not None else None
+
+    @property
+    def alive(self) -> bool:
+        thread = self.thread() if self.thread is not None else None
+        return thread is not None and thread.is_alive()
+
+    def merge_into(self, totals: Dict[Tuple[str, Labels], Any]) -> None:
+        # dict() and list() copies are atomic under the GIL, so the owning
+        # thread may keep recording while we read
+        for key, value in dict(self.values).items():
+            if isinstance(value, list):
+                value = list(value)
+                current = totals.get(key)
+                totals[key] = value if current is None else [a + b for a, b in zip(current, value)]
+            else:
+                totals[key] = totals.get(key, 0) + value
+
+
+class Counter:
+    """Monotonically increasing total, optionally split by labels."""
+
+    kind = "counter"
+
+    def __init__(self, registry: "MetricsRegistry", name: str, documentation: str):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        values = self.registry._shard().values
+        key = (self.name, _labels(labels))
+        values[key] = values.get(key, 0) + amount
+
+
+class Histogram:
+    """Distribution of observed values over fixed cumulative buckets."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        registry: "MetricsRegistry",
+        name: str,
+        documentation: str,
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels: Any) -> None:
+        values = self.registry._shard().values
+        key = (self.name, _labels(labels))
+        sample = values.get(key)
+        if sample is None:
+            sample = values[key] = [0] * (len(self.buckets) + 2)
+        # Per-bucket (non-cumulative) counts; the exposition accumulates them
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                sample[i] += 1
+                break
+        sample[-2] += value
+        sample[-1] += 1
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        """Observe the wall time of the enclosed block, whether or not it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+
+class Reading:
+    """Values read from their owner at scrape time, e.g. a queue depth."""
+
+    def __init__(self, name: str, documentation: str, read: Callable[[], Dict[Labels, float]], kind: str):
+        self.name = name
+        self.documentation = documentation
+        self.read = read
+        self.kind = kind
+
+
+class MetricsRegistry:
+    """Holds metric definitions and the per-thread shards they record into."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+        self._local = threading.local()
+        self._shards: List[_Shard] = []
+        self._retired = _Shard(None)
+        self._lock = threading.Lock()
+
+    def _register(self, metric: Any) -> Any:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if existing.kind != metric.kind:
+                    raise ValueError(f"Metric {metric.name} is already registered as a {existing.kind}")
+                if not isinstance(metric, Reading):
+                    return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str) -> Counter:
+        return self._register(Counter(self, name, documentation))
+
+    def histogram(self, name: str, documentation: str, buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(self, name, documentation, buckets))
+
+    def reading(
+        self,
+        name: str,
+        documentation: str,
+        read: Callable[[], Dict[Labels, float]],
+        kind: str = "gauge",
+    ) -> Reading:
+        """
+        Register (or replace) a metric whose values are read at scrape time.
+
+        Args:
+            name: Metric name
+            documentation: HELP text
+            read: Returns {labels: value}; build label keys with ``labels()``
+            kind: "gauge", or "counter" for totals kept by the owner
+        """
+        return self._register(Reading(name, documentation, read, kind))
+
+    def _shard(self) -> _Shard:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = _Shard(threading.current_thread())
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def collect(self) -> Tuple[Dict[Tuple[str, Labels], Any], Dict[str, Any]]:
+        """Merge every thread's samples; returns ({(metric, labels): value}, {name: metric})."""
+        with self._lock:
+            live = []
+            for shard in self._shards:
+                if shard.alive:
+                    live.append(shard)
+                else:
+                    # The thread is gone, so nothing writes to this shard any more
+                    shard.merge_into(self._retired.values)
+            self._shards = live
+            totals: Dict[Tuple[str, Labels], Any] = {}
+            self._retired.merge_into(totals)
+            for shard in live:
+                shard.merge_into(totals)
+            metrics = dict(self._metrics)
+        return totals, metrics
+
+    def exposition(self) -> str:
+        """Render every metric in the Prometheus text exposition format (0.0.4)."""
+        totals, metrics = self.collect()
+        by_metric: Dict[str, List[Tuple[Labels, Any]]] = {}
+        for (name, labels), value in totals.items():
+            by_metric.setdefault(name, []).append((labels, value))
+
+        lines = []
+        for name in sorted(metrics):
+            metric = metrics[name]
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            if isinstance(metric, Reading):
+                try:
+                    samples = sorted(metric.read().items())
+                except Exception as e:
+                    print(f"Could not read metric {name}: {e}")
+                    samples = []
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+            elif metric.kind == "counter":
+                for labels, value in sorted(by_metric.get(name, [])):
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+            else:
+                for labels, sample in sorted(by_metric.get(name, [])):
+                    cumulative = 0
+                    for bound, count in zip(metric.buckets, sample):
+                        cumulative += count
+                        le = (("le", _format_value(bound)),)
+                        lines.append(f"{name}_bucket{_format_labels(labels, le)} {cumulative}")
+                    lines.append(f"{name}_bucket{_format_labels(labels, (('le', '+Inf'),))} {sample[-1]}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(sample[-2])}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {sample[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+def labels(**values: Any) -> Labels:
+    """Build the label key used in gauge readings."""
+    return _labels(values)
+
+
+REGISTRY = MetricsRegistry()
+
+JOBS_STARTED = REGISTRY.counter("research_jobs_started_total", "Jobs picked up by a worker.")
+JOBS_COMPLETED = REGISTRY.counter("research_jobs_completed_total", "Jobs that produced their paper.")
+JOBS_FAILED = REGISTRY.counter("research_jobs_failed_total", "Jobs that ended with an error.")
+JOB_DURATION = REGISTRY.histogram("research_job_duration_seconds", "Wall time of a job, start to finish.")
+STAGE_DURATION = REGISTRY.histogram("research_stage_duration_seconds", "Wall time of each pipeline stage.")
+SEARCH_DURATION = REGISTRY.histogram(
+    "research_search_duration_seconds", "Latency of literature API calls (cache misses only), by source."
+)
+SEARCH_RETRIES = REGISTRY.counter(
+    "research_search_retries_total", "Literature API requests retried after a transient failure, by source and reason."
+)
+PDFLATEX_DURATION = REGISTRY.histogram("research_pdflatex_duration_seconds", "Wall time of each engine run.")
+LLM_REQUESTS = REGISTRY.counter("research_llm_requests_total", "Model responses received, by agent.")
+LLM_TOKENS = REGISTRY.counter(
+    "research_llm_tokens_total", "Tokens reported by the model, by agent and type (prompt, completion)."
+)
+
+
+def after_model(callback_context: Any, llm_response: Any) -> None:
+    """ADK after-model callback counting responses and reported tokens per agent."""
+    if getattr(llm_response, "partial", False):
+        return None
+    agent = callback_context.agent_name
+    LLM_REQUESTS.inc(agent=agent)
+    usage = getattr(llm_response, "usage_metadata", None)
+    if usage is not None:
+        for kind, field in (("prompt", "prompt_token_count"), ("completion", "candidates_token_count")):
+            count = getattr(usage, field, None)
+            if count:
+                LLM_TOKENS.inc(count, agent=agent, type=kind)
+    return None
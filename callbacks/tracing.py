@@ -0,0 +1,467 @@
+"""Structured tracing of jobs, stages, agents, model calls, tools and pdflatex.
+
+Spans nest through a context variable: a span started while another is
+current becomes its child, so a job's trace reads
+job -> stage/agent -> model call/tool -> pdflatex. Start and end times come
+from the monotonic clock (anchored once to the wall clock for export), and
+finished spans are batched and appended to a local JSONL file in the
+OpenTelemetry OTLP/JSON encoding, one ``ExportTraceServiceRequest`` per
+line, which collectors and trace viewers can import directly. The file is
+rotated by size, like a ``RotatingFileHandler`` log, so a long-running
+server keeps at most ``max_bytes * (backup_count + 1)`` of spans.
+
+ADK runs agents on its own worker thread, where the caller's context
+variables are not visible. Callers therefore put the current span into the
+session state (see ``trace_state``) and the agent callbacks below pick it up
+as the parent.
+"""
+import atexit
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from config import get_config
+
+# Session state key carrying "<trace id>:<span id>" of the caller's span
+TRACE_PARENT_STATE_KEY = "trace_parent"
+
+# OTLP span kinds
+INTERNAL = 1
+SERVER = 2
+CLIENT = 3
+
+_STATUS_OK = 1
+_STATUS_ERROR = 2
+
+# Monotonic nanoseconds + offset = Unix nanoseconds
+_EPOCH_OFFSET_NS = time.time_ns() - time.perf_counter_ns()
+
+
+class SpanRef:
+    """Identifies a span, possibly one started on another thread."""
+
+    __slots__ = ("trace_id", "span_id")
+
+    def __init__(self, trace_id: str, span_id: str):
+        self.trace_id = trace_id
+        self.span_id = span_id
+
+    @classmethod
+    def parse(cls, value: Any) -> Optional["SpanRef"]:
+        """Parse the "<trace id>:<span id>" form stored in session state."""
+        if isinstance(value, str) and value.count(":") == 1:
+            trace_id, span_id = value.split(":")
+            if len(trace_id) == 32 and len(span_id) == 16:
+                return cls(trace_id, span_id)
+        return None
+
+    def __str__(self) -> str:
+        return f"{self.trace_id}:{self.span_id}"
+
+
+class Span(SpanRef):
+    """A timed operation with attributes; ended exactly once."""
+
+    __slots__ = ("name", "kind", "parent_id", "start_ns", "end_ns", "attributes", "error", "_tracer")
+
+    def __init__(self, tracer: "Tracer", name: str, kind: int, parent: Optional[SpanRef], attributes: Dict[str, Any]):
+        super().__init__(parent.trace_id if parent else os.urandom(16).hex(), os.urandom(8).hex())
+        self.name = name
+        self.kind = kind
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = attributes
+        self.error: Optional[str] = None
+        self.start_ns = time.perf_counter_ns()
+        self.end_ns: Optional[int] = None
+        self._tracer = tracer
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def record_error(self, error: Union[BaseException, str]) -> None:
+        if isinstance(error, BaseException):
+            self.attributes["exception.type"] = type(error).__name__
+            error = str(error)
+        self.error = error or "error"
+
+    def end(self) -> None:
+        if self.end_ns is None:
+            self.end_ns = time.perf_counter_ns()
+            self._tracer.exporter.export(self)
+
+    @property
+    def duration_seconds(self) -> float:
+        end = self.end_ns if self.end_ns is not None else time.perf_counter_ns()
+        return (end - self.start_ns) / 1e9
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """Encode the span as an OTLP/JSON span object."""
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns + _EPOCH_OFFSET_NS),
+            "endTimeUnixNano": str((self.end_ns or self.start_ns) + _EPOCH_OFFSET_NS),
+            "attributes": [_otlp_attribute(key, value) for key, value in self.attributes.items()],
+            "status": {"code": _STATUS_ERROR, "message": self.error} if self.error else {"code": _STATUS_OK},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+class _NoopSpan:
+    """Stand-in returned while tracing is disabled."""
+
+    trace_id = span_id = ""
+    duration_seconds = 0.0
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def record_error(self, error: Union[BaseException, str]) -> None:
+        pass
+
+    def end(self) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        encoded = {"boolValue": value}
+    elif isinstance(value, int):
+        encoded = {"intValue": str(value)}
+    elif isinstance(value, float):
+        encoded = {"doubleValue": value}
+    else:
+        encoded = {"stringValue": str(value)}
+    return {"key": key, "value": encoded}
+
+
+class JsonFileExporter:
+    """Buffers finished spans and appends them to a size-rotated file as OTLP/JSON lines."""
+
+    def __init__(
+        self,
+        path: str,
+        service_name: str,
+        max_batch: int = 64,
+        max_bytes: int = 0,
+        backup_count: int = 0,
+    ):
+        """
+        Args:
+            path: JSONL file spans are appended to
+            service_name: ``service.name`` resource attribute
+            max_batch: Spans buffered before a write
+            max_bytes: Rotate the file before it would grow past this (0: never)
+            backup_count: Rotated files kept as ``<path>.1`` .. ``<path>.N``;
+                with 0 the file is truncated instead
+        """
+        self.path = Path(path)
+        self.service_name = service_name
+        self.max_batch = max_batch
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._buffer: List[Span] = []
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        with self._lock:
+            self._buffer.append(span)
+            # Flush per batch, and whenever a trace's root span finishes
+            if len(self._buffer) < self.max_batch and span.parent_id is not None:
+                return
+            batch, self._buffer = self._buffer, []
+        self._write(batch)
+
+    def flush(self) -> None:
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+        self._write(batch)
+
+    def _write(self, batch: List[Span]) -> None:
+        if not batch:
+            return
+        request = {"resourceSpans": [{
+            "resource": {"attributes": [_otlp_attribute("service.name", self.service_name)]},
+            "scopeSpans": [{
+                "scope": {"name": "ai_research_agent.tracing"},
+                "spans": [span.to_otlp() for span in batch],
+            }],
+        }]}
+        line = json.dumps(request, separators=(",", ":")) + "\n"
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self._write_lock:
+                if self.max_bytes and self._size() + len(line) > self.max_bytes:
+                    self._rotate()
+                # One append-mode write per line keeps concurrent writers' lines intact
+                with open(self.path, "a") as f:
+                    f.write(line)
+        except OSError as e:
+            print(f"Could not write trace spans to {self.path}: {e}")
+
+    def _size(self) -> int:
+        try:
+            return self.path.stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    def _rotate(self) -> None:
+        """Shift ``<path>.N-1`` to ``<path>.N`` and so on, dropping the oldest file."""
+        for i in range(self.backup_count - 1, 0, -1):
+            older = self.path.with_name(f"{self.path.name}.{i}")
+            if older.exists():
+                os.replace(older, self.path.with_name(f"{self.path.name}.{i + 1}"))
+        if self.backup_count:
+            if self.path.exists():
+                os.replace(self.path, self.path.with_name(f"{self.path.name}.1"))
+        else:
+            self.path.unlink(missing_ok=True)
+
+
+_current: contextvars.ContextVar[Optional[SpanRef]] = contextvars.ContextVar("current_span", default=None)
+
+
+class Tracer:
+    """Creates spans and hands finished ones to an exporter."""
+
+    def __init__(self, exporter: JsonFileExporter):
+        self.exporter = exporter
+
+    def start_span(
+        self,
+        name: str,
+        kind: int = INTERNAL,
+        parent: Optional[SpanRef] = None,
+        **attributes: Any,
+    ) -> Span:
+        """Start a span under ``parent`` (default: the current span) without making it current."""
+        return Span(self, name, kind, parent or _current.get(), attributes)
+
+
+_tracer: Optional[Tracer] = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer() -> Optional[Tracer]:
+    """Return the process-wide tracer, or None if tracing is disabled."""
+    global _tracer
+    settings = get_config()["tracing"]
+    if not settings["enabled"]:
+        return None
+    with _tracer_lock:
+        if _tracer is None:
+            exporter = JsonFileExporter(
+                settings["path"], settings["service_name"], settings["max_batch"],
+                max_bytes=settings["max_bytes"], backup_count=settings["backup_count"],
+            )
+            atexit.register(exporter.flush)
+            _tracer = Tracer(exporter)
+        return _tracer
+
+
+@contextmanager
+def span(name: str, kind: int = INTERNAL, **attributes: Any) -> Iterator[Union[Span, _NoopSpan]]:
+    """
+    Trace the enclosed block as a child of the current span.
+
+    Exceptions are recorded on the span and re-raised.
+
+    Args:
+        name: Span name, e.g. "stage drafting"
+        kind: INTERNAL, SERVER or CLIENT
+        **attributes: Initial span attributes
+    """
+    tracer = get_tracer()
+    if tracer is None:
+        yield NOOP_SPAN
+        return
+    current = tracer.start_span(name, kind, **attributes)
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.record_error(e)
+        raise
+    finally:
+        _current.reset(token)
+        current.end()
+
+
+def current_span() -> Optional[SpanRef]:
+    return _current.get()
+
+
+def trace_state() -> Dict[str, str]:
+    """Session state entries that make agent spans children of the current span."""
+    current = _current.get()
+    return {TRACE_PARENT_STATE_KEY: str(current)} if current is not None else {}
+
+
+def propagating(func: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Wrap ``func`` to run in a copy of the caller's context.
+
+    Use it for work handed to thread pools so spans started there nest under
+    the submitting span.
+    """
+    context = contextvars.copy_context()
+
+    def run(*args: Any, **kwargs: Any) -> Any:
+        return context.copy().run(func, *args, **kwargs)
+
+    return run
+
+
+# ADK agent callbacks ---------------------------------------------------------
+#
+# ADK invokes these around agent runs, model calls and tool calls. Each pair
+# opens and closes a span; open spans are tracked by invocation so the
+# matching "after" callback can find them.
+
+_open_spans: Dict[Tuple[str, ...], Tuple[Span, Optional[SpanRef]]] = {}
+_open_spans_lock = threading.Lock()
+_MAX_OPEN_SPANS = 10000
+
+
+def _parent_from(context: Any) -> Optional[SpanRef]:
+    current = _current.get()
+    if current is not None:
+        return current
+    try:
+        return SpanRef.parse(context.state.get(TRACE_PARENT_STATE_KEY))
+    except Exception:
+        return None
+
+
+def _open(key: Tuple[str, ...], context: Any, name: str, kind: int, **attributes: Any) -> None:
+    tracer = get_tracer()
+    if tracer is None:
+        return
+    parent = _parent_from(context)
+    opened = tracer.start_span(name, kind, parent, **attributes)
+    with _open_spans_lock:
+        if len(_open_spans) >= _MAX_OPEN_SPANS:
+            # Spans whose "after" callback never ran (the call raised) are dropped
+            _open_spans.pop(next(iter(_open_spans)))
+        _open_spans[key] = (opened, _current.get())
+    _current.set(opened)
+
+
+def _close(key: Tuple[str, ...]) -> Optional[Span]:
+    with _open_spans_lock:
+        entry = _open_spans.pop(key, None)
+    if entry is None:
+        return None
+    closed, previous = entry
+    _current.set(previous)
+    return closed
+
+
+def _size(value: Any) -> int:
+    try:
+        return len(json.dumps(value, default=str))
+    except (TypeError, ValueError):
+        return len(str(value))
+
+
+def _text_size(content: Any) -> int:
+    parts = getattr(content, "parts", None) or []
+    return sum(len(getattr(part, "text", None) or "") for part in parts)
+
+
+def before_agent(callback_context: Any) -> None:
+    _open(
+        ("agent", callback_context.invocation_id, callback_context.agent_name),
+        callback_context,
+        f"agent {callback_context.agent_name}",
+        INTERNAL,
+        **{"agent.name": callback_context.agent_name},
+    )
+    return None
+
+
+def after_agent(callback_context: Any) -> None:
+    closed = _close(("agent", callback_context.invocation_id, callback_context.agent_name))
+    if closed is not None:
+        closed.end()
+    return None
+
+
+def before_model(callback_context: Any, llm_request: Any) -> None:
+    contents = getattr(llm_request, "contents", None) or []
+    _open(
+        ("llm", callback_context.invocation_id, callback_context.agent_name),
+        callback_context,
+        f"llm {llm_request.model or 'model'}",
+        CLIENT,
+        **{
+            "agent.name": callback_context.agent_name,
+            "llm.model": llm_request.model or "",
+            "llm.request.messages": len(contents),
+            "llm.request.chars": sum(_text_size(content) for content in contents),
+        },
+    )
+    return None
+
+
+def after_model(callback_context: Any, llm_response: Any) -> None:
+    if getattr(llm_response, "partial", False):
+        return None
+    closed = _close(("llm", callback_context.invocation_id, callback_context.agent_name))
+    if closed is None:
+        return None
+    closed.set_attribute("llm.response.chars", _text_size(llm_response.content))
+    usage = getattr(llm_response, "usage_metadata", None)
+    if usage is not None:
+        for name in ("prompt_token_count", "candidates_token_count", "total_token_count"):
+            if getattr(usage, name, None) is not None:
+                closed.set_attribute(f"llm.usage.{name}", getattr(usage, name))
+    if getattr(llm_response, "error_code", None):
+        closed.record_error(f"{llm_response.error_code}: {llm_response.error_message or ''}")
+    closed.end()
+    return None
+
+
+def before_tool(tool: Any, args: Dict[str, Any], tool_context: Any) -> None:
+    _open(
+        ("tool", tool_context.invocation_id, tool_context.function_call_id or tool.name),
+        tool_context,
+        f"tool {tool.name}",
+        INTERNAL,
+        **{"tool.name": tool.name, "tool.args.bytes": _size(args)},
+    )
+    return None
+
+
+def after_tool(tool: Any, args: Dict[str, Any], tool_context: Any, tool_response: Any) -> None:
+    closed = _close(("tool", tool_context.invocation_id, tool_context.function_call_id or tool.name))
+    if closed is None:
+        return None
+    closed.set_attribute("tool.response.bytes", _size(tool_response))
+    if isinstance(tool_response, dict) and tool_response.get("status") == "error":
+        closed.record_error(str(tool_response.get("message") or tool_response.get("error") or "error"))
+    closed.end()
+    return None
+
+
+AGENT_CALLBACKS = {
+    "before_agent_callback": before_agent,
+    "after_agent_callback": after_agent,
+    "before_model_callback": before_model,
+    "after_model_callback": after_model,
+    "before_tool_callback": before_tool,
+    "after_tool_callback": after_tool,
+}
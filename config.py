@@ -31,18 +31,91 @@ DEFAULT_CONFIG: Dict[str, Any] = {
     # Tool settings
     "tools": {
         "arxiv": {
+            "api_url": "https://export.arxiv.org/api/query",
             "max_results_default": 10,
-            "max_results_limit": 50
+            "max_results_limit": 50,
+            "min_interval_seconds": 3.0,  # arXiv API terms of use
+            "burst": 1
         },
         "semantic_scholar": {
+            "api_url": "https://api.semanticscholar.org",
             "max_results_default": 10,
-            "max_results_limit": 50
+            "max_results_limit": 50,
+            "min_interval_seconds": 1.0,
+            "burst": 1
+        },
+        # Retry, backoff and circuit-breaker policy shared by the literature
+        # APIs; any key can be overridden per source under tools.<source>
+        "rate_limit": {
+            "shared_dir": None,  # Directory for cross-process token buckets (None: per process)
+            "max_retries": 4,
+            "backoff_base_seconds": 1.0,
+            "backoff_max_seconds": 60.0,  # Longer Retry-After values fail the call instead
+            "breaker_failures": 5,  # Consecutive failed calls (retries exhausted) that open the breaker
+            "breaker_reset_seconds": 60.0
+        },
+        # Shared pooled transport used by the literature search tools
+        "http": {
+            "max_connections": 100,  # Open sockets across all hosts
+            "max_per_host": 8,  # Requests in flight against any one API host
+            "host_limits": {},  # Per-host overrides, e.g. {"export.arxiv.org": 2}
+            "keepalive_seconds": 30.0,  # Idle pooled connections are closed after this
+            "timeout_seconds": 30.0,
+            "user_agent": "ai_research_agent"
+        },
+        # Offline corpus built by `python -m tools.local_corpus ingest`
+        "local_corpus": {
+            "enabled": True,  # Searched only once an index exists at path
+            "path": str(BASE_DIR / "outputs" / "corpus"),
+            "k1": 1.2,
+            "b": 0.75,
+            "citation_weight": 0.1,  # Added to BM25 scores per log(1 + citations)
+            "block_docs": 100000  # Papers tokenized per ingest spill block
+        },
+        "literature_fanout": {
+            # Add "local_corpus" to search the offline index too, or use it
+            # alone to avoid network search entirely
+            "sources": ["arxiv", "semantic_scholar"],
+            "max_workers": 8,
+            "max_papers": 50,
+            "results_per_query": 10
+        },
+        "retrieval": {
+            "top_k": 8,
+            "k1": 1.5,
+            "b": 0.75
+        },
+        "latex": {
+            "command": "pdflatex",
+            "work_dir": str(BASE_DIR / "outputs" / "cache" / "latex"),
+            "use_format": True,  # Preload the template preamble from a dumped .fmt
+            "incremental": True,  # Reuse each output's workspace (and its .aux) across builds
+            "max_passes": 3,
+            "max_workspaces": 16,
+            "max_workers": 2,  # pdflatex processes run at once across all jobs
+            "timeout_seconds": 120,  # Per engine run; the process is killed after this
+            "memory_limit_mb": 2048,  # Address-space limit per engine process (0: none)
+            # Compiled PDFs keyed by a hash of the LaTeX and template version
+            "build_cache": {
+                "enabled": True,
+                "path": str(BASE_DIR / "outputs" / "cache" / "pdf"),
+                "max_bytes": 512 * 1024 * 1024
+            }
+        },
+        "search_cache": {
+            "enabled": True,
+            "path": str(BASE_DIR / "outputs" / "cache" / "search_cache.sqlite3"),
+            "ttl_seconds": 7 * 24 * 3600,
+            "max_entries": 2000
         }
     },
     
     # Paper settings
     "paper": {
         "citation_style": "IEEE",  # IEEE, APA, MLA, etc.
+        "template": "ieee",  # ieee, acm or arxiv (see tools/template_utils.py)
+        "template_auto_reload": True,  # Recompile templates when their files change
+        "renderer": "latex",  # latex, or fast (no LaTeX; quick previews)
         "min_references": 8,
         "max_references": 30,
         "section_order": [
@@ -58,6 +131,57 @@ DEFAULT_CONFIG: Dict[str, Any] = {
         ]
     },
     
+    # Pipeline settings
+    "pipeline": {
+        "mode": "coordinator",  # coordinator (LLM-orchestrated) or pipeline (code-driven)
+        "max_papers": 50,
+        "checkpoint_dir": str(BASE_DIR / "outputs" / "checkpoints"),
+        # Memoized agent replies, keyed by agent, model, instruction and input
+        "response_cache": {
+            "enabled": True,
+            "path": str(BASE_DIR / "outputs" / "cache" / "response_cache.sqlite3"),
+            "ttl_seconds": 30 * 24 * 3600,
+            "max_entries": 5000
+        },
+        "drafting": {
+            "max_concurrency": 4,
+            "max_retries": 2,
+            "retry_backoff_seconds": 2.0,
+            # Draft each section as soon as its literature searches return,
+            # instead of waiting for the whole literature list
+            "early_start": True
+        }
+    },
+    
+    # Web API settings
+    "server": {
+        "job_queue": {
+            "path": str(BASE_DIR / "outputs" / "jobs" / "jobs.sqlite3"),
+            "max_workers": 2,  # Papers generated concurrently
+            "max_queued": 20,  # Waiting jobs accepted before /api/start returns 429
+            "retry_after_seconds": 60,
+            "retention_seconds": 30 * 24 * 3600,  # Finished job records kept this long
+            # Lease on a running job, renewed every third of it; a job whose
+            # lease lapses is re-queued by any process sharing the database
+            "lease_seconds": 60.0
+        },
+        "events": {
+            "spill_dir": str(BASE_DIR / "outputs" / "jobs" / "events"),
+            "ttl_seconds": 3600,  # Finished jobs' event logs leave memory after this
+            "max_in_memory": 200  # ...or earlier once this many are held
+        }
+    },
+    
+    # Span tracing (OTLP/JSON lines, see callbacks/tracing.py)
+    "tracing": {
+        "enabled": True,
+        "path": str(BASE_DIR / "outputs" / "traces" / "spans.jsonl"),
+        "service_name": "ai_research_agent",
+        "max_batch": 64,  # Spans buffered before a write (root spans flush immediately)
+        "max_bytes": 50 * 1024 * 1024,  # spans.jsonl is rotated at this size (0: never)
+        "backup_count": 5  # Rotated files kept as spans.jsonl.1 .. spans.jsonl.5
+    },
+    
     # Logging settings
     "logging": {
         "log_file": "ai_research_agent.log",
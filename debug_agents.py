@@ -1,8 +1,15 @@
 #!/usr/bin/env python3
-"""Debug script to test individual agents and print their outputs."""
+"""Debug script to test individual agents and print their outputs.
+
+Agent replies are served from the response cache when the same agent, model
+and input were seen before, so repeated debug sessions replay instantly.
+Pass --no-cache to force fresh model calls.
+"""
+import argparse
 import os
 import json
 import sys
+import time
 import traceback
 from pathlib import Path
 
@@ -14,22 +21,16 @@ from agents.drafting_agent import drafting_agent
 from agents.citation_agent import citation_agent
 from agents.formatting_agent import formatting_agent
 
-# Import ADK
-from google.adk.runtime.app import AdkApp
-from google.adk.agents import Agent
+from agents.factory import get_agent
+from agents.runtime import run_agent
+from config import update_config
 
 # Set up output directory
 debug_dir = Path("debug_outputs")
 debug_dir.mkdir(exist_ok=True)
 
-def update_agent_model(agent, model_name="gemini-2.5-flash-preview-04-17"):
-    """Update agent model recursively."""
-    agent.model = model_name
-    print(f"Updated agent '{agent.name}' to use model: {model_name}")
-    
-    if hasattr(agent, 'sub_agents') and agent.sub_agents:
-        for sub_agent in agent.sub_agents:
-            update_agent_model(sub_agent, model_name)
+# Model every agent is tested with
+DEBUG_MODEL = "gemini-2.5-flash-preview-04-17"
 
 def test_agent(agent, input_message, save_path):
     """Test a single agent with the given input and save the output."""
@@ -38,49 +39,24 @@ def test_agent(agent, input_message, save_path):
     print(f"{'='*80}")
     
     try:
-        # Create a copy with updated model
-        update_agent_model(agent)
-        
-        # Create AdkApp for the agent
-        app = AdkApp(agent=agent)
+        # Get the agent configured for the debug model (the shared agent is left untouched)
+        agent = get_agent(agent.name, DEBUG_MODEL)
+        print(f"Using model {agent.model} for agent '{agent.name}'")
         
-        # Create lists to store events and outputs
-        events = []
-        agent_output = ""
-        
-        # Run the agent
+        # Run the agent (memoized in the response cache)
         print(f"Running {agent.name} with input: {input_message[:100]}...")
-        for event in app.stream_query(user_id="debug_user", message=input_message):
-            events.append(event)
-            if event.content and event.content.parts:
-                first_part = event.content.parts[0]
-                message = ""
-                if isinstance(first_part, dict) and "text" in first_part:
-                    message = first_part["text"]
-                elif hasattr(first_part, 'text'):
-                    message = first_part.text
-                
-                if message:
-                    agent_output += message + "\n"
-                    print(f"Output from {agent.name}: {message[:200]}...")
+        start = time.perf_counter()
+        agent_output = run_agent(agent, input_message, user_id="debug_user")
+        elapsed = time.perf_counter() - start
+        print(f"Output from {agent.name} ({elapsed:.1f}s): {agent_output[:200]}...")
         
         # Save the output
         with open(save_path, 'w') as f:
             f.write(f"Agent: {agent.name}\n")
+            f.write(f"Model: {agent.model}\n")
+            f.write(f"Elapsed: {elapsed:.2f}s\n")
             f.write(f"Input: {input_message}\n\n")
             f.write(f"Output:\n{agent_output}\n")
-            
-            # Save event details
-            f.write("\nEvents:\n")
-            for i, event in enumerate(events):
-                f.write(f"Event {i}:\n")
-                f.write(f"  Author: {event.author}\n")
-                f.write(f"  Final: {event.is_final_response()}\n")
-                if event.content:
-                    for part in event.content.parts:
-                        if hasattr(part, 'text'):
-                            f.write(f"  Content: {part.text[:200]}...\n")
-                f.write("\n")
         
         print(f"Output saved to {save_path}")
         return agent_output
@@ -94,6 +70,12 @@ def test_agent(agent, input_message, save_path):
 
 def main():
     """Run tests on all agents."""
+    parser = argparse.ArgumentParser(description="Run each agent once and save its output")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the agent response cache")
+    args = parser.parse_args()
+    if args.no_cache:
+        update_config({"pipeline": {"response_cache": {"enabled": False}}})
+    
     # Sample research topic
     topic = "Machine learning applications in climate science"
     
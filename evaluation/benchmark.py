@@ -0,0 +1,595 @@
+"""End-to-end throughput and latency benchmark, fully offline.
+
+Runs a batch of research jobs (pipeline or coordinator mode) at a given
+concurrency without Gemini, arXiv or Semantic Scholar:
+
+- every agent is built with ``FakeLlm``, a deterministic stand-in registered
+  with ADK's model registry as ``fake-llm``; it answers after a configurable
+  delay with a configurable number of words, and in coordinator mode it
+  scripts the tool calls and agent transfers a real model would make;
+- the search tools are pointed at ``StubSearchServer``, a local HTTP server
+  speaking just enough of the arXiv and Semantic Scholar APIs.
+
+Everything else (fan-out, retrieval, drafting scheduler, PDF rendering,
+caches, tracing) is the real code. The report gives p50/p95 job latency and
+per-stage latency (per agent in coordinator mode), jobs per minute and peak
+RSS, and is written as JSON so later runs can be compared against it:
+
+    python -m evaluation.benchmark --jobs 8 --concurrency 4 --output bench.json
+    python -m evaluation.benchmark --jobs 8 --concurrency 4 --compare bench.json
+"""
+import argparse
+import asyncio
+import copy
+import json
+import math
+import random
+import re
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, AsyncGenerator, ClassVar, Dict, List, Optional, Set
+from urllib.parse import parse_qs, urlparse
+from xml.sax.saxutils import escape
+
+from google.adk.models import BaseLlm, LlmRequest, LlmResponse
+from google.adk.models.registry import LLMRegistry
+from google.genai import types
+
+from config import get_config, update_config
+from tools.http_client import get_http_client
+
+FAKE_MODEL = "fake-llm"
+
+_VOCABULARY = (
+    "model", "training", "graph", "attention", "network", "dataset", "benchmark", "latency",
+    "retrieval", "transformer", "gradient", "evaluation", "baseline", "robustness", "sparse",
+    "embedding", "inference", "optimization", "representation", "learning", "scaling", "signal",
+    "architecture", "accuracy", "memory", "throughput", "variance", "regularization", "kernel",
+    "distribution", "objective", "protocol", "ablation", "corpus", "layer", "encoder",
+)
+
+
+def fake_words(seed: str, count: int) -> str:
+    """Deterministic pseudo-text of ``count`` words derived from ``seed``."""
+    rng = random.Random(zlib.crc32(seed.encode()))
+    words = [rng.choice(_VOCABULARY) for _ in range(max(1, count))]
+    # Sentences of ~12 words keep the text wrappable and LaTeX-safe
+    sentences = [" ".join(words[i:i + 12]).capitalize() + "." for i in range(0, len(words), 12)]
+    return " ".join(sentences)
+
+
+def fake_outline(topic: str) -> str:
+    """An outline in the markdown form outline_agent produces."""
+    lines = [f"Title: A Study of {topic}"]
+    for name in get_config()["paper"]["section_order"]:
+        if name.lower() in ("title", "references"):
+            continue
+        lines.append(f"## {name}")
+        lines.append(f"- {fake_words(topic + name, 8)}")
+        lines.append(f"- {fake_words(name + topic, 8)}")
+    return "\n".join(lines)
+
+
+# Fake model -------------------------------------------------------------------
+
+_AGENT_NAME = re.compile(r'Your internal name is "([^"]+)"')
+_CALLED_TOOL = re.compile(r"called tool `([^`]+)`")
+_OUTPUT_FILENAME = re.compile(r"\s*Output filename:\s*(\S+)\s*$")
+
+
+def _request_text(llm_request: LlmRequest) -> List[str]:
+    return [part.text for content in llm_request.contents for part in (content.parts or []) if part.text]
+
+
+def _called_tools(llm_request: LlmRequest) -> Set[str]:
+    """Names of tools already called in this session, by any agent."""
+    called = set()
+    for content in llm_request.contents:
+        for part in content.parts or []:
+            if part.function_call is not None:
+                called.add(part.function_call.name)
+            elif part.text:
+                called.update(_CALLED_TOOL.findall(part.text))
+    return called
+
+
+def _job_request(llm_request: LlmRequest) -> Dict[str, str]:
+    """Topic and output filename from the job's first user message."""
+    first = next(iter(_request_text(llm_request)), "")
+    match = _OUTPUT_FILENAME.search(first)
+    topic = first[:match.start()] if match else first
+    return {"topic": topic.strip(), "output_filename": match.group(1) if match else "research_paper.pdf"}
+
+
+class FakeLlm(BaseLlm):
+    """Deterministic, offline stand-in for the Gemini models.
+
+    Answers are derived from the calling agent (named in ADK's system
+    instruction) and the request text, so repeated runs send identical
+    traffic through the rest of the system.
+    """
+
+    latency_seconds: ClassVar[float] = 0.05
+    reply_words: ClassVar[int] = 200
+    _calls: ClassVar[int] = 0
+    _calls_lock: ClassVar[threading.Lock] = threading.Lock()
+
+    @classmethod
+    def supported_models(cls) -> List[str]:
+        return [FAKE_MODEL]
+
+    @classmethod
+    def configure(cls, latency_seconds: float, reply_words: int) -> None:
+        """Register the model with ADK and set its per-call delay and reply length."""
+        cls.latency_seconds = latency_seconds
+        cls.reply_words = reply_words
+        cls._calls = 0
+        LLMRegistry.register(cls)
+
+    @classmethod
+    def calls(cls) -> int:
+        return cls._calls
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        with FakeLlm._calls_lock:
+            FakeLlm._calls += 1
+        await asyncio.sleep(self.latency_seconds)
+        system = str(llm_request.config.system_instruction or "") if llm_request.config else ""
+        match = _AGENT_NAME.search(system)
+        agent = match.group(1) if match else ""
+        parts = getattr(self, f"_reply_{agent}", self._reply_text)(llm_request)
+        yield LlmResponse(content=types.Content(role="model", parts=parts))
+
+    def _text(self, seed: str) -> List[types.Part]:
+        return [types.Part(text=fake_words(seed, self.reply_words))]
+
+    def _call(self, name: str, **args: Any) -> List[types.Part]:
+        return [types.Part(function_call=types.FunctionCall(name=name, args=args))]
+
+    def _reply_text(self, llm_request: LlmRequest) -> List[types.Part]:
+        return self._text("\n".join(_request_text(llm_request)))
+
+    def _reply_outline_agent(self, llm_request: LlmRequest) -> List[types.Part]:
+        return [types.Part(text=fake_outline(" ".join(_request_text(llm_request))))]
+
+    def _reply_citation_agent(self, llm_request: LlmRequest) -> List[types.Part]:
+        # Echo every '## ' section with a citation and list the given sources
+        message = "\n".join(_request_text(llm_request))
+        draft, _, sources = message.partition("Source papers (JSON")
+        sections = re.findall(r"^## (.+)$\n([\s\S]*?)(?=^## |\Z)", draft, re.MULTILINE)
+        reply = [f"## {name}\n{body.strip()} [1]" for name, body in sections]
+        try:
+            papers = json.loads(sources[sources.index("["):sources.rindex("]") + 1])
+        except ValueError:
+            papers = []
+        reply.append("## References")
+        reply.extend(
+            f'[{p["n"]}] {", ".join(p.get("authors") or ["Anonymous"])}, "{p.get("title")}," '
+            f'arXiv:{p.get("arxiv_id") or "0000.00000"}, {str(p.get("published_date") or "2024")[:4]}.'
+            for p in papers
+        )
+        return [types.Part(text="\n\n".join(reply))]
+
+    def _reply_research_coordinator(self, llm_request: LlmRequest) -> List[types.Part]:
+        called = _called_tools(llm_request)
+        job = _job_request(llm_request)
+        if "search_literature_func" not in called:
+            return self._call("transfer_to_agent", agent_name="literature_agent")
+        if "draft_sections_func" not in called:
+            return self._call("draft_sections_func", topic=job["topic"], outline=fake_outline(job["topic"]))
+        if "paper_to_pdf" not in called:
+            return self._call("transfer_to_agent", agent_name="formatting_agent")
+        return [types.Part(text=f"The paper was written to {job['output_filename']}.")]
+
+    def _reply_literature_agent(self, llm_request: LlmRequest) -> List[types.Part]:
+        if "search_literature_func" not in _called_tools(llm_request):
+            job = _job_request(llm_request)
+            return self._call(
+                "search_literature_func",
+                topic=job["topic"],
+                outline=fake_outline(job["topic"]),
+                max_results=get_config()["pipeline"]["max_papers"],
+            )
+        return self._call("transfer_to_agent", agent_name="research_coordinator")
+
+    def _reply_formatting_agent(self, llm_request: LlmRequest) -> List[types.Part]:
+        job = _job_request(llm_request)
+        if "paper_to_pdf" not in _called_tools(llm_request):
+            content = {"title": f"A Study of {job['topic']}"}
+            for key in ("abstract", "introduction", "related_work", "methodology", "experiments",
+                        "results", "discussion", "conclusion"):
+                content[key] = fake_words(job["topic"] + key, self.reply_words)
+            content["references"] = "\\bibitem{ref1} A. Author, Benchmark paper, 2024."
+            return self._call("paper_to_pdf", paper_content=content, output_filename=job["output_filename"])
+        return [types.Part(text=f"The PDF was generated at {job['output_filename']}.")]
+
+
+# Stub search APIs -------------------------------------------------------------
+
+class _StubHandler(BaseHTTPRequestHandler):
+    server: "StubSearchServer"
+    # Keep connections open between requests, as the real APIs do
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def _send(self, body: bytes, content_type: str) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        time.sleep(self.server.latency_seconds)
+        self.server.count_request()
+        if url.path == "/api/query":
+            self._send(self.server.arxiv_feed(params), "application/atom+xml")
+        elif url.path == "/graph/v1/paper/search":
+            self._send(json.dumps(self.server.semantic_page(params)).encode(), "application/json")
+        else:
+            self.send_error(404)
+
+
+class StubSearchServer(ThreadingHTTPServer):
+    """Local HTTP server answering arXiv and Semantic Scholar search requests.
+
+    Results are derived from the query, so the same query always returns the
+    same papers, and different section queries overlap only partly (which
+    keeps the fan-out's deduplication honest).
+    """
+
+    daemon_threads = True
+
+    def __init__(self, latency_seconds: float = 0.02):
+        super().__init__(("127.0.0.1", 0), _StubHandler)
+        self.latency_seconds = latency_seconds
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def count_request(self) -> None:
+        with self._lock:
+            self.requests += 1
+
+    def start(self) -> "StubSearchServer":
+        self._thread = threading.Thread(target=self.serve_forever, name="stub-search", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    @staticmethod
+    def _papers(query: str, count: int, offset: int = 0) -> List[Dict[str, Any]]:
+        # Half of each result list is shared across queries on the same words
+        words = sorted(set(re.findall(r"[a-z]{3,}", query.lower())))[:3] or ["paper"]
+        papers = []
+        for i in range(offset, offset + count):
+            seed = f"{words[i % len(words)]}-{i // 2}" if i % 2 else f"{query}-{i}"
+            number = zlib.crc32(seed.encode()) % 100000
+            papers.append({
+                "id": f"24{number // 10000:02d}.{number % 10000:05d}",
+                "title": fake_words(seed, 8).rstrip("."),
+                "abstract": fake_words(seed + "abstract", 60),
+                "authors": [f"Author {number % 97}", f"Author {number % 89}"],
+                "year": 2015 + number % 10,
+            })
+        return papers
+
+    def arxiv_feed(self, params: Dict[str, str]) -> bytes:
+        count = min(int(params.get("max_results", 10)), 50)
+        entries = []
+        for paper in self._papers(params.get("search_query", ""), count, int(params.get("start", 0))):
+            authors = "".join(f"<author><name>{escape(name)}</name></author>" for name in paper["authors"])
+            entries.append(
+                "<entry>"
+                f"<id>http://arxiv.org/abs/{paper['id']}v1</id>"
+                f"<updated>{paper['year']}-01-02T00:00:00Z</updated>"
+                f"<published>{paper['year']}-01-01T00:00:00Z</published>"
+                f"<title>{escape(paper['title'])}</title>"
+                f"<summary>{escape(paper['abstract'])}</summary>"
+                f"{authors}"
+                f'<link href="http://arxiv.org/pdf/{paper["id"]}v1" title="pdf" rel="related"/>'
+                '<arxiv:primary_category term="cs.LG"/><category term="cs.LG"/>'
+                "</entry>"
+            )
+        feed = (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<feed xmlns="http://www.w3.org/2005/Atom" xmlns:arxiv="http://arxiv.org/schemas/atom" '
+            'xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/">'
+            f"<opensearch:totalResults>{count}</opensearch:totalResults>"
+            f"<opensearch:startIndex>{params.get('start', 0)}</opensearch:startIndex>"
+            f"<opensearch:itemsPerPage>{count}</opensearch:itemsPerPage>"
+            + "".join(entries) + "</feed>"
+        )
+        return feed.encode()
+
+    def semantic_page(self, params: Dict[str, str]) -> Dict[str, Any]:
+        offset, limit = int(params.get("offset", 0)), min(int(params.get("limit", 10)), 100)
+        data = [{
+            "paperId": zlib.crc32(paper["id"].encode()).to_bytes(4, "big").hex(),
+            "title": paper["title"],
+            "abstract": paper["abstract"],
+            "url": f"https://www.semanticscholar.org/paper/{paper['id']}",
+            "year": paper["year"],
+            "citationCount": zlib.crc32(paper["title"].encode()) % 500,
+            "authors": [{"name": name} for name in paper["authors"]],
+            "externalIds": {"ArXiv": paper["id"]},
+        } for paper in self._papers(params.get("query", ""), limit, offset)]
+        # No "next": the client stops after this page
+        return {"total": len(data), "offset": offset, "data": data}
+
+
+# Benchmark runner -------------------------------------------------------------
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile; 0.0 for no values."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    return {
+        "count": len(values),
+        "p50": percentile(values, 0.50),
+        "p95": percentile(values, 0.95),
+        "max": max(values) if values else 0.0,
+    }
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far (ru_maxrss is KiB on Linux, bytes on macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _run_pipeline_job(index: int, topic: str, work_dir: Path, renderer: Optional[str]) -> Dict[str, float]:
+    from agents.pipeline import ResearchPipeline
+
+    output_dir = work_dir / f"job{index}"
+    output_dir.mkdir(parents=True, exist_ok=True)
+    result = ResearchPipeline(output_dir=output_dir, renderer=renderer, model=FAKE_MODEL).run(
+        topic, f"bench_{index}.pdf"
+    )
+    return result.timings
+
+
+def _run_coordinator_job(index: int, topic: str, job_id: str, renderer: Optional[str]) -> Dict[str, float]:
+    """Run the coordinator like api.generate_paper does; time is attributed to event authors."""
+    from google.adk.runners import Runner
+    from google.adk.sessions import InMemorySessionService
+
+    from agents.factory import MODEL_STATE_KEY, get_agent
+    from tools.pdf_export import OUTPUT_DIR_STATE_KEY, RENDERER_STATE_KEY
+
+    session_service = InMemorySessionService()
+    runner = Runner(
+        agent=get_agent("research_coordinator", FAKE_MODEL),
+        app_name="ai_researcher_benchmark",
+        session_service=session_service,
+    )
+    session_service.create_session(
+        app_name="ai_researcher_benchmark",
+        user_id="benchmark",
+        state={OUTPUT_DIR_STATE_KEY: job_id, RENDERER_STATE_KEY: renderer, MODEL_STATE_KEY: FAKE_MODEL},
+        session_id=job_id,
+    )
+    content = types.Content(role="user", parts=[types.Part(text=f"{topic} Output filename: bench_{index}.pdf")])
+    timings: Dict[str, float] = {}
+    last = time.perf_counter()
+    for event in runner.run(user_id="benchmark", session_id=job_id, new_message=content):
+        now = time.perf_counter()
+        timings[event.author] = timings.get(event.author, 0.0) + now - last
+        last = now
+    return timings
+
+
+def run_benchmark(
+    mode: str = "pipeline",
+    jobs: int = 4,
+    concurrency: int = 2,
+    llm_latency: float = 0.05,
+    reply_words: int = 200,
+    search_latency: float = 0.02,
+    renderer: Optional[str] = None,
+    warm_caches: bool = False,
+) -> Dict[str, Any]:
+    """
+    Run ``jobs`` research jobs, ``concurrency`` at a time, against the fakes.
+
+    Args:
+        mode: "pipeline" or "coordinator"
+        jobs: Number of jobs to run
+        concurrency: Jobs running at once
+        llm_latency: Seconds each fake model call takes
+        reply_words: Words in each fake model reply
+        search_latency: Seconds each stub search request takes
+        renderer: "latex" or "fast" (default: paper.renderer)
+        warm_caches: Keep the search, response and PDF caches enabled; by
+            default they are disabled so every job does the full work
+
+    Returns:
+        The report: settings, job and stage latency summaries, throughput,
+        peak RSS, the number of fake model and search calls and the HTTP
+        connections opened and reused
+    """
+    if mode not in ("pipeline", "coordinator"):
+        raise ValueError("mode must be 'pipeline' or 'coordinator'")
+    FakeLlm.configure(llm_latency, reply_words)
+    server = StubSearchServer(search_latency).start()
+    saved_config = copy.deepcopy(get_config())
+    update_config({
+        "tools": {
+            "arxiv": {"api_url": f"{server.url}/api/query", "min_interval_seconds": 0.0},
+            "semantic_scholar": {"api_url": server.url, "min_interval_seconds": 0.0},
+            "search_cache": {"enabled": warm_caches},
+            "latex": {"build_cache": {"enabled": warm_caches}},
+        },
+        "pipeline": {"response_cache": {"enabled": warm_caches}},
+    })
+    run_id = uuid.uuid4().hex[:8]
+    work_dir = Path(tempfile.mkdtemp(prefix="benchmark-"))
+    job_ids = [f"benchmark-{run_id}-{i}" for i in range(jobs)]
+
+    def run_job(index: int) -> Dict[str, Any]:
+        topic = f"Benchmark topic {index % 4} on efficient graph learning"
+        start = time.perf_counter()
+        try:
+            if mode == "pipeline":
+                stages = _run_pipeline_job(index, topic, work_dir, renderer)
+            else:
+                stages = _run_coordinator_job(index, topic, job_ids[index], renderer)
+            error = ""
+        except Exception as e:
+            stages, error = {}, f"{type(e).__name__}: {e}"
+            print(f"Benchmark job {index} failed: {error}")
+        return {"seconds": time.perf_counter() - start, "stages": stages, "error": error}
+
+    http_before = get_http_client().stats()
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(run_job, range(jobs)))
+    finally:
+        wall = time.perf_counter() - started
+        server.stop()
+        update_config(saved_config)
+        shutil.rmtree(work_dir, ignore_errors=True)
+        from tools.pdf_export import OUTPUT_DIR
+        for job_id in job_ids:
+            shutil.rmtree(OUTPUT_DIR / job_id, ignore_errors=True)
+
+    completed = [r for r in results if not r["error"]]
+    stage_names = sorted({name for r in completed for name in r["stages"]})
+    return {
+        "settings": {
+            "mode": mode, "jobs": jobs, "concurrency": concurrency, "llm_latency": llm_latency,
+            "reply_words": reply_words, "search_latency": search_latency,
+            "renderer": renderer or get_config()["paper"]["renderer"], "warm_caches": warm_caches,
+        },
+        "completed": len(completed),
+        "failed": len(results) - len(completed),
+        "errors": sorted({r["error"] for r in results if r["error"]}),
+        "wall_seconds": wall,
+        "jobs_per_minute": len(completed) / wall * 60 if wall else 0.0,
+        "job_seconds": summarize([r["seconds"] for r in completed]),
+        "stage_seconds": {
+            name: summarize([r["stages"][name] for r in completed if name in r["stages"]])
+            for name in stage_names
+        },
+        "peak_rss_mb": peak_rss_mb(),
+        "llm_calls": FakeLlm.calls(),
+        "search_requests": server.requests,
+        "http_connections": {
+            event: get_http_client().stats()[f"connections_{event}"] - http_before[f"connections_{event}"]
+            for event in ("opened", "reused")
+        },
+    }
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = 0.2) -> List[str]:
+    """
+    List regressions of ``report`` against ``baseline``.
+
+    Latencies (job and per-stage p50/p95) regress when they grow by more than
+    ``tolerance`` (a fraction); throughput when it drops by more than that.
+    """
+    regressions = []
+
+    def check(label: str, current: float, previous: float, higher_is_worse: bool = True) -> None:
+        if previous <= 0:
+            return
+        change = (current - previous) / previous
+        if (change if higher_is_worse else -change) > tolerance:
+            regressions.append(f"{label}: {previous:.3f} -> {current:.3f} ({change:+.0%})")
+
+    for quantile in ("p50", "p95"):
+        check(f"job {quantile}", report["job_seconds"][quantile], baseline["job_seconds"][quantile])
+        for stage, summary in report["stage_seconds"].items():
+            if stage in baseline["stage_seconds"]:
+                check(f"{stage} {quantile}", summary[quantile], baseline["stage_seconds"][stage][quantile])
+    check("jobs/minute", report["jobs_per_minute"], baseline["jobs_per_minute"], higher_is_worse=False)
+    return regressions
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    settings = report["settings"]
+    print(f"\n{settings['mode']} mode: {report['completed']}/{settings['jobs']} jobs completed "
+          f"at concurrency {settings['concurrency']} in {report['wall_seconds']:.1f}s")
+    print(f"  throughput:  {report['jobs_per_minute']:.1f} jobs/minute")
+    print(f"  job latency: p50 {report['job_seconds']['p50']:.2f}s  p95 {report['job_seconds']['p95']:.2f}s")
+    for stage, summary in report["stage_seconds"].items():
+        print(f"  {stage:<22} p50 {summary['p50']:.2f}s  p95 {summary['p95']:.2f}s")
+    print(f"  peak RSS:    {report['peak_rss_mb']:.0f} MB")
+    print(f"  fake LLM calls: {report['llm_calls']}, stub search requests: {report['search_requests']}")
+    print(f"  HTTP connections: {report['http_connections']['opened']} opened, "
+          f"{report['http_connections']['reused']} reused")
+    for error in report["errors"]:
+        print(f"  error: {error}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark of the research pipeline")
+    parser.add_argument("--mode", choices=["pipeline", "coordinator"], default="pipeline")
+    parser.add_argument("--jobs", type=int, default=4, help="Jobs to run")
+    parser.add_argument("--concurrency", type=int, default=2, help="Jobs running at once")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Seconds per fake model call")
+    parser.add_argument("--reply-words", type=int, default=200, help="Words per fake model reply")
+    parser.add_argument("--search-latency", type=float, default=0.02, help="Seconds per stub search request")
+    parser.add_argument("--renderer", choices=["latex", "fast"], help="PDF renderer (default: paper.renderer)")
+    parser.add_argument("--warm-caches", action="store_true",
+                        help="Keep the search, response and PDF caches enabled")
+    parser.add_argument("--output", help="Write the report to this JSON file")
+    parser.add_argument("--compare", help="Baseline report to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed relative slowdown before --compare fails (default: 0.2)")
+    args = parser.parse_args()
+
+    report = run_benchmark(
+        mode=args.mode,
+        jobs=args.jobs,
+        concurrency=args.concurrency,
+        llm_latency=args.llm_latency,
+        reply_words=args.reply_words,
+        search_latency=args.search_latency,
+        renderer=args.renderer,
+        warm_caches=args.warm_caches,
+    )
+    print_report(report)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+        print(f"Report written to {args.output}")
+    if args.compare:
+        regressions = compare(report, json.loads(Path(args.compare).read_text()), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print(f"No regressions beyond {args.tolerance:.0%} against {args.compare}")
+    return 1 if report["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -56,13 +56,16 @@ export const useApi = () => {
 
   /**
    * Get job status updates
+   * Pass the last event ID already seen as `since` to read updates with a
+   * client-side cursor instead of draining them for every viewer.
    */
-  const getJobStatus = useCallback(async (jobId) => {
+  const getJobStatus = useCallback(async (jobId, since) => {
     setLoading(true);
     setError(null);
     
     try {
-      const response = await api.get(`/api/status/${jobId}`);
+      const query = since === undefined ? '' : `?since=${since}`;
+      const response = await api.get(`/api/status/${jobId}${query}`);
       return response.data;
     } catch (err) {
       console.error('API error:', err);
@@ -73,6 +76,29 @@ export const useApi = () => {
     }
   }, []);
 
+  /**
+   * Stream job status updates over Server-Sent Events.
+   * The browser reconnects automatically and resumes from the last event ID.
+   * Returns a function that closes the stream.
+   */
+  const subscribeToJob = useCallback((jobId, lastEventId = 0, { onUpdate, onEnd, onError } = {}) => {
+    const source = new EventSource(`${API_BASE_URL}/api/events/${jobId}?last_event_id=${lastEventId}`);
+    
+    source.addEventListener('update', (event) => {
+      if (onUpdate) onUpdate(JSON.parse(event.data), Number(event.lastEventId));
+    });
+    source.addEventListener('end', () => {
+      source.close();
+      if (onEnd) onEnd();
+    });
+    source.onerror = (err) => {
+      // A closed source will not reconnect; let the caller fall back to polling
+      if (source.readyState === EventSource.CLOSED && onError) onError(err);
+    };
+    
+    return () => source.close();
+  }, []);
+
   /**
    * Get download URL for generated file
    */
@@ -117,6 +143,7 @@ export const useApi = () => {
     error,
     startResearchJob,
     getJobStatus,
+    subscribeToJob,
     getDownloadUrl,
     testArxivSearch,
     checkHealth
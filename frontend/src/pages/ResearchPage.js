@@ -64,55 +64,101 @@ const ResearchPage = () => {
   const [autoRefresh, setAutoRefresh] = useState(true);
 
   const messagesEndRef = useRef(null);
-  const { getJobStatus, getDownloadUrl, loading } = useApi();
+  const lastEventIdRef = useRef(0);
+  const streamingRef = useRef(false);
+  const { getJobStatus, subscribeToJob, getDownloadUrl, loading } = useApi();
+
+  // Apply a batch of status updates
+  const applyUpdates = useCallback((updates) => {
+    const newMessages = [];
+    let latestStage = null;
+    
+    updates.forEach(update => {
+      if (update.message) {
+        newMessages.push(update.message);
+        
+        // Check for output file
+        if (update.output_file) {
+          setOutputFile(update.output_file);
+        }
+        
+        // Detect stage from message
+        const detectedStage = detectStage(update.message);
+        if (detectedStage !== null) {
+          latestStage = Math.max(latestStage ?? 0, detectedStage);
+        }
+      }
+    });
+    
+    if (newMessages.length > 0) {
+      setMessages(previous => [...previous, ...newMessages]);
+    }
+    if (latestStage !== null) {
+      setCurrentStage(previous => Math.max(previous, latestStage));
+    }
+  }, []);
 
   // Fetch job status
   const fetchStatus = useCallback(async () => {
     if (!jobId) return;
     
-    const result = await getJobStatus(jobId);
+    const result = await getJobStatus(jobId, lastEventIdRef.current);
     if (result) {
       setStatus(result);
       
-      // Add new messages
-      if (result.updates && result.updates.length > 0) {
-        const newMessages = [...messages];
-        
-        result.updates.forEach(update => {
-          if (update.message) {
-            newMessages.push(update.message);
-            
-            // Check for output file
-            if (update.output_file) {
-              setOutputFile(update.output_file);
-            }
-            
-            // Detect stage from message
-            const detectedStage = detectStage(update.message);
-            if (detectedStage !== null) {
-              setCurrentStage(Math.max(currentStage, detectedStage));
-            }
-          }
-        });
-        
-        // Update messages state
-        setMessages(newMessages);
+      // Add new messages (while streaming they arrive over the event stream)
+      if (!streamingRef.current && result.updates && result.updates.length > 0) {
+        applyUpdates(result.updates);
+        lastEventIdRef.current = result.last_event_id;
       }
     }
-  }, [jobId, messages, currentStage, getJobStatus]);
+  }, [jobId, getJobStatus, applyUpdates]);
 
-  // Initialize and set up refresh
+  // Initialize and keep updates flowing
   useEffect(() => {
-    fetchStatus();
+    if (!autoRefresh) {
+      fetchStatus();
+      return undefined;
+    }
     
-    // Set up auto-refresh if job is active
+    // Prefer a pushed event stream; poll only where it is unavailable
     let interval;
-    if (autoRefresh) {
+    const startPolling = () => {
+      streamingRef.current = false;
+      fetchStatus();
       interval = setInterval(fetchStatus, 3000);
+    };
+    
+    if (typeof EventSource === 'undefined') {
+      startPolling();
+      return () => clearInterval(interval);
     }
     
-    return () => clearInterval(interval);
-  }, [jobId, autoRefresh, fetchStatus]);
+    streamingRef.current = true;
+    fetchStatus();
+    const close = subscribeToJob(jobId, lastEventIdRef.current, {
+      onUpdate: (update, eventId) => {
+        lastEventIdRef.current = eventId;
+        applyUpdates([update]);
+        setStatus(previous => ({
+          ...previous,
+          active: !['completed', 'error'].includes(update.status),
+          state: update.status
+        }));
+      },
+      onEnd: () => {
+        streamingRef.current = false;
+        fetchStatus();
+      },
+      onError: startPolling
+    });
+    
+    return () => {
+      streamingRef.current = false;
+      close();
+      clearInterval(interval);
+    };
+  }, [jobId, autoRefresh, fetchStatus, subscribeToJob, applyUpdates]);
 
   // Scroll to bottom when messages update
   useEffect(() => {
@@ -259,7 +305,9 @@ const ResearchPage = () => {
           <div className="flex items-center space-x-2">
             <div className={`w-2 h-2 rounded-full ${status?.active ? 'bg-primary-500 animate-pulse' : 'bg-slate-500'}`}></div>
             <span className="text-sm text-slate-400">
-              {status?.active ? 'Processing' : outputFile ? 'Complete' : 'Inactive'}
+              {status?.state === 'queued'
+                ? `Queued (position ${status.queue_position})`
+                : status?.active ? 'Processing' : outputFile ? 'Complete' : 'Inactive'}
             </span>
           </div>
         </div>
@@ -6,14 +6,7 @@ import time
 from pathlib import Path
 from dotenv import load_dotenv
 
-# Updated import for AdkApp
-from google.adk.runtime.app import AdkApp
-# Alternative imports if needed: 
-# from google.adk.app import AdkApp
-# from google.adk import AdkApp
-
-from agents.coordinator import coordinator_agent
-from callbacks.logging_callback import ResearchAgentCallbackHandler
+from config import get_config, update_config
 
 # Load environment variables from .env file
 load_dotenv()
@@ -44,39 +37,61 @@ def main():
     parser.add_argument("--output", type=str, default="research_paper.pdf", help="Output PDF filename")
     parser.add_argument("--verbose", "-v", action="store_true", help="Enable verbose output")
     parser.add_argument("--model", choices=["gemini-2.0-flash", "gemini-2.5-pro"], 
-                      help="Override the model used by coordinator (advanced)")
+                      help="Override the model used by the agents (advanced)")
+    parser.add_argument("--mode", choices=["coordinator", "pipeline"], default=get_config()["pipeline"]["mode"],
+                      help="coordinator: LLM-orchestrated workflow; pipeline: code-driven stages")
+    parser.add_argument("--no-cache", action="store_true",
+                      help="Bypass the agent response cache and always call the model")
+    parser.add_argument("--template", choices=["ieee", "acm", "arxiv"], default=get_config()["paper"]["template"],
+                      help="LaTeX template (paper style) used for the PDF")
+    parser.add_argument("--renderer", choices=["latex", "fast"], default=get_config()["paper"]["renderer"],
+                      help="latex: typeset with the template; fast: quick preview PDF without LaTeX")
+    parser.add_argument("--resume", type=str, metavar="JOB_ID",
+                      help="Resume an interrupted pipeline job from its last completed stage")
     
     args = parser.parse_args()
     
+    if args.no_cache:
+        update_config({"pipeline": {"response_cache": {"enabled": False}}})
+    
     # Handle packaging option
     if args.package:
         package_codebase()
         return
     
+    # A resumed job runs with the inputs it was started with, not the CLI defaults
+    if args.resume:
+        from agents.checkpoints import CheckpointStore
+        checkpoints = CheckpointStore.open(args.resume)
+        if checkpoints is None:
+            print(f"Error: no checkpoints found for job {args.resume}")
+            sys.exit(1)
+        inputs = checkpoints.inputs
+        args.topic = inputs["topic"]
+        args.output = inputs["output_filename"]
+        args.model = inputs.get("model", args.model)
+        args.template = inputs.get("template", args.template)
+        args.renderer = inputs.get("renderer", args.renderer)
+        args.mode = "pipeline"
+        print(f"♻️  Resuming job {args.resume} (completed stages: {', '.join(checkpoints.completed()) or 'none'})")
+    update_config({"paper": {"template": args.template, "renderer": args.renderer}})
+    
     # Ensure topic is provided
     if not args.topic:
         parser.print_help()
         print("\nError: --topic argument is required unless --package is specified")
         sys.exit(1)
     
-    # Initialize callback handler
-    callbacks = [ResearchAgentCallbackHandler()]
-    
-    # Create the runnable app with callbacks
-    app = AdkApp(agent=coordinator_agent, callbacks=callbacks)
-    
     print(f"🔍 Starting research on topic: '{args.topic}'")
     print(f"📄 Output will be saved as: {args.output}")
     print("⏳ This process may take several minutes. Progress updates will be shown below:")
     print("-" * 80)
     
     try:
-        # Stream interaction
-        for event in app.stream_query(
-            user_id="LOCAL_USER", 
-            message=f"{args.topic} Output filename: {args.output}"
-        ):
-            display_progress(event)
+        if args.mode == "pipeline":
+            run_pipeline(args)
+        else:
+            run_coordinator(args)
             
         print("-" * 80)
         print(f"✅ Research paper generation complete! Check {args.output} for the result.")
@@ -88,6 +103,49 @@ def main():
             traceback.print_exc()
         sys.exit(1)
 
+def run_coordinator(args):
+    """Generate the paper with the LLM coordinator orchestrating every stage."""
+    # Updated import for AdkApp
+    from google.adk.runtime.app import AdkApp
+    # Alternative imports if needed: 
+    # from google.adk.app import AdkApp
+    # from google.adk import AdkApp
+    
+    from agents.coordinator import coordinator_agent
+    from callbacks.logging_callback import ResearchAgentCallbackHandler
+    
+    # Initialize callback handler
+    callbacks = [ResearchAgentCallbackHandler()]
+    
+    # Create the runnable app with callbacks
+    app = AdkApp(agent=coordinator_agent, callbacks=callbacks)
+    
+    # Stream interaction
+    for event in app.stream_query(
+        user_id="LOCAL_USER", 
+        message=f"{args.topic} Output filename: {args.output}"
+    ):
+        display_progress(event)
+
+def run_pipeline(args):
+    """Generate the paper with the code-driven stage pipeline."""
+    import uuid
+    from agents.pipeline import ResearchPipeline, job_checkpoints
+    
+    def on_event(stage, message):
+        timestamp = time.strftime("%H:%M:%S", time.localtime())
+        print(f"[{timestamp}] [{stage}] {message}")
+    
+    job_id = args.resume or uuid.uuid4().hex[:12]
+    if not args.resume:
+        print(f"Job ID: {job_id} (if interrupted, continue with --resume {job_id})")
+    checkpoints = job_checkpoints(job_id, args.topic, args.output, args.model, args.template, args.renderer)
+    result = ResearchPipeline(
+        on_event=on_event, checkpoints=checkpoints, renderer=args.renderer, model=args.model
+    ).run(args.topic, args.output)
+    timings = ", ".join(f"{stage} {seconds:.1f}s" for stage, seconds in result.timings.items())
+    print(f"Stage timings: {timings}")
+
 def package_codebase():
     """Package the codebase for sharing."""
     import shutil
@@ -0,0 +1 @@
+"""Job scheduling and bookkeeping for the web API"""
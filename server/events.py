@@ -0,0 +1,223 @@
+"""Per-job event logs with fan-out to any number of subscribers.
+
+Every status update a job emits is appended to that job's log under an
+increasing integer ID. Subscribers (SSE streams, pollers) read from the log
+with their own cursor instead of draining a shared queue, so each viewer sees
+every update and a reconnecting client can replay everything after the last
+ID it received.
+
+Finished jobs do not stay in memory forever: once a log is closed it is
+evicted after a TTL, or earlier when too many logs are held, and spilled to a
+JSONL file from which it is reloaded transparently if the job is read again.
+"""
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from config import get_config
+
+# Statuses after which a job emits no further events (until it is resumed)
+TERMINAL_STATUSES = ("completed", "error")
+
+_SAFE_JOB_ID = re.compile(r"^[A-Za-z0-9_.-]{1,128}$")
+
+
+class EventLog:
+    """Append-only, replayable event log of one job."""
+
+    def __init__(self, events: Optional[List[Dict[str, Any]]] = None):
+        self.events: List[Dict[str, Any]] = list(events or [])
+        self.closed = bool(self.events) and self.events[-1].get("status") in TERMINAL_STATUSES
+        self.updated = time.time()
+        # A log reloaded from a spill file is history: cursorless pollers
+        # only get what is published after the reload
+        self._poll_cursor = len(self.events)
+        self._changed = threading.Condition()
+
+    @property
+    def last_id(self) -> int:
+        return len(self.events)
+
+    def append(self, event: Dict[str, Any]) -> int:
+        """Add an event and wake every subscriber; returns the event's ID."""
+        with self._changed:
+            self.events.append(event)
+            # A terminal event closes the log; a resumed job reopens it
+            self.closed = event.get("status") in TERMINAL_STATUSES
+            self.updated = time.time()
+            self._changed.notify_all()
+            return len(self.events)
+
+    def since(self, last_id: int) -> List[Tuple[int, Dict[str, Any]]]:
+        """Return (id, event) pairs with IDs greater than ``last_id``."""
+        with self._changed:
+            start = max(last_id, 0)
+            return list(enumerate(self.events[start:], start + 1))
+
+    def drain(self) -> List[Tuple[int, Dict[str, Any]]]:
+        """
+        Return the events not yet returned by a previous drain.
+
+        This keeps the original single-consumer polling semantics of
+        /api/status for clients that do not track event IDs themselves.
+        """
+        with self._changed:
+            pending = self.since(self._poll_cursor)
+            self._poll_cursor = self.last_id
+            return pending
+
+    def wait(self, last_id: int, timeout: float) -> bool:
+        """Block until an event newer than ``last_id`` exists or the log is closed."""
+        with self._changed:
+            return self._changed.wait_for(lambda: self.last_id > last_id or self.closed, timeout)
+
+
+class EventBroker:
+    """Registry of event logs keyed by job ID, with eviction of finished jobs."""
+
+    def __init__(
+        self,
+        spill_dir: Optional[str] = None,
+        ttl_seconds: Optional[float] = None,
+        max_in_memory: Optional[int] = None,
+    ):
+        """
+        Args:
+            spill_dir: Directory for evicted logs (default: server.events.spill_dir)
+            ttl_seconds: Age after which a finished job's log leaves memory
+            max_in_memory: Finished-job logs kept in memory before the least
+                recently updated ones are evicted early
+        """
+        settings = get_config()["server"]["events"]
+        self.spill_dir = Path(spill_dir or settings["spill_dir"])
+        self.ttl_seconds = settings["ttl_seconds"] if ttl_seconds is None else ttl_seconds
+        self.max_in_memory = settings["max_in_memory"] if max_in_memory is None else max_in_memory
+        self._logs: Dict[str, EventLog] = {}
+        self._lock = threading.Lock()
+        self._reaper: Optional[threading.Thread] = None
+
+    def _spill_path(self, job_id: str) -> Optional[Path]:
+        # Job IDs come from URLs; never build a path from anything unexpected
+        if not _SAFE_JOB_ID.match(job_id):
+            return None
+        return self.spill_dir / f"{job_id}.jsonl"
+
+    def _spill(self, job_id: str, log: EventLog) -> None:
+        path = self._spill_path(job_id)
+        if path is None:
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=str(path.parent), suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            for event in log.since(0):
+                f.write(json.dumps(event[1]) + "\n")
+        os.replace(tmp, path)
+
+    def _restore(self, job_id: str) -> Optional[EventLog]:
+        path = self._spill_path(job_id)
+        if path is None or not path.exists():
+            return None
+        with open(path) as f:
+            return EventLog([json.loads(line) for line in f if line.strip()])
+
+    def evict(self, now: Optional[float] = None) -> int:
+        """
+        Spill finished logs that are past their TTL or over the in-memory limit.
+
+        Returns:
+            Number of logs evicted
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            finished = [(job_id, log) for job_id, log in self._logs.items() if log.closed]
+            finished.sort(key=lambda item: item[1].updated)
+            excess = len(finished) - self.max_in_memory
+            victims = [
+                (job_id, log) for i, (job_id, log) in enumerate(finished)
+                if i < excess or now - log.updated > self.ttl_seconds
+            ]
+            for job_id, log in victims:
+                try:
+                    self._spill(job_id, log)
+                except OSError as e:
+                    print(f"Could not spill events of job {job_id}: {e}")
+                    continue
+                del self._logs[job_id]
+            return len(victims)
+
+    def start_reaper(self, interval: float = 60.0) -> None:
+        """Evict expired logs periodically on a daemon thread (idempotent)."""
+        def reap():
+            while True:
+                time.sleep(interval)
+                self.evict()
+
+        with self._lock:
+            if self._reaper is None:
+                self._reaper = threading.Thread(target=reap, name="event-log-reaper", daemon=True)
+                self._reaper.start()
+
+    def __len__(self) -> int:
+        return len(self._logs)
+
+    def discard(self, job_id: str) -> None:
+        """Forget a job's log, in memory and on disk."""
+        with self._lock:
+            self._logs.pop(job_id, None)
+            path = self._spill_path(job_id)
+            if path is not None:
+                path.unlink(missing_ok=True)
+
+    def log(self, job_id: str, create: bool = False) -> Optional[EventLog]:
+        """Return a job's log, reloading an evicted one or optionally creating it."""
+        with self._lock:
+            log = self._logs.get(job_id)
+            if log is None:
+                log = self._restore(job_id)
+                if log is None and create:
+                    log = EventLog()
+                if log is not None:
+                    self._logs[job_id] = log
+            return log
+
+    def publish(self, job_id: str, event: Dict[str, Any]) -> int:
+        """Append an event to a job's log and return its ID."""
+        event_id = self.log(job_id, create=True).append(event)
+        if event.get("status") in TERMINAL_STATUSES:
+            self.evict()
+        return event_id
+
+    def subscribe(
+        self,
+        job_id: str,
+        last_event_id: int = 0,
+        heartbeat: float = 15.0,
+    ) -> Iterator[Optional[Tuple[int, Dict[str, Any]]]]:
+        """
+        Yield a job's events after ``last_event_id`` as they are published.
+
+        Yields None after ``heartbeat`` seconds without events so the caller
+        can keep the connection alive. The iterator ends once the job has
+        emitted a terminal event and the subscriber has received it.
+
+        Args:
+            job_id: Job to follow
+            last_event_id: ID of the last event the subscriber already has
+            heartbeat: Seconds between keep-alive yields while idle
+        """
+        log = self.log(job_id, create=True)
+        cursor = last_event_id
+        while True:
+            pending = log.since(cursor)
+            for event_id, event in pending:
+                cursor = event_id
+                yield event_id, event
+            if log.closed and cursor >= log.last_id:
+                return
+            if not log.wait(cursor, heartbeat):
+                yield None
@@ -0,0 +1,318 @@
+"""Persistent, bounded job queue for paper generation.
+
+Jobs submitted through the API are stored in SQLite and executed by a fixed
+pool of worker threads, so the number of concurrent pipelines is bounded and
+queued jobs survive a restart. Several processes may share one database:
+a worker claims a job under a lease that its process renews while the job
+runs. Jobs whose lease has expired, because the process running them died,
+are queued again; pipeline-mode jobs then resume from their checkpoints.
+"""
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config import get_config
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+ERROR = "error"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    topic TEXT NOT NULL,
+    output_filename TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    status TEXT NOT NULL,
+    queued_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    error TEXT,
+    options TEXT,
+    owner TEXT,
+    lease_until REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, queued_at);
+CREATE INDEX IF NOT EXISTS jobs_queued_at ON jobs (queued_at);
+"""
+
+
+class QueueFullError(RuntimeError):
+    """Raised when a job is submitted while the queue is at capacity."""
+
+
+def _job(row: sqlite3.Row) -> Dict[str, Any]:
+    """Convert a jobs row to a dict with its options decoded."""
+    job = dict(row)
+    job["options"] = json.loads(job["options"] or "{}")
+    return job
+
+
+class JobQueue:
+    """SQLite-backed FIFO job queue drained by a bounded worker pool."""
+
+    def __init__(
+        self,
+        handler: Callable[..., None],
+        path: Optional[str] = None,
+        max_workers: Optional[int] = None,
+        max_queued: Optional[int] = None,
+        on_prune: Optional[Callable[[str], None]] = None,
+    ):
+        """
+        Args:
+            handler: Called as handler(job_id, topic, output_filename, mode,
+                **options) on a worker thread; raising marks the job as failed
+            path: SQLite database file (default: server.job_queue.path)
+            max_workers: Jobs executed at once (default: server.job_queue.max_workers)
+            max_queued: Waiting jobs accepted before submit raises QueueFullError
+            on_prune: Called with the ID of every job whose record is deleted
+                after the retention period, to remove the job's files
+        """
+        settings = get_config()["server"]["job_queue"]
+        self.handler = handler
+        self.on_prune = on_prune
+        self.path = Path(path or settings["path"])
+        self.max_workers = max_workers or settings["max_workers"]
+        self.max_queued = settings["max_queued"] if max_queued is None else max_queued
+        self.retention_seconds = settings["retention_seconds"]
+        self.lease_seconds = settings["lease_seconds"]
+        # Identifies this queue's claims among every process sharing the database
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._local = threading.local()
+        self._wakeup = threading.Condition()
+        self._workers = []
+        self._stopping = False
+        # Separate from _wakeup so the heartbeat never takes a worker's notify()
+        self._halt = threading.Event()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = self._connect()
+        conn.executescript(_SCHEMA)
+        # Databases created before per-job options and leases existed lack the columns
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+        for column, kind in (("options", "TEXT"), ("owner", "TEXT"), ("lease_until", "REAL")):
+            if column not in columns:
+                conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+
+    def _connect(self) -> sqlite3.Connection:
+        """Return this thread's connection, opening it on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def start(self) -> None:
+        """Re-queue interrupted jobs and start the worker threads (idempotent)."""
+        with self._wakeup:
+            if self._workers:
+                return
+            self._stopping = False
+            self._halt.clear()
+            self._requeue_expired()
+            heartbeat = threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True)
+            heartbeat.start()
+            self._workers.append(heartbeat)
+            for i in range(self.max_workers):
+                worker = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    def _requeue_expired(self) -> int:
+        """Queue running jobs again whose owner stopped renewing their lease."""
+        cursor = self._connect().execute(
+            "UPDATE jobs SET status = ?, started_at = NULL, owner = NULL, lease_until = NULL "
+            "WHERE status = ? AND (lease_until IS NULL OR lease_until < ?)",
+            (QUEUED, RUNNING, time.time()),
+        )
+        return cursor.rowcount
+
+    def _heartbeat(self) -> None:
+        """Renew the leases of this queue's running jobs and recover other processes' dead ones."""
+        while not self._halt.wait(timeout=self.lease_seconds / 3):
+            try:
+                conn = self._connect()
+                conn.execute(
+                    "UPDATE jobs SET lease_until = ? WHERE status = ? AND owner = ?",
+                    (time.time() + self.lease_seconds, RUNNING, self.owner),
+                )
+                if self._requeue_expired():
+                    with self._wakeup:
+                        self._wakeup.notify_all()
+            except sqlite3.Error as e:
+                print(f"Could not renew job leases: {e}")
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop the workers after their current jobs finish."""
+        with self._wakeup:
+            self._stopping = True
+            self._wakeup.notify_all()
+        self._halt.set()
+        for worker in self._workers:
+            worker.join(timeout)
+        self._workers = []
+
+    def submit(
+        self,
+        job_id: str,
+        topic: str,
+        output_filename: str,
+        mode: str,
+        options: Optional[Dict[str, Any]] = None,
+    ) -> int:
+        """
+        Queue a job, or queue an existing job again (e.g. to resume it).
+
+        Args:
+            job_id: Unique job identifier
+            topic: The research topic
+            output_filename: Name of the PDF to produce
+            mode: coordinator or pipeline
+            options: Extra JSON-serializable keyword arguments for the handler
+
+        Returns:
+            The job's 1-based position in the queue
+
+        Raises:
+            QueueFullError: If max_queued jobs are already waiting
+        """
+        self.start()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            waiting = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()[0]
+            if waiting >= self.max_queued:
+                raise QueueFullError(f"{waiting} jobs are already waiting")
+            pruned = self._prune(conn)
+            conn.execute(
+                "INSERT INTO jobs (job_id, topic, output_filename, mode, status, queued_at, options) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(job_id) DO UPDATE SET status = excluded.status, options = excluded.options, "
+                "queued_at = excluded.queued_at, started_at = NULL, finished_at = NULL, error = NULL, "
+                "owner = NULL, lease_until = NULL",
+                (job_id, topic, output_filename, mode, QUEUED, time.time(), json.dumps(options or {})),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        with self._wakeup:
+            self._wakeup.notify()
+        for pruned_id in pruned:
+            if self.on_prune is not None and pruned_id != job_id:
+                try:
+                    self.on_prune(pruned_id)
+                except Exception as e:
+                    print(f"Could not remove files of pruned job {pruned_id}: {e}")
+        return self.position(job_id)
+
+    def _prune(self, conn: sqlite3.Connection) -> List[str]:
+        """Delete finished jobs older than the retention period and return their IDs."""
+        where = "status IN (?, ?) AND finished_at < ?"
+        params = (COMPLETED, ERROR, time.time() - self.retention_seconds)
+        pruned = [row[0] for row in conn.execute(f"SELECT job_id FROM jobs WHERE {where}", params)]
+        conn.execute(f"DELETE FROM jobs WHERE {where}", params)
+        return pruned
+
+    def list(
+        self,
+        offset: int = 0,
+        limit: int = 20,
+        status: Optional[str] = None,
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        List jobs, newest first.
+
+        Args:
+            offset: Number of jobs to skip
+            limit: Maximum number of jobs to return
+            status: Only return jobs in this state
+
+        Returns:
+            (jobs, total) where total counts every job matching ``status``
+        """
+        where, params = ("WHERE status = ?", (status,)) if status else ("", ())
+        conn = self._connect()
+        total = conn.execute(f"SELECT COUNT(*) FROM jobs {where}", params).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT * FROM jobs {where} ORDER BY queued_at DESC, rowid DESC LIMIT ? OFFSET ?",
+            params + (limit, offset),
+        ).fetchall()
+        return [_job(row) for row in rows], total
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return a job's record, or None if it is unknown."""
+        row = self._connect().execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return _job(row) if row else None
+
+    def position(self, job_id: str) -> int:
+        """Return the 1-based queue position of a waiting job, or 0 otherwise."""
+        row = self._connect().execute(
+            "SELECT COUNT(*) FROM jobs AS other, jobs AS job "
+            "WHERE job.job_id = ? AND job.status = ? AND other.status = ? "
+            "AND (other.queued_at, other.rowid) <= (job.queued_at, job.rowid)",
+            (job_id, QUEUED, QUEUED),
+        ).fetchone()
+        return row[0]
+
+    def depth(self) -> Dict[str, int]:
+        """Return the number of jobs in each state."""
+        counts = dict(self._connect().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return {status: counts.get(status, 0) for status in (QUEUED, RUNNING, COMPLETED, ERROR)}
+
+    def _claim(self) -> Optional[Dict[str, Any]]:
+        """Atomically mark the oldest queued job as running and return it."""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = ? ORDER BY queued_at, rowid LIMIT 1", (QUEUED,)
+            ).fetchone()
+            if row is not None:
+                now = time.time()
+                conn.execute(
+                    "UPDATE jobs SET status = ?, started_at = ?, owner = ?, lease_until = ? WHERE job_id = ?",
+                    (RUNNING, now, self.owner, now + self.lease_seconds, row["job_id"]),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return _job(row) if row else None
+
+    def _finish(self, job_id: str, status: str, error: Optional[str] = None) -> None:
+        # A job whose lease was lost now belongs to whichever process re-claimed it
+        self._connect().execute(
+            "UPDATE jobs SET status = ?, finished_at = ?, error = ?, lease_until = NULL "
+            "WHERE job_id = ? AND owner = ?",
+            (status, time.time(), error, job_id, self.owner),
+        )
+
+    def _work(self) -> None:
+        while True:
+            with self._wakeup:
+                if self._stopping:
+                    return
+            job = self._claim()
+            if job is None:
+                with self._wakeup:
+                    if not self._stopping:
+                        # Poll occasionally so jobs queued by another process are picked up
+                        self._wakeup.wait(timeout=5)
+                continue
+            try:
+                self.handler(job["job_id"], job["topic"], job["output_filename"], job["mode"], **job["options"])
+                self._finish(job["job_id"], COMPLETED)
+            except Exception as e:
+                print(f"Job {job['job_id']} failed: {e}")
+                self._finish(job["job_id"], ERROR, str(e))
@@ -1 +1,15 @@
-"""Test suite for the AI Research Agent.""" 
\ No newline at end of file
+"""Test suite for the AI Research Agent."""
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from config import get_config
+
+# Spans recorded while the suite runs go to a throwaway directory, not outputs/traces
+_trace_dir = tempfile.mkdtemp(prefix="test-traces-")
+atexit.register(shutil.rmtree, _trace_dir, ignore_errors=True)
+get_config()["tracing"]["path"] = os.path.join(_trace_dir, "spans.jsonl")
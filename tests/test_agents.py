@@ -0,0 +1,451 @@
+"""Tests for agent orchestration helpers."""
+import os
+import sys
+import tempfile
+import threading
+import time
+import json
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import FrozenInstanceError
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from agents.checkpoints import CheckpointStore
+from agents.coordinator import coordinator_agent
+from agents.factory import agent_specs, get_agent
+from agents.drafting_scheduler import DraftingScheduler, SectionDraft
+from agents.runtime import run_agent
+from agents.pipeline import (
+    CitationResult,
+    PipelineResult,
+    ResearchPipeline,
+    build_paper_content,
+    extract_title,
+    job_checkpoints,
+    split_marked_sections,
+)
+from callbacks import tracing
+from config import get_config
+from tools.cache import ResultCache
+from tools.literature_fanout import LiteratureBatch, LiteratureStream
+from tools.outline_utils import section_query
+from tools.papers import Paper
+
+
+class TestDraftingScheduler(unittest.TestCase):
+    """Tests for concurrent section drafting."""
+
+    SECTIONS = [
+        {"name": "Introduction", "text": "protein folding\n"},
+        {"name": "Related Work", "text": "graph attention\n"},
+        {"name": "Methodology", "text": "message passing\n"},
+    ]
+    PAPERS = [
+        {"title": "Protein folding", "abstract": "Proteins."},
+        {"title": "Graph attention networks", "abstract": "Attention."},
+        {"title": "Message passing", "abstract": "Molecules."},
+    ]
+
+    def test_concurrent_and_ordered(self):
+        """Sections run concurrently but come back in outline order."""
+        active = []
+        peak = []
+        lock = threading.Lock()
+
+        def fake_run(agent, message, state=None):
+            with lock:
+                active.append(1)
+                peak.append(len(active))
+            # Finish in reverse order to prove reassembly is deterministic
+            time.sleep(0.05 * (4 - len(message) % 3))
+            with lock:
+                active.pop()
+            return f"Draft of {state['section_name']}"
+
+        scheduler = DraftingScheduler(agent=MagicMock(), max_concurrency=3, top_k=1, run=fake_run)
+        drafts = scheduler.draft("topic", self.SECTIONS, self.PAPERS)
+
+        self.assertEqual([d.name for d in drafts], ["Introduction", "Related Work", "Methodology"])
+        self.assertEqual(drafts[1].text, "Draft of Related Work")
+        self.assertEqual(drafts[1].papers, [self.PAPERS[1]])
+        self.assertGreater(max(peak), 1)
+
+    def test_failed_section_retried_individually(self):
+        """Only the failing section is retried; persistent failures are reported."""
+        calls = {}
+
+        def fake_run(agent, message, state=None):
+            name = state["section_name"]
+            calls[name] = calls.get(name, 0) + 1
+            if name == "Related Work" and calls[name] < 2:
+                raise RuntimeError("transient")
+            if name == "Methodology":
+                raise RuntimeError("always fails")
+            return "ok"
+
+        scheduler = DraftingScheduler(agent=MagicMock(), max_retries=2, retry_backoff=0, top_k=0, run=fake_run)
+        drafts = scheduler.draft("topic", self.SECTIONS, self.PAPERS)
+
+        self.assertEqual(calls, {"Introduction": 1, "Related Work": 2, "Methodology": 3})
+        self.assertTrue(drafts[1].ok)
+        self.assertFalse(drafts[2].ok)
+        self.assertEqual(drafts[2].error, "always fails")
+
+    def test_streaming_starts_ready_sections_early(self):
+        """A section is drafted as soon as its searches are in, before the literature stream ends."""
+        sources = get_config()["tools"]["literature_fanout"]["sources"]
+        queries = ["topic"] + [section_query("topic", s) for s in self.SECTIONS]
+        tasks = [(source, query) for query in queries for source in sources]
+        intro_started = threading.Event()
+        started_early = []
+
+        def batches():
+            for i, (source, query) in enumerate(tasks):
+                if query == queries[2] and not started_early:
+                    # Introduction's searches are all in; wait for its draft to begin
+                    started_early.append(intro_started.wait(5))
+                yield LiteratureBatch(i, source, query, [Paper(title=self.PAPERS[i % 3]["title"])])
+
+        def fake_run(agent, message, state=None):
+            if state["section_name"] == "Introduction":
+                intro_started.set()
+            return f"Draft of {state['section_name']}"
+
+        stream = LiteratureStream("topic", batches=batches())
+        literature_done = MagicMock()
+        scheduler = DraftingScheduler(agent=MagicMock(), max_concurrency=2, top_k=1, run=fake_run)
+        drafts = scheduler.draft_streaming("topic", self.SECTIONS, stream, on_literature_done=literature_done)
+
+        self.assertEqual(started_early, [True])
+        literature_done.assert_called_once()
+        self.assertEqual([d.text for d in drafts], [f"Draft of {s['name']}" for s in self.SECTIONS])
+        self.assertEqual(drafts[0].papers[0]["title"], "Protein folding")
+
+    def test_streaming_aborts_when_literature_fails(self):
+        """An error from on_literature_done propagates once the stream is exhausted."""
+        stream = LiteratureStream("topic", batches=iter([]))
+        scheduler = DraftingScheduler(agent=MagicMock(), top_k=1, run=MagicMock())
+        with self.assertRaises(ValueError):
+            scheduler.draft_streaming("topic", self.SECTIONS, stream,
+                                      on_literature_done=MagicMock(side_effect=ValueError("no papers")))
+        scheduler.run.assert_not_called()
+
+
+class TestAgentFactory(unittest.TestCase):
+    """Tests for the agent spec registry and cached factory."""
+
+    def test_trees_cached_per_model(self):
+        """Each model gets its own tree, built once and reused."""
+        tree = get_agent("research_coordinator", "model-a")
+        self.assertIs(get_agent("research_coordinator", "model-a"), tree)
+        other = get_agent("research_coordinator", "model-b")
+        self.assertIsNot(other, tree)
+        self.assertEqual({agent.model for agent in tree.sub_agents}, {"model-a"})
+        self.assertEqual({agent.model for agent in other.sub_agents}, {"model-b"})
+        self.assertIs(tree.sub_agents[0].parent_agent, tree)
+
+    def test_shared_agents_untouched(self):
+        """Building configured trees never mutates the module-level agents."""
+        default_models = [agent.model for agent in coordinator_agent.sub_agents]
+        get_agent("research_coordinator", "model-c")
+        self.assertEqual([agent.model for agent in coordinator_agent.sub_agents], default_models)
+        self.assertIsNone(get_agent("outline_agent", "model-c").parent_agent)
+
+    def test_specs_immutable(self):
+        """Specs and the registry cannot be modified."""
+        specs = agent_specs()
+        with self.assertRaises(FrozenInstanceError):
+            specs["outline_agent"].model = "other"
+        with self.assertRaises(TypeError):
+            specs["outline_agent"] = None
+        self.assertEqual(specs["research_coordinator"].sub_agents[0], "outline_agent")
+
+
+class TestPipelineHelpers(unittest.TestCase):
+    """Tests for the deterministic pipeline's parsing and structuring helpers."""
+
+    def test_extract_title(self):
+        """The outline's title line wins over the topic."""
+        self.assertEqual(extract_title("**Title:** Fast GNNs\n## Introduction", [], "gnn"), "Fast GNNs")
+        self.assertEqual(extract_title("## Introduction\n- point", [], "gnn"), "gnn")
+
+    def test_split_marked_sections(self):
+        """Text is split on '## ' headings only."""
+        text = "## Introduction\nFirst [1].\n### Detail\nMore.\n## References\n[1] A. Author."
+        self.assertEqual(split_marked_sections(text), [
+            ("Introduction", "First [1].\n### Detail\nMore."),
+            ("References", "[1] A. Author."),
+        ])
+
+    def test_build_paper_content(self):
+        """Sections map to template keys, unknown ones nest, and text is escaped."""
+        content = build_paper_content(
+            "GNNs & Folding",
+            [
+                {"name": "Introduction", "text": "100% **new** [1]."},
+                {"name": "Case Study", "text": "Extra."},
+                {"name": "Conclusions", "text": "Done."},
+            ],
+            ["A. Author, \"Paper,\" 2021."],
+        )
+        self.assertEqual(content["title"], "GNNs \\& Folding")
+        self.assertIn("100\\% \\textbf{new} [1].", content["introduction"])
+        self.assertIn("\\subsection*{Case Study}", content["introduction"])
+        self.assertEqual(content["conclusion"], "Done.")
+        self.assertEqual(content["references"], "\\bibitem{ref1} A. Author, \"Paper,\" 2021.")
+
+
+class TestCheckpoints(unittest.TestCase):
+    """Tests for stage checkpoints and pipeline resume."""
+
+    INPUTS = {"topic": "gnn", "output_filename": "paper.pdf"}
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_round_trip_and_input_hash(self):
+        """Saved stages are restored only for the inputs they were computed from."""
+        store = CheckpointStore("job1", self.INPUTS, root=self.tmp.name)
+        store.save("outline", {"title": "T"})
+        store.save_section("Introduction", {"name": "Introduction", "text": "Intro."})
+
+        reopened = CheckpointStore.open("job1", root=self.tmp.name)
+        self.assertEqual(reopened.inputs, self.INPUTS)
+        self.assertEqual(reopened.completed(), ["outline"])
+        self.assertEqual(reopened.load("outline"), {"title": "T"})
+        self.assertIsNone(reopened.load("literature"))
+        self.assertIn("Introduction", reopened.load_sections())
+
+        changed = CheckpointStore("job1", {**self.INPUTS, "topic": "other"}, root=self.tmp.name)
+        self.assertEqual(changed.completed(), [])
+        self.assertIsNone(changed.load("outline"))
+        self.assertEqual(changed.load_sections(), {})
+        self.assertIsNone(CheckpointStore.open("missing", root=self.tmp.name))
+
+        CheckpointStore.remove("job1", root=self.tmp.name)
+        self.assertIsNone(CheckpointStore.open("job1", root=self.tmp.name))
+
+    def test_job_inputs_include_model_template_and_renderer(self):
+        """Stages checkpointed under one model, template or renderer are not reused under another."""
+        with patch.dict(get_config()["pipeline"], {"checkpoint_dir": self.tmp.name}):
+            job_checkpoints("job4", "gnn", "paper.pdf", model="m1", template="acm").save("outline", {"title": "T"})
+            inputs = CheckpointStore.open("job4").inputs
+            self.assertEqual((inputs["model"], inputs["template"], inputs["renderer"]),
+                             ("m1", "acm", get_config()["paper"]["renderer"]))
+            self.assertEqual(job_checkpoints("job4", "gnn", "paper.pdf", model="m1", template="acm").completed(), ["outline"])
+            for changed in ({"model": "m2", "template": "acm"}, {"model": "m1", "template": "ieee"},
+                            {"model": "m1", "template": "acm", "renderer": "fast"}):
+                self.assertIsNone(job_checkpoints("job4", "gnn", "paper.pdf", **changed).load("outline"))
+
+    def test_resume_skips_completed_work(self):
+        """A resumed run restores finished stages and drafts only missing sections."""
+        store = CheckpointStore("job2", self.INPUTS, root=self.tmp.name)
+        store.save("outline", {"title": "T", "text": "outline", "sections": [
+            {"name": "Introduction", "text": ""}, {"name": "Methodology", "text": ""},
+        ]})
+        store.save("literature", {"papers": [{"title": "P"}]})
+        store.save_section("Introduction", {"name": "Introduction", "text": "Saved intro."})
+
+        pipeline = ResearchPipeline(checkpoints=CheckpointStore.open("job2", root=self.tmp.name))
+        pipeline.outline_stage = MagicMock()
+        pipeline.literature_stage = MagicMock()
+        pipeline.citation_stage = MagicMock(side_effect=lambda drafts, lit: CitationResult(drafts.sections, []))
+        pipeline.formatting_stage = MagicMock(return_value=PipelineResult("paper.pdf", {}))
+
+        with patch.object(DraftingScheduler, "draft", return_value=[
+            SectionDraft(name="Methodology", text="New method.")
+        ]) as draft:
+            pipeline.run("gnn", "paper.pdf")
+
+        pipeline.outline_stage.assert_not_called()
+        pipeline.literature_stage.assert_not_called()
+        self.assertEqual([s["name"] for s in draft.call_args[0][1]], ["Methodology"])
+        cited = pipeline.citation_stage.call_args[0][0]
+        self.assertEqual(cited.sections, [
+            {"name": "Introduction", "text": "Saved intro."},
+            {"name": "Methodology", "text": "New method."},
+        ])
+        self.assertEqual(pipeline.checkpoints.completed(),
+                         ["outline", "literature", "drafting", "citation", "formatting"])
+
+    def test_early_start_overlaps_literature_and_drafting(self):
+        """Without a literature checkpoint, drafting runs off the literature stream."""
+        store = CheckpointStore("job3", self.INPUTS, root=self.tmp.name)
+        store.save("outline", {"title": "T", "text": "## Introduction\n- protein folding\n", "sections": [
+            {"name": "Introduction", "text": "- protein folding\n"},
+        ]})
+
+        def fake_search(query, max_results):
+            return [{"title": f"Paper on {query}", "summary": "protein folding", "published": "2020"}]
+
+        pipeline = ResearchPipeline(checkpoints=CheckpointStore.open("job3", root=self.tmp.name))
+        pipeline.literature_stage = MagicMock()
+        pipeline.citation_stage = MagicMock(side_effect=lambda drafts, lit: CitationResult(drafts.sections, []))
+        pipeline.formatting_stage = MagicMock(return_value=PipelineResult("paper.pdf", {}))
+
+        with patch.dict("tools.literature_fanout.SEARCH_FUNCS", {"arxiv": fake_search, "semantic_scholar": fake_search}), \
+             patch.object(DraftingScheduler, "_draft_one",
+                          lambda self, topic, section, papers: SectionDraft(section["name"], "Intro.", papers)):
+            result = pipeline.run("gnn", "paper.pdf")
+
+        pipeline.literature_stage.assert_not_called()
+        self.assertEqual(pipeline.citation_stage.call_args[0][0].sections, [{"name": "Introduction", "text": "Intro."}])
+        self.assertEqual(len(pipeline.checkpoints.load("literature")["papers"]), 2)
+        self.assertEqual(pipeline.checkpoints.completed(),
+                         ["outline", "literature", "drafting", "citation", "formatting"])
+        self.assertLessEqual(result.timings["literature"], result.timings["drafting"])
+
+
+class TestResponseCache(unittest.TestCase):
+    """Tests for memoized agent replies."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        cache = ResultCache(os.path.join(tmp.name, "responses.sqlite3"), namespace="responses")
+        patcher = patch('agents.runtime.get_response_cache', return_value=cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.agent = MagicMock(model="gemini-2.0-flash", instruction="Write well.")
+        self.agent.name = "drafting_agent"
+
+    @patch('agents.runtime._run_uncached', return_value="reply")
+    def test_identical_calls_replayed(self, run):
+        """Repeated calls hit the cache; any change to the key inputs misses."""
+        self.assertEqual(run_agent(self.agent, "msg", state={"section_name": "Intro"}), "reply")
+        self.assertEqual(run_agent(self.agent, "msg", state={"section_name": "Intro"}), "reply")
+        self.assertEqual(run.call_count, 1)
+
+        run_agent(self.agent, "msg", state={"section_name": "Methods"})
+        self.agent.instruction = "Write better."
+        run_agent(self.agent, "msg", state={"section_name": "Intro"})
+        self.agent.model = "gemini-2.5-pro"
+        run_agent(self.agent, "msg", state={"section_name": "Intro"})
+        self.assertEqual(run.call_count, 4)
+
+    @patch('agents.runtime._run_uncached', return_value="reply")
+    def test_bypass(self, run):
+        """use_cache=False always calls the model."""
+        run_agent(self.agent, "msg")
+        run_agent(self.agent, "msg", use_cache=False)
+        self.assertEqual(run.call_count, 2)
+
+
+class TestTracing(unittest.TestCase):
+    """Tests for span nesting, OTLP export and the agent callbacks."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "spans.jsonl")
+        self.exporter = tracing.JsonFileExporter(self.path, "test-service", max_batch=1000)
+        patcher = patch('callbacks.tracing._tracer', tracing.Tracer(self.exporter))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def exported(self):
+        self.exporter.flush()
+        spans = {}
+        with open(self.path) as f:
+            for line in f:
+                resource = json.loads(line)["resourceSpans"][0]
+                self.assertEqual(resource["resource"]["attributes"][0]["value"]["stringValue"], "test-service")
+                for span in resource["scopeSpans"][0]["spans"]:
+                    spans[span["name"]] = span
+        return spans
+
+    def test_nesting_across_threads(self):
+        """Spans started in pool threads nest under the submitting span."""
+        with tracing.span("job", tracing.SERVER, **{"job.id": "j1"}):
+            with tracing.span("stage drafting"):
+                with ThreadPoolExecutor(max_workers=2) as pool:
+                    def draft(i):
+                        with tracing.span(f"section {i}", size=i):
+                            pass
+                    list(pool.map(tracing.propagating(draft), [1, 2]))
+
+        spans = self.exported()
+        job, stage = spans["job"], spans["stage drafting"]
+        self.assertNotIn("parentSpanId", job)
+        self.assertEqual(job["kind"], tracing.SERVER)
+        self.assertEqual(stage["parentSpanId"], job["spanId"])
+        for name in ("section 1", "section 2"):
+            self.assertEqual(spans[name]["parentSpanId"], stage["spanId"])
+            self.assertEqual(spans[name]["traceId"], job["traceId"])
+        self.assertEqual(spans["section 2"]["attributes"], [{"key": "size", "value": {"intValue": "2"}}])
+        self.assertLessEqual(int(job["startTimeUnixNano"]), int(stage["startTimeUnixNano"]))
+        self.assertLessEqual(int(stage["endTimeUnixNano"]), int(job["endTimeUnixNano"]))
+        self.assertEqual(job["status"], {"code": 1})
+
+    def test_error_recorded_and_raised(self):
+        with self.assertRaises(ValueError):
+            with tracing.span("job"):
+                raise ValueError("boom")
+        status = self.exported()["job"]["status"]
+        self.assertEqual(status, {"code": 2, "message": "boom"})
+
+    def test_callbacks_use_parent_from_session_state(self):
+        """ADK callbacks on another thread attach to the span named in session state."""
+        with tracing.span("job") as job:
+            state = tracing.trace_state()
+        context = SimpleNamespace(invocation_id="inv", agent_name="drafting_agent", state=state)
+        tool = SimpleNamespace(name="select_papers")
+        tool_context = SimpleNamespace(invocation_id="inv", function_call_id="call-1", state=state)
+        request = SimpleNamespace(model="gemini-2.0-flash", contents=[])
+        response = SimpleNamespace(content=None, partial=False, error_code="429", error_message="quota",
+                                   usage_metadata=SimpleNamespace(prompt_token_count=10,
+                                                                  candidates_token_count=5,
+                                                                  total_token_count=15))
+
+        def run_agent_thread():
+            tracing.before_agent(callback_context=context)
+            tracing.before_model(callback_context=context, llm_request=request)
+            tracing.after_model(callback_context=context, llm_response=response)
+            tracing.before_tool(tool=tool, args={"query": "x"}, tool_context=tool_context)
+            tracing.after_tool(tool=tool, args={"query": "x"}, tool_context=tool_context,
+                               tool_response={"status": "error", "message": "no papers"})
+            tracing.after_agent(callback_context=context)
+
+        worker = threading.Thread(target=run_agent_thread)
+        worker.start()
+        worker.join()
+
+        spans = self.exported()
+        agent = spans["agent drafting_agent"]
+        self.assertEqual(agent["parentSpanId"], job.span_id)
+        self.assertEqual(spans["llm gemini-2.0-flash"]["parentSpanId"], agent["spanId"])
+        self.assertEqual(spans["tool select_papers"]["parentSpanId"], agent["spanId"])
+        llm_attributes = {a["key"]: a["value"] for a in spans["llm gemini-2.0-flash"]["attributes"]}
+        self.assertEqual(llm_attributes["llm.usage.total_token_count"], {"intValue": "15"})
+        self.assertEqual(spans["llm gemini-2.0-flash"]["status"]["code"], 2)
+        self.assertEqual(spans["tool select_papers"]["status"], {"code": 2, "message": "no papers"})
+        self.assertEqual(agent["status"], {"code": 1})
+
+    def test_file_rotated_by_size(self):
+        """The span file is rotated at max_bytes and only backup_count old files are kept."""
+        exporter = tracing.JsonFileExporter(self.path, "test-service", max_batch=1, max_bytes=2000, backup_count=2)
+        with patch('callbacks.tracing._tracer', tracing.Tracer(exporter)):
+            for i in range(40):
+                with tracing.span(f"job {i}", padding="x" * 200):
+                    pass
+        files = sorted(os.listdir(os.path.dirname(self.path)))
+        self.assertEqual(files, ["spans.jsonl", "spans.jsonl.1", "spans.jsonl.2"])
+        for name in files:
+            self.assertLessEqual(os.path.getsize(os.path.join(os.path.dirname(self.path), name)), 2000)
+        with open(self.path) as f:
+            self.assertIn('"job 39"', f.read())
+
+    def test_disabled(self):
+        with patch.dict(tracing.get_config()["tracing"], {"enabled": False}):
+            with tracing.span("job") as span:
+                self.assertIs(span, tracing.NOOP_SPAN)
+                self.assertEqual(tracing.trace_state(), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
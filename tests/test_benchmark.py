@@ -0,0 +1,66 @@
+"""Tests for the offline benchmark harness."""
+import os
+import sys
+import unittest
+from unittest.mock import patch
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from config import get_config
+from evaluation.benchmark import StubSearchServer, compare, fake_outline, percentile, run_benchmark
+from tools.arxiv_search import _fetch_arxiv
+from tools.outline_utils import parse_outline_sections
+from tools.semantic_scholar import search_semantic_func
+
+
+class TestBenchmark(unittest.TestCase):
+    """Tests for the stub search server, the fake model and the report."""
+
+    def test_stub_server_speaks_both_apis(self):
+        server = StubSearchServer(latency_seconds=0).start()
+        self.addCleanup(server.stop)
+        with patch.dict(get_config()["tools"]["arxiv"], {"api_url": f"{server.url}/api/query",
+                                                         "min_interval_seconds": 0}), \
+                patch.dict(get_config()["tools"]["semantic_scholar"], {"api_url": server.url,
+                                                                       "min_interval_seconds": 0}):
+            arxiv_papers = _fetch_arxiv("graph learning", 5)
+            again = _fetch_arxiv("graph learning", 5)
+            semantic_papers = search_semantic_func("graph learning", 4)
+        self.assertEqual(len(arxiv_papers), 5)
+        self.assertEqual(arxiv_papers, again)
+        self.assertTrue(arxiv_papers[0]["url"].startswith("http://arxiv.org/pdf/"))
+        self.assertEqual(len(semantic_papers), 4)
+        self.assertTrue(semantic_papers[0]["arxiv_id"])
+        self.assertEqual(server.requests, 3)
+
+    def test_fake_outline_parses(self):
+        names = [s["name"] for s in parse_outline_sections(fake_outline("Sparse attention"))]
+        self.assertIn("Introduction", names)
+        self.assertNotIn("References", names)
+
+    def test_pipeline_run_report(self):
+        """A small offline run completes and restores the configuration."""
+        before = get_config()["tools"]["arxiv"]["api_url"]
+        report = run_benchmark(jobs=2, concurrency=2, llm_latency=0, reply_words=30,
+                               search_latency=0, renderer="fast")
+        self.assertEqual((report["completed"], report["failed"]), (2, 0), report["errors"])
+        self.assertEqual(set(report["stage_seconds"]),
+                         {"outline", "literature", "drafting", "citation", "formatting"})
+        self.assertGreater(report["jobs_per_minute"], 0)
+        self.assertGreater(report["llm_calls"], 0)
+        self.assertEqual(get_config()["tools"]["arxiv"]["api_url"], before)
+
+    def test_percentile_and_compare(self):
+        self.assertEqual(percentile([3.0, 1.0, 2.0, 4.0], 0.5), 2.0)
+        self.assertEqual(percentile([3.0, 1.0, 2.0, 4.0], 0.95), 4.0)
+        baseline = {"job_seconds": {"p50": 1.0, "p95": 2.0}, "jobs_per_minute": 60.0,
+                    "stage_seconds": {"drafting": {"p50": 0.5, "p95": 1.0}}}
+        report = {"job_seconds": {"p50": 1.1, "p95": 3.0}, "jobs_per_minute": 40.0,
+                  "stage_seconds": {"drafting": {"p50": 0.5, "p95": 1.0}}}
+        regressions = compare(report, baseline, tolerance=0.2)
+        self.assertEqual([r.split(":")[0] for r in regressions], ["job p95", "jobs/minute"])
+
+
+if __name__ == '__main__':
+    unittest.main()
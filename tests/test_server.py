@@ -0,0 +1,465 @@
+"""Tests for the web API's job scheduling."""
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import api
+from agents.pipeline import job_checkpoints
+from callbacks.metrics import MetricsRegistry, labels
+from config import get_config
+from server.events import EventBroker
+from server.job_queue import COMPLETED, ERROR, QUEUED, RUNNING, JobQueue, QueueFullError
+
+
+def wait_for(predicate, timeout=5.0):
+    """Poll until predicate() is true or the timeout expires."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+class TestJobQueue(unittest.TestCase):
+    """Tests for the persistent, bounded job queue."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.path = os.path.join(self.temp_dir.name, "jobs.sqlite3")
+        self.release = threading.Event()
+        self.running = []
+
+    def handler(self, job_id, topic, output_filename, mode, **options):
+        self.running.append(job_id)
+        self.options = options
+        self.release.wait(5)
+        if topic == "fail":
+            raise RuntimeError("boom")
+
+    def make_queue(self, **kwargs):
+        job_queue = JobQueue(self.handler, path=self.path, **kwargs)
+        self.addCleanup(job_queue.stop, 5)
+        self.addCleanup(self.release.set)
+        return job_queue
+
+    def test_bounded_workers_and_positions(self):
+        """Only max_workers jobs run at once; the rest report their position."""
+        job_queue = self.make_queue(max_workers=2, max_queued=10)
+        for i in range(4):
+            job_queue.submit(f"job{i}", "topic", "paper.pdf", "pipeline")
+
+        self.assertTrue(wait_for(lambda: len(self.running) == 2))
+        time.sleep(0.05)
+        self.assertEqual(len(self.running), 2)
+        self.assertEqual(job_queue.depth()[RUNNING], 2)
+        self.assertEqual(job_queue.position("job2"), 1)
+        self.assertEqual(job_queue.position("job3"), 2)
+        self.assertEqual(job_queue.position("job0"), 0)
+
+        self.release.set()
+        self.assertTrue(wait_for(lambda: job_queue.depth()[COMPLETED] == 4))
+
+    def test_admission_control(self):
+        """Submissions beyond max_queued waiting jobs are rejected."""
+        job_queue = self.make_queue(max_workers=1, max_queued=1)
+        job_queue.submit("job0", "topic", "paper.pdf", "pipeline")
+        self.assertTrue(wait_for(lambda: self.running == ["job0"]))
+        job_queue.submit("job1", "topic", "paper.pdf", "pipeline")
+        with self.assertRaises(QueueFullError):
+            job_queue.submit("job2", "topic", "paper.pdf", "pipeline")
+
+    def test_failure_recorded(self):
+        """Exceptions from the handler mark the job as failed."""
+        self.release.set()
+        job_queue = self.make_queue(max_workers=1)
+        job_queue.submit("job0", "fail", "paper.pdf", "pipeline")
+        self.assertTrue(wait_for(lambda: job_queue.get("job0")["status"] == ERROR))
+        self.assertEqual(job_queue.get("job0")["error"], "boom")
+
+    def test_options_passed_to_handler(self):
+        """Per-job options are stored with the job and passed to the handler."""
+        self.release.set()
+        job_queue = self.make_queue(max_workers=1)
+        job_queue.submit("job0", "topic", "paper.pdf", "pipeline", {"renderer": "fast"})
+        self.assertTrue(wait_for(lambda: job_queue.get("job0")["status"] == COMPLETED))
+        self.assertEqual(self.options, {"renderer": "fast"})
+        self.assertEqual(job_queue.get("job0")["options"], {"renderer": "fast"})
+
+    def test_list_paginates_newest_first(self):
+        """Listing returns a page of jobs, newest first, with the total count."""
+        self.release.set()
+        job_queue = self.make_queue(max_workers=1)
+        for i in range(5):
+            job_queue.submit(f"job{i}", "topic", "paper.pdf", "pipeline")
+        self.assertTrue(wait_for(lambda: job_queue.depth()[COMPLETED] == 5))
+
+        jobs, total = job_queue.list(offset=2, limit=2)
+        self.assertEqual(total, 5)
+        self.assertEqual([job["job_id"] for job in jobs], ["job2", "job1"])
+        self.assertEqual(job_queue.list(status=QUEUED), ([], 0))
+
+    def test_finished_jobs_pruned_after_retention(self):
+        """Finished job records older than the retention period are deleted, with their files."""
+        self.release.set()
+        pruned = []
+        job_queue = self.make_queue(max_workers=1, on_prune=pruned.append)
+        job_queue.submit("old", "topic", "paper.pdf", "pipeline")
+        self.assertTrue(wait_for(lambda: job_queue.get("old")["status"] == COMPLETED))
+        job_queue._connect().execute("UPDATE jobs SET finished_at = 0 WHERE job_id = 'old'")
+        job_queue.submit("new", "topic", "paper.pdf", "pipeline")
+        self.assertIsNone(job_queue.get("old"))
+        self.assertEqual(pruned, ["old"])
+
+    def test_interrupted_jobs_requeued(self):
+        """Jobs left running by a dead process run again on start-up."""
+        first = JobQueue(self.handler, path=self.path, max_workers=1)
+        first._connect().execute(
+            "INSERT INTO jobs (job_id, topic, output_filename, mode, status, queued_at) "
+            "VALUES ('job0', 'topic', 'paper.pdf', 'pipeline', ?, ?)",
+            (RUNNING, time.time()),
+        )
+        self.release.set()
+        job_queue = self.make_queue(max_workers=1)
+        job_queue.start()
+        self.assertTrue(wait_for(lambda: job_queue.get("job0")["status"] == COMPLETED))
+        self.assertEqual(self.running, ["job0"])
+        self.assertNotIn(job_queue.get("job0")["status"], (QUEUED, RUNNING))
+
+    def test_live_jobs_kept_across_processes(self):
+        """A second queue on the same database leaves jobs with a live lease alone."""
+        first = self.make_queue(max_workers=1)
+        first.lease_seconds = 0.3
+        first.submit("job0", "topic", "paper.pdf", "pipeline")
+        self.assertTrue(wait_for(lambda: self.running == ["job0"]))
+
+        second = self.make_queue(max_workers=1)
+        second.lease_seconds = 0.3
+        second.start()
+        time.sleep(0.6)  # Two lease periods: only renewals keep job0 claimed
+        job = first.get("job0")
+        self.assertEqual((job["status"], job["owner"]), (RUNNING, first.owner))
+        self.assertEqual(self.running, ["job0"])
+
+        # A lapsed lease means the owner died; the surviving queue takes over
+        first.stop(0)
+        first._connect().execute("UPDATE jobs SET lease_until = 0 WHERE job_id = 'job0'")
+        self.assertTrue(wait_for(lambda: self.running == ["job0", "job0"]))
+        self.assertEqual(second.get("job0")["owner"], second.owner)
+        self.release.set()
+        self.assertTrue(wait_for(lambda: second.get("job0")["status"] == COMPLETED))
+
+
+class TestEventBroker(unittest.TestCase):
+    """Tests for replayable per-job event logs."""
+
+    def collect(self, broker, job_id, last_event_id=0):
+        return [item for item in broker.subscribe(job_id, last_event_id, heartbeat=0.05) if item]
+
+    def test_fan_out_to_concurrent_subscribers(self):
+        """Every subscriber receives every event, then the stream ends."""
+        broker = EventBroker()
+        results = [[], []]
+
+        def subscriber(i):
+            results[i] = self.collect(broker, "job")
+
+        threads = [threading.Thread(target=subscriber, args=(i,)) for i in range(2)]
+        for thread in threads:
+            thread.start()
+        broker.publish("job", {"status": "running", "message": "a"})
+        broker.publish("job", {"status": "completed", "message": "b"})
+        for thread in threads:
+            thread.join(5)
+
+        expected = [(1, {"status": "running", "message": "a"}), (2, {"status": "completed", "message": "b"})]
+        self.assertEqual(results, [expected, expected])
+
+    def test_resume_after_last_event_id(self):
+        """A reconnecting subscriber only receives events it has not seen."""
+        broker = EventBroker()
+        for i in range(3):
+            broker.publish("job", {"status": "running", "message": str(i)})
+        broker.publish("job", {"status": "error", "message": "failed"})
+        self.assertEqual([event_id for event_id, _ in self.collect(broker, "job", 2)], [3, 4])
+
+    def test_finished_logs_evicted_and_restored(self):
+        """Finished logs leave memory by TTL or count and reload from disk."""
+        with tempfile.TemporaryDirectory() as spill_dir:
+            broker = EventBroker(spill_dir=spill_dir, ttl_seconds=60, max_in_memory=1)
+            broker.publish("live", {"status": "running", "message": "working"})
+            broker.publish("a", {"status": "completed", "message": "done"})
+            broker.publish("b", {"status": "error", "message": "failed"})
+            # Over the count limit: the older finished log is spilled
+            self.assertEqual(len(broker), 2)
+            self.assertTrue(os.path.exists(os.path.join(spill_dir, "a.jsonl")))
+
+            # Past the TTL: every finished log goes, running jobs stay
+            broker.evict(now=time.time() + 120)
+            self.assertEqual(len(broker), 1)
+
+            restored = broker.log("a")
+            self.assertTrue(restored.closed)
+            self.assertEqual(restored.since(0), [(1, {"status": "completed", "message": "done"})])
+            # Restored history is not replayed to cursorless pollers
+            self.assertEqual(restored.drain(), [])
+            self.assertIsNone(broker.log("../etc/passwd"))
+
+            broker.discard("a")
+            self.assertFalse(os.path.exists(os.path.join(spill_dir, "a.jsonl")))
+            self.assertIsNone(broker.log("a"))
+
+    def test_drain_returns_each_event_once(self):
+        """Polling without a cursor keeps the old drain-once behaviour."""
+        broker = EventBroker()
+        broker.publish("job", {"status": "running", "message": "a"})
+        log = broker.log("job")
+        self.assertEqual(len(log.drain()), 1)
+        self.assertEqual(log.drain(), [])
+        self.assertEqual(len(log.since(0)), 1)
+
+
+class TestMetrics(unittest.TestCase):
+    """Tests for the thread-sharded metrics registry."""
+
+    def setUp(self):
+        self.registry = MetricsRegistry()
+
+    def test_counts_from_all_threads(self):
+        """Samples from live and exited threads are all included, exactly once."""
+        counter = self.registry.counter("jobs_total", "Jobs.")
+        release = threading.Event()
+
+        def record(n, wait):
+            for _ in range(n):
+                counter.inc(mode="pipeline")
+            if wait:
+                release.wait(5)
+
+        threads = [threading.Thread(target=record, args=(1000, i == 0)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        self.assertTrue(wait_for(lambda: sum(t.is_alive() for t in threads) == 1))
+        counter.inc(mode="coordinator")
+        self.assertIn('jobs_total{mode="pipeline"} 4000', self.registry.exposition())
+        release.set()
+        for thread in threads:
+            thread.join()
+        # Scraping twice must not fold retired shards in twice
+        self.registry.exposition()
+        text = self.registry.exposition()
+        self.assertIn('jobs_total{mode="pipeline"} 4000', text)
+        self.assertIn('jobs_total{mode="coordinator"} 1', text)
+
+    def test_histogram_exposition(self):
+        histogram = self.registry.histogram("stage_seconds", "Stage time.", buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.7, 3.0):
+            histogram.observe(value, stage="drafting")
+        lines = self.registry.exposition().splitlines()
+        self.assertEqual(lines[:2], ["# HELP stage_seconds Stage time.", "# TYPE stage_seconds histogram"])
+        self.assertEqual(lines[2:], [
+            'stage_seconds_bucket{stage="drafting",le="0.1"} 1',
+            'stage_seconds_bucket{stage="drafting",le="1"} 3',
+            'stage_seconds_bucket{stage="drafting",le="+Inf"} 4',
+            'stage_seconds_sum{stage="drafting"} 4.25',
+            'stage_seconds_count{stage="drafting"} 4',
+        ])
+
+    def test_readings(self):
+        """Readings are taken at scrape time; failing ones are skipped."""
+        depth = {"queued": 2}
+        self.registry.reading("queue_jobs", "Jobs.", lambda: {labels(status=k): v for k, v in depth.items()})
+        self.registry.reading("broken", "Raises.", lambda: 1 / 0)
+        depth["queued"] = 3
+        text = self.registry.exposition()
+        self.assertIn('queue_jobs{status="queued"} 3', text)
+        self.assertIn("# TYPE broken gauge", text)
+
+
+class TestApi(unittest.TestCase):
+    """Tests for the Flask endpoints, on a private job queue and event broker."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.release = threading.Event()
+        self.running = []
+        self.use_queue(self.handler)
+        self.events = EventBroker(spill_dir=os.path.join(self.temp_dir.name, "events"))
+        self.replace(api, "events", self.events)
+        self.client = api.app.test_client()
+
+    def handler(self, job_id, topic, output_filename, mode, **options):
+        self.running.append(job_id)
+        self.release.wait(5)
+
+    def use_queue(self, handler, **kwargs):
+        """Serve the API from a fresh queue in the temporary directory."""
+        self.job_queue = JobQueue(handler, path=os.path.join(self.temp_dir.name, "jobs.sqlite3"), **kwargs)
+        self.addCleanup(self.job_queue.stop, 5)
+        self.addCleanup(self.release.set)
+        self.replace(api, "job_queue", self.job_queue)
+
+    def replace(self, target, name, value):
+        patcher = patch.object(target, name, value)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def sse(self, job_id, last_event_id=None):
+        """(id, message) of every update in a job's event stream."""
+        headers = {"Last-Event-ID": str(last_event_id)} if last_event_id is not None else {}
+        response = self.client.get(f"/api/events/{job_id}", headers=headers)
+        self.assertEqual(response.mimetype, "text/event-stream")
+        updates = []
+        for block in response.get_data(as_text=True).split("\n\n"):
+            fields = dict(line.split(": ", 1) for line in block.splitlines() if ": " in line)
+            if fields.get("event") == "update":
+                updates.append((int(fields["id"]), json.loads(fields["data"])["message"]))
+        return updates
+
+    def start(self, topic="topic"):
+        return self.client.post("/api/start", json={"topic": topic, "mode": "pipeline"})
+
+    def test_start_enqueues_job(self):
+        """A started job is queued with its options and reports its queue position."""
+        response = self.start()
+        self.assertEqual(response.status_code, 200)
+        body = response.get_json()
+        self.assertEqual((body["status"], body["mode"], body["queue_position"]), ("started", "pipeline", 1))
+        self.assertTrue(wait_for(lambda: self.running == [body["job_id"]]))
+        job = self.job_queue.get(body["job_id"])
+        self.assertEqual(job["options"], {"renderer": body["renderer"]})
+        self.assertEqual(self.client.post("/api/start", json={"topic": ""}).status_code, 400)
+
+    def test_start_rejected_when_queue_full(self):
+        """A full queue answers 429 with Retry-After and queues nothing."""
+        self.use_queue(self.handler, max_workers=1, max_queued=1)
+        self.assertEqual(self.start().status_code, 200)
+        self.assertTrue(wait_for(lambda: len(self.running) == 1))
+        self.assertEqual(self.start().get_json()["queue_position"], 1)
+
+        response = self.start()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers["Retry-After"],
+                         str(api.config["server"]["job_queue"]["retry_after_seconds"]))
+        body = response.get_json()
+        self.assertEqual(body["status"], "error")
+        self.assertIn("busy", body["message"])
+        self.assertEqual(self.job_queue.list()[1], 2)
+
+    def test_status_drain_and_since_cursor(self):
+        """Plain polls drain each update once; ?since reads from the caller's cursor."""
+        job_id = self.start().get_json()["job_id"]
+        self.assertTrue(wait_for(lambda: self.running == [job_id]))
+        for i in range(3):
+            self.events.publish(job_id, {"status": "running", "message": f"step {i}"})
+
+        body = self.client.get(f"/api/status/{job_id}").get_json()
+        self.assertEqual([update["message"] for update in body["updates"]], ["step 0", "step 1", "step 2"])
+        self.assertEqual((body["state"], body["active"], body["last_event_id"]), ("running", True, 3))
+        body = self.client.get(f"/api/status/{job_id}").get_json()
+        self.assertEqual((body["updates"], body["last_event_id"]), ([], 3))
+
+        # A cursor continues where the previous response ended, independent of draining
+        body = self.client.get(f"/api/status/{job_id}?since=1").get_json()
+        self.assertEqual(([update["message"] for update in body["updates"]], body["last_event_id"]),
+                         (["step 1", "step 2"], 3))
+        self.assertEqual(self.client.get(f"/api/status/{job_id}?since=3").get_json()["updates"], [])
+        self.events.publish(job_id, {"status": "running", "message": "step 3"})
+        body = self.client.get(f"/api/status/{job_id}?since=3").get_json()
+        self.assertEqual(([update["message"] for update in body["updates"]], body["last_event_id"]),
+                         (["step 3"], 4))
+        self.assertEqual(len(self.client.get(f"/api/status/{job_id}").get_json()["updates"]), 1)
+        self.assertEqual(self.client.get("/api/status/missing").status_code, 404)
+
+    def test_jobs_pagination_bounds(self):
+        """Pages hold per_page jobs newest first; out-of-range arguments are clamped."""
+        self.release.set()
+        job_ids = [self.start(f"topic {i}").get_json()["job_id"] for i in range(5)]
+        self.assertTrue(wait_for(lambda: self.job_queue.depth()["completed"] == 5))
+
+        body = self.client.get("/api/jobs?page=2&per_page=2").get_json()
+        self.assertEqual([job["job_id"] for job in body["jobs"]], [job_ids[2], job_ids[1]])
+        self.assertEqual((body["page"], body["per_page"], body["total"], body["pages"]), (2, 2, 5, 3))
+        self.assertEqual([job["job_id"] for job in self.client.get("/api/jobs?page=3&per_page=2").get_json()["jobs"]],
+                         [job_ids[0]])
+        self.assertEqual(self.client.get("/api/jobs?page=4&per_page=2").get_json()["jobs"], [])
+
+        body = self.client.get("/api/jobs?page=0&per_page=0").get_json()
+        self.assertEqual((body["page"], body["per_page"], len(body["jobs"])), (1, 1, 1))
+        body = self.client.get("/api/jobs?per_page=1000&status=completed").get_json()
+        self.assertEqual((body["per_page"], body["total"], body["pages"]), (100, 5, 1))
+        self.assertEqual(self.client.get("/api/jobs?status=queued").get_json()["total"], 0)
+        self.assertEqual(self.client.get("/api/jobs?status=bogus").status_code, 400)
+
+    def test_events_replay_and_resume(self):
+        """SSE replays after Last-Event-ID; a resumed job's updates continue its log."""
+        self.release.set()
+        job_id = self.start().get_json()["job_id"]
+        self.assertTrue(wait_for(lambda: self.job_queue.get(job_id)["status"] == "completed"))
+        for message in ("searching", "drafting"):
+            self.events.publish(job_id, {"status": "running", "message": message})
+        self.events.publish(job_id, {"status": "error", "message": "failed"})
+
+        self.assertEqual(self.sse(job_id), [(1, "searching"), (2, "drafting"), (3, "failed")])
+        self.assertEqual(self.sse(job_id, last_event_id=1), [(2, "drafting"), (3, "failed")])
+
+        # A log reloaded from disk is history: pollers without a cursor get nothing old
+        self.assertEqual(self.events.evict(now=time.time() + 10 ** 6), 1)
+        body = self.client.get(f"/api/status/{job_id}").get_json()
+        self.assertEqual((body["updates"], body["last_event_id"]), ([], 3))
+        self.assertEqual(len(self.client.get(f"/api/status/{job_id}?since=0").get_json()["updates"]), 3)
+
+        with patch.dict(get_config()["pipeline"], {"checkpoint_dir": os.path.join(self.temp_dir.name, "checkpoints")}):
+            self.assertEqual(self.client.post(f"/api/resume/{job_id}").status_code, 404)
+            job_checkpoints(job_id, "topic", "research_paper.pdf", renderer="fast").save("research", {})
+            self.release.clear()
+            body = self.client.post(f"/api/resume/{job_id}").get_json()
+            self.assertEqual((body["status"], body["completed_stages"]), ("resumed", ["research"]))
+            self.assertTrue(wait_for(lambda: self.running == [job_id, job_id]))
+            self.assertEqual(self.job_queue.get(job_id)["options"]["renderer"], "fast")
+            self.assertEqual(self.client.post(f"/api/resume/{job_id}").status_code, 409)
+
+        self.events.publish(job_id, {"status": "running", "message": "resumed"})
+        self.events.publish(job_id, {"status": "completed", "message": "done"})
+        self.assertEqual(self.sse(job_id, last_event_id=3), [(4, "resumed"), (5, "done")])
+        self.assertEqual([update["message"] for update in self.client.get(f"/api/status/{job_id}").get_json()["updates"]],
+                         ["resumed", "done"])
+
+    def test_metrics_scrape(self):
+        """/metrics serves the text format, with counters moved by a finished job."""
+        def sample(text, line_start):
+            line = next((line for line in text.splitlines() if line.startswith(line_start)), None)
+            return float(line.rsplit(" ", 1)[1]) if line else 0.0
+
+        def generate_paper(job_id, topic, output_filename, mode="coordinator", renderer=None):
+            self.events.publish(job_id, {"status": "completed", "message": "done"})
+
+        self.use_queue(api.run_job)
+        self.replace(api, "generate_paper", generate_paper)
+        completed = 'research_jobs_completed_total{mode="pipeline"}'
+        before = sample(self.client.get("/metrics").get_data(as_text=True), completed)
+
+        job_id = self.start().get_json()["job_id"]
+        self.assertTrue(wait_for(lambda: self.job_queue.get(job_id)["status"] == "completed"))
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["Content-Type"], api.metrics.CONTENT_TYPE)
+        text = response.get_data(as_text=True)
+        self.assertIn("# TYPE research_jobs_completed_total counter", text)
+        self.assertEqual(sample(text, completed), before + 1)
+        self.assertEqual(sample(text, 'research_job_queue_jobs{status="completed"}'), 1)
+        self.assertIn('research_job_duration_seconds_count{mode="pipeline"}', text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,37 +1,87 @@
 """Tests for the research agent tools."""
+import asyncio
+import json
 import os
+import subprocess
 import sys
+import threading
 import unittest
 from unittest.mock import patch, MagicMock
 import tempfile
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 
+import numpy as np
+
 # Add parent directory to path to import modules
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from tools.arxiv_search import search_arxiv
-from tools.semantic_scholar import search_semantic
-from tools.pdf_export import tex_to_pdf
+from config import get_config
+from tools.arxiv_search import parse_arxiv_feed, search_arxiv_func
+from tools.semantic_scholar import search_semantic_func
+from tools.http_client import HttpClient, HttpError, parse_retry_after
+from tools.rate_limit import (
+    CircuitBreaker, CircuitOpenError, RateLimiter, SharedRateLimiter, call_upstream, get_circuit_breaker
+)
+from tools.pdf_export import (
+    compile_latex, job_output_dir, remove_job_output, render_paper, safe_filename, tex_to_pdf
+)
+from tools.pdf_cache import PdfBuildCache
+from tools.compile_pool import CompilePool
+from tools.fast_pdf import plain_text, render_fast_pdf, wrap_line
+from tools.cache import ResultCache, make_key, normalize_query
+from tools.literature_fanout import LiteratureBatch, LiteratureStream, build_queries, search_literature_func
+from tools.local_corpus import LocalCorpus, get_local_corpus, ingest, search_local_corpus_func
+from tools.papers import Paper, PaperIndex, normalize_arxiv_id
+from tools.retrieval import PAPERS_STATE_KEY, BM25Index, select_papers_func, tokenize
+from tools import template_utils
+from tools.latex_compiler import LatexCompiler, split_preamble
+
+
+class _FakeHttpClient:
+    """Stands in for the shared HTTP client, answering every GET with one body."""
+    
+    def __init__(self, body):
+        self.body = body
+        self.requests = []
+    
+    def run(self, coro, timeout=None):
+        return asyncio.run(coro)
+    
+    async def get_text(self, url, params=None, headers=None):
+        self.requests.append((url, params))
+        return self.body
+    
+    async def get_json(self, url, params=None, headers=None):
+        self.requests.append((url, params))
+        return self.body
 
 
 class TestArxivSearch(unittest.TestCase):
     """Tests for the arXiv search tool."""
     
-    @patch('arxiv.Search')
-    def test_search_arxiv(self, mock_search):
+    FEED = (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<feed xmlns="http://www.w3.org/2005/Atom" xmlns:arxiv="http://arxiv.org/schemas/atom">'
+        '<entry><id>http://arxiv.org/abs/1234.5678v1</id>'
+        '<published>2023-01-01T12:00:00Z</published>'
+        '<title>Test\n  Paper</title>'
+        '<summary>  This is a test paper summary.\n</summary>'
+        '<author><name>Test Author</name></author>'
+        '<arxiv:doi>10.1000/test</arxiv:doi>'
+        '<link href="http://arxiv.org/abs/1234.5678v1" rel="alternate" type="text/html"/>'
+        '<link title="pdf" href="https://arxiv.org/pdf/1234.5678" rel="related"/>'
+        '</entry></feed>'
+    )
+    
+    @patch.dict(get_config()["tools"]["arxiv"], {"min_interval_seconds": 0})
+    @patch('tools.arxiv_search.get_search_cache', return_value=None)
+    def test_search_arxiv(self, mock_cache):
         """Test the arXiv search functionality."""
-        # Mock the Search class and its results
-        mock_result = MagicMock()
-        mock_result.title = "Test Paper"
-        mock_result.pdf_url = "https://arxiv.org/pdf/1234.5678"
-        mock_result.summary = "This is a test paper summary."
-        mock_result.authors = [MagicMock(name="Test Author")]
-        mock_result.published.strftime.return_value = "2023-01-01"
-        
-        mock_search.return_value.results.return_value = [mock_result]
-        
-        # Test the search function
-        results = search_arxiv("test query", max_results=1)
+        client = _FakeHttpClient(self.FEED)
+        with patch('tools.arxiv_search.get_http_client', return_value=client):
+            results = search_arxiv_func("test query", max_results=1)
         
         # Verify the results
         self.assertEqual(len(results), 1)
@@ -40,29 +90,97 @@ class TestArxivSearch(unittest.TestCase):
         self.assertEqual(results[0]["summary"], "This is a test paper summary.")
         self.assertEqual(results[0]["authors"], ["Test Author"])
         self.assertEqual(results[0]["published"], "2023-01-01")
+        self.assertEqual(results[0]["arxiv_id"], "1234.5678v1")
+        self.assertEqual(results[0]["doi"], "10.1000/test")
+        url, params = client.requests[0]
+        self.assertEqual(params["search_query"], "test query")
+        self.assertEqual(params["max_results"], 1)
+    
+    def test_error_entry_raises(self):
+        """arXiv reports a malformed query as a feed with one error entry."""
+        feed = (
+            '<feed xmlns="http://www.w3.org/2005/Atom"><entry>'
+            '<id>http://arxiv.org/api/errors#incorrect_id_format_for_1234</id>'
+            '<summary>incorrect id format for 1234</summary></entry></feed>'
+        )
+        with self.assertRaises(ValueError):
+            parse_arxiv_feed(feed)
+
+
+class TestResultCache(unittest.TestCase):
+    """Tests for the persistent search result cache."""
+    
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.temp_dir.name) / "cache.sqlite3"
+    
+    def tearDown(self):
+        self.temp_dir.cleanup()
+    
+    def test_key_normalizes_query(self):
+        """Whitespace and case variations map to the same key."""
+        self.assertEqual(
+            make_key("arxiv", normalize_query("  Graph Neural   Networks "), 10),
+            make_key("arxiv", normalize_query("graph neural networks"), 10),
+        )
+        self.assertNotEqual(
+            make_key("arxiv", "graph neural networks", 10),
+            make_key("arxiv", "graph neural networks", 50),
+        )
+    
+    def test_hit_miss_and_shared_file(self):
+        """Values written by one instance are visible to another on the same file."""
+        cache = ResultCache(str(self.path), namespace="search")
+        self.assertIsNone(cache.get("k"))
+        cache.set("k", [{"title": "Test Paper"}])
+        
+        other = ResultCache(str(self.path), namespace="search")
+        self.assertEqual(other.get("k"), [{"title": "Test Paper"}])
+        
+        stats = cache.stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["entries"], 1)
+    
+    def test_ttl_expiry(self):
+        """Entries older than the TTL are treated as misses."""
+        cache = ResultCache(str(self.path), ttl_seconds=60)
+        with patch('tools.cache.time.time', return_value=1000.0):
+            cache.set("k", "v")
+        with patch('tools.cache.time.time', return_value=1100.0):
+            self.assertIsNone(cache.get("k"))
+    
+    def test_lru_eviction(self):
+        """The least recently accessed entry is evicted once the bound is hit."""
+        cache = ResultCache(str(self.path), max_entries=2)
+        now = time.time()
+        with patch('tools.cache.time.time', side_effect=[now - 4, now - 3, now - 2, now - 1]):
+            cache.set("a", 1)
+            cache.set("b", 2)
+            cache.get("a")
+            cache.set("c", 3)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), 3)
 
 
 class TestSemanticScholarSearch(unittest.TestCase):
     """Tests for the Semantic Scholar search tool."""
     
-    @patch('semanticscholar.SemanticScholar')
-    def test_search_semantic(self, mock_semantic_scholar):
+    @patch.dict(get_config()["tools"]["semantic_scholar"], {"min_interval_seconds": 0})
+    def test_search_semantic(self):
         """Test the Semantic Scholar search functionality."""
-        # Mock the Semantic Scholar client
-        mock_client = MagicMock()
-        mock_client.search_paper.return_value = [{
+        client = _FakeHttpClient({"total": 1, "offset": 0, "data": [{
             'title': 'Test Paper',
             'url': 'https://semanticscholar.org/paper/123',
             'abstract': 'This is a test abstract.',
             'authors': [{'name': 'Test Author'}],
             'year': 2023,
-            'citationCount': 42
-        }]
-        
-        mock_semantic_scholar.return_value = mock_client
-        
-        # Test the search function
-        results = search_semantic("test query", max_results=1)
+            'citationCount': 42,
+            'externalIds': {'ArXiv': '2301.00001'},
+        }]})
+        with patch('tools.semantic_scholar.get_http_client', return_value=client):
+            results = search_semantic_func("test query", max_results=1)
         
         # Verify the results
         self.assertEqual(len(results), 1)
@@ -72,11 +190,875 @@ class TestSemanticScholarSearch(unittest.TestCase):
         self.assertEqual(results[0]["authors"], ["Test Author"])
         self.assertEqual(results[0]["year"], 2023)
         self.assertEqual(results[0]["citation_count"], 42)
+        self.assertEqual(results[0]["arxiv_id"], "2301.00001")
+        url, params = client.requests[0]
+        self.assertTrue(url.endswith("/graph/v1/paper/search"))
+        self.assertEqual((params["query"], params["limit"]), ("test query", 1))
+
+
+class _CountingHandler(BaseHTTPRequestHandler):
+    """Answers /slow after a short delay and /limited with a 429."""
+    
+    protocol_version = "HTTP/1.1"
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.active += 1
+            server.peak = max(server.peak, server.active)
+        try:
+            if self.path.startswith("/limited"):
+                status, body = 429, b"slow down"
+            else:
+                time.sleep(0.05 if self.path.startswith("/slow") else 0)
+                status, body = 200, b'{"ok": true}'
+            self.send_response(status)
+            if status == 429:
+                self.send_header("Retry-After", "7")
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with server.lock:
+                server.active -= 1
+
+
+class TestHttpClient(unittest.TestCase):
+    """Tests for the shared pooled HTTP client."""
+    
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _CountingHandler)
+        self.server.daemon_threads = True
+        self.server.lock = threading.Lock()
+        self.server.active = self.server.peak = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.host = f"127.0.0.1:{self.server.server_address[1]}"
+        self.client = HttpClient(max_per_host=8, host_limits={self.host: 2})
+    
+    def tearDown(self):
+        self.client.close()
+        self.server.shutdown()
+        self.server.server_close()
+    
+    def test_connections_are_reused(self):
+        """Sequential requests to one host share a single keep-alive connection."""
+        for _ in range(5):
+            self.assertEqual(self.client.run(self.client.get_json(f"http://{self.host}/fast")), {"ok": True})
+        stats = self.client.stats()
+        self.assertEqual(stats["requests"], 5)
+        self.assertEqual(stats["connections_opened"], 1)
+        self.assertEqual(stats["connections_reused"], 4)
+    
+    def test_per_host_cap(self):
+        """Concurrent callers never have more requests in flight than the host's cap."""
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(
+                self.client.run(self.client.get_text(f"http://{self.host}/slow"))))
+            for _ in range(6)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(results), 6)
+        self.assertEqual(self.server.peak, 2)
+        self.assertLessEqual(self.client.stats()["connections_opened"], 2)
+    
+    def test_error_status_raises_with_retry_after(self):
+        with self.assertRaises(HttpError) as raised:
+            self.client.run(self.client.get_text(f"http://{self.host}/limited"))
+        self.assertEqual(raised.exception.status, 429)
+        self.assertEqual(raised.exception.retry_after, 7.0)
+        self.assertEqual(self.client.stats()["errors"], 1)
+    
+    def test_retry_after_date(self):
+        self.assertIsNone(parse_retry_after(None))
+        self.assertEqual(parse_retry_after(" 3 "), 3.0)
+        self.assertEqual(parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT"), 0.0)
+
+
+class TestRateLimit(unittest.TestCase):
+    """Tests for the shared token buckets, retries and circuit breakers."""
+    
+    def test_burst_then_spacing(self):
+        """A full bucket admits ``burst`` calls at once, then one per interval, in order."""
+        limiter = RateLimiter(10.0, burst=3)
+        limiter.clock = lambda: 100.0
+        self.assertEqual([limiter.reserve() for _ in range(5)], [0.0, 0.0, 0.0, 10.0, 20.0])
+    
+    def test_pause_delays_everyone(self):
+        limiter = RateLimiter(1.0)
+        limiter.clock = lambda: 100.0
+        limiter.pause(30.0)
+        self.assertEqual(limiter.reserve(), 30.0)
+        self.assertEqual(limiter.reserve(), 31.0)
+    
+    def test_shared_bucket_across_instances(self):
+        """Two limiters on one state file (as in two processes) share the capacity."""
+        with tempfile.TemporaryDirectory() as tmp:
+            first = SharedRateLimiter(Path(tmp) / "arxiv.bucket", 60.0)
+            second = SharedRateLimiter(Path(tmp) / "arxiv.bucket", 60.0)
+            self.assertEqual(first.reserve(), 0.0)
+            self.assertGreater(second.reserve(), 59.0)
+    
+    def test_circuit_breaker_opens_and_probes(self):
+        breaker = CircuitBreaker("test", failure_threshold=2, reset_seconds=60.0)
+        breaker.check()
+        breaker.record_failure()
+        breaker.record_failure()
+        with self.assertRaises(CircuitOpenError):
+            breaker.check()
+        with patch('tools.rate_limit.time.monotonic', return_value=time.monotonic() + 61):
+            breaker.check()  # The single probe
+            with self.assertRaises(CircuitOpenError):
+                breaker.check()
+            breaker.record_success()
+            breaker.check()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+
+class TestCallUpstream(unittest.TestCase):
+    """Tests for ``call_upstream`` against the ``test`` upstream."""
+    
+    def setUp(self):
+        settings = {"test": {"min_interval_seconds": 0, "max_retries": 2, "backoff_base_seconds": 0.01,
+                             "backoff_max_seconds": 1.0, "breaker_failures": 3, "breaker_reset_seconds": 60}}
+        patcher = patch.dict(get_config()["tools"], settings)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        for registry in ('tools.rate_limit._breakers', 'tools.rate_limit._limiters'):
+            patcher = patch.dict(registry, clear=True)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+    
+    def call(self, outcomes):
+        """Run call_upstream over a request that raises or returns each outcome in turn."""
+        calls = []
+        
+        async def request():
+            outcome = outcomes[len(calls)]
+            calls.append(outcome)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+        return asyncio.run(call_upstream("test", request)), len(calls)
+    
+    def test_retries_transient_errors(self):
+        result, calls = self.call([HttpError(503, "u"), ConnectionError("reset"), "ok"])
+        self.assertEqual((result, calls), ("ok", 3))
+        self.assertEqual(get_circuit_breaker("test").state, CircuitBreaker.CLOSED)
+    
+    def test_retry_after_pauses_the_bucket(self):
+        start = time.monotonic()
+        result, calls = self.call([HttpError(429, "u", retry_after=0.2), "ok"])
+        self.assertEqual((result, calls), ("ok", 2))
+        self.assertGreaterEqual(time.monotonic() - start, 0.2)
+    
+    def test_client_errors_are_not_retried(self):
+        with self.assertRaises(HttpError):
+            self.call([HttpError(404, "u"), "ok"])
+        self.assertEqual(get_circuit_breaker("test").state, CircuitBreaker.CLOSED)
+    
+    def test_long_retry_after_opens_breaker(self):
+        """A Retry-After beyond backoff_max_seconds fails the call and trips the breaker."""
+        with self.assertRaises(HttpError):
+            self.call([HttpError(429, "u", retry_after=3600), "ok"])
+        with self.assertRaises(CircuitOpenError) as raised:
+            self.call(["ok"])
+        self.assertGreater(raised.exception.retry_in, 3000)
+    
+    def test_breaker_fails_fast(self):
+        """The breaker counts failed calls, not attempts, and then fails fast."""
+        for _ in range(2):
+            with self.assertRaises(HttpError):
+                self.call([HttpError(500, "u")] * 3)
+            # Three failed attempts of one call are a single failure
+            self.assertEqual(get_circuit_breaker("test").state, CircuitBreaker.CLOSED)
+        with self.assertRaises(HttpError):
+            self.call([HttpError(500, "u")] * 3)
+        with self.assertRaises(CircuitOpenError):
+            self.call(["ok"])
+    
+    def test_breaker_rebuilt_when_settings_change(self):
+        """Changing breaker_failures or breaker_reset_seconds takes effect without a restart."""
+        breaker = get_circuit_breaker("test")
+        self.assertIs(get_circuit_breaker("test"), breaker)
+        with patch.dict(get_config()["tools"]["test"], {"breaker_failures": 1, "breaker_reset_seconds": 5}):
+            rebuilt = get_circuit_breaker("test")
+            self.assertIsNot(rebuilt, breaker)
+            self.assertEqual((rebuilt.failure_threshold, rebuilt.reset_seconds), (1, 5))
+            with self.assertRaises(HttpError):
+                self.call([HttpError(500, "u")] * 3)
+            with self.assertRaises(CircuitOpenError):
+                self.call(["ok"])
+
+
+class TestLiteratureFanout(unittest.TestCase):
+    """Tests for the per-section literature fan-out tool."""
+    
+    OUTLINE = (
+        "## Introduction\n- protein structure prediction\n"
+        "## Related Work\n- equivariant message passing\n"
+        "## References\n"
+    )
+    
+    def test_build_queries(self):
+        """One query for the topic plus one per content section."""
+        queries = build_queries("graph neural networks", self.OUTLINE)
+        self.assertEqual(len(queries), 3)
+        self.assertEqual(queries[0], "graph neural networks")
+        self.assertIn("protein", queries[1])
+    
+    def test_merge_dedupes_across_sources(self):
+        """Results from both sources are merged, deduplicated and capped."""
+        def fake_arxiv(query, max_results):
+            return [{
+                "title": "Shared Paper",
+                "url": "http://arxiv.org/pdf/2101.00001v2",
+                "summary": "From arXiv.",
+                "authors": ["A"],
+                "published": "2021-01-01",
+            }, {
+                "title": f"arXiv only: {query}",
+                "url": "",
+                "summary": "",
+                "authors": [],
+                "published": "2020-05-01",
+            }]
+        
+        def fake_semantic(query, max_results):
+            return [{"title": "shared paper.", "url": "", "abstract": "From S2.",
+                     "authors": ["A"], "year": 2021, "citation_count": 3}]
+        
+        with patch.dict('tools.literature_fanout.SEARCH_FUNCS',
+                        {"arxiv": fake_arxiv, "semantic_scholar": fake_semantic}):
+            papers = search_literature_func("graph neural networks", self.OUTLINE, max_results=3)
+        
+        self.assertEqual(len(papers), 3)
+        self.assertEqual(papers[0]["title"], "Shared Paper")
+        self.assertEqual(papers[0]["arxiv_id"], "2101.00001")
+        self.assertEqual(papers[0]["abstract"], "From arXiv.")
+        self.assertEqual(papers[0]["sources"], ["arxiv", "semantic_scholar"])
+        self.assertEqual(papers[0]["citation_count"], 3)
+        titles = [p["title"].lower().strip(".") for p in papers]
+        self.assertEqual(titles.count("shared paper"), 1)
+    
+    def test_stream_indexes_results_as_they_arrive(self):
+        """Fast searches are searchable before slow ones return; the final list is unchanged."""
+        release = threading.Event()
+        
+        def fast_arxiv(query, max_results):
+            return [{"title": f"Paper on {query}", "url": "", "summary": "protein folding",
+                     "authors": [], "published": "2020-01-01"}]
+        
+        def slow_semantic(query, max_results):
+            release.wait(5)
+            return [{"title": f"Cited work on {query}", "url": "", "abstract": "attention",
+                     "authors": [], "year": 2019, "citation_count": 1}]
+        
+        with patch.dict('tools.literature_fanout.SEARCH_FUNCS',
+                        {"arxiv": fast_arxiv, "semantic_scholar": slow_semantic}):
+            stream = LiteratureStream("graph neural networks", self.OUTLINE)
+            batches = iter(stream)
+            first = [next(batches) for _ in range(3)]
+            self.assertEqual({b.source for b in first}, {"arxiv"})
+            self.assertEqual(len(stream), 3)
+            self.assertFalse(stream.ready({"name": "Introduction", "text": "- protein structure prediction\n"}))
+            self.assertIn("Paper on", stream.top_k("protein folding", 1)[0]["title"])
+            release.set()
+            self.assertEqual(len(list(batches)), 3)
+            self.assertTrue(stream.finished)
+            expected = search_literature_func("graph neural networks", self.OUTLINE, max_results=4)
+        
+        self.assertEqual(stream.papers(4), expected)
+        # Papers drafting already used survive the cap
+        kept = stream.papers(4, keep=[{"title": stream.papers()[-1]["title"]}])
+        self.assertEqual(len(kept), 5)
+    
+    def test_stream_reindexes_merged_records(self):
+        """A duplicate that brings a fuller abstract makes the paper findable by it."""
+        batches = [
+            LiteratureBatch(0, "semantic_scholar", "topic", [
+                Paper(title="Graph Attention Networks", abstract="Attention over graphs."),
+                Paper(title="Learned Structure Models", arxiv_id="2101.00001")]),
+            LiteratureBatch(1, "arxiv", "topic", [
+                Paper(title="Learned structure models", arxiv_id="2101.00001",
+                      abstract="Protein folding predicted with equivariant networks.")]),
+        ]
+        stream = LiteratureStream("topic", batches=iter(batches))
+        for _ in stream:
+            pass
+        self.assertEqual(len(stream), 2)
+        best = stream.top_k("protein folding", 2)
+        self.assertEqual(best[0]["title"], "Learned Structure Models")
+        self.assertIn("Protein folding", best[0]["abstract"])
+        self.assertEqual(stream.top_k("graphs attention", 1)[0]["title"], "Graph Attention Networks")
+
+
+
+class TestLocalCorpus(unittest.TestCase):
+    """Tests for the offline corpus index and its search tool."""
+    
+    DUMP = [
+        {"id": "2101.00001", "title": "Graph neural networks for\n  molecules",
+         "abstract": "  We apply graph neural networks to molecular property prediction. ",
+         "authors": "A. Author, B. Author", "authors_parsed": [["Author", "Ada", ""], ["Bauer", "Ben", "Jr"]],
+         "versions": [{"version": "v1", "created": "Mon, 4 Jan 2021 10:00:00 GMT"},
+                      {"version": "v2", "created": "Tue, 2 Feb 2021 10:00:00 GMT"}],
+         "doi": "10.1000/gnn 10.1000/other", "citation_count": 3},
+        {"id": "1901.00002", "title": "Message passing on graphs",
+         "abstract": "Message passing networks generalize graph convolutions.",
+         "authors": "C. Writer and D. Writer", "update_date": "2019-01-05", "citation_count": 500},
+        {"id": "2201.00003", "title": "Protein folding with transformers",
+         "abstract": "Attention models predict protein structure.", "update_date": "2022-01-05"},
+        {"title": "Graph transformers", "summary": "Graph attention for molecules.",
+         "authors": ["E. Schema"], "published": "2023-03-01", "arxiv_id": "2303.00004v1",
+         "url": "http://arxiv.org/pdf/2303.00004v1", "doi": ""},
+        {"title": "No identifier"},
+        # An older version of the first paper, seen later: superseded by v2
+        {"title": "Graph neural networks (draft)", "summary": "Graph networks for molecules.",
+         "arxiv_id": "2101.00001v1", "published": "2021-01-04"},
+    ]
+    
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        dump = Path(self.temp_dir.name) / "dump.jsonl"
+        dump.write_text("\n".join(json.dumps(r) for r in self.DUMP) + "\nnot json\n")
+        self.path = Path(self.temp_dir.name) / "corpus"
+        # Two papers per block, so the postings are merged across spill files
+        self.meta = ingest([dump], self.path, block_docs=2)
+        self.corpus = LocalCorpus(self.path)
+    
+    def test_ingest_and_schema(self):
+        self.assertEqual((self.meta["documents"], self.meta["duplicates"]), (4, 1))
+        self.assertEqual(len(self.corpus), 4)
+        papers = self.corpus.search("graph neural networks", max_results=10)
+        self.assertEqual(papers[0]["arxiv_id"], "2101.00001v2")
+        self.assertEqual(papers[0], {
+            "title": "Graph neural networks for molecules",
+            "url": "http://arxiv.org/pdf/2101.00001v2",
+            "summary": "We apply graph neural networks to molecular property prediction.",
+            "authors": ["Ada Author", "Ben Bauer Jr"],
+            "published": "2021-01-04",
+            "arxiv_id": "2101.00001v2",
+            "doi": "10.1000/gnn",
+        })
+        self.assertEqual({p["arxiv_id"] for p in papers}, {"2101.00001v2", "1901.00002", "2303.00004v1"})
+        by_id = {p["arxiv_id"]: p for p in papers}
+        self.assertEqual(by_id["1901.00002"]["authors"], ["C. Writer", "D. Writer"])
+        self.assertEqual(by_id["1901.00002"]["published"], "2019-01-05")
+    
+    def test_postings_match_brute_force(self):
+        """The out-of-core postings agree with BM25 computed in memory."""
+        docs, scores = self.corpus.scores("graph molecules attention")
+        texts = [f"{r['title']} {r['title']} {r['summary']}" for r in map(self.corpus.record, range(4))]
+        expected = BM25Index(texts, k1=1.2, b=0.75).scores("graph molecules attention")
+        dense = np.zeros(4)
+        dense[docs] = scores
+        np.testing.assert_allclose(dense, expected, rtol=1e-4)
+    
+    def test_sorted_vocabulary_lookup(self):
+        """Terms are found by binary search over the mapped, sorted term list."""
+        terms = [self.corpus._term(i).decode() for i in range(self.meta["terms"])]
+        self.assertEqual(terms, sorted(terms))
+        for i, term in enumerate(terms):
+            self.assertEqual(self.corpus.term_id(term), i)
+        self.assertIsNone(self.corpus.term_id("zebrafish"))
+        self.assertIsNone(self.corpus.term_id(""))
+        # Only in the superseded version: known, but without postings
+        draft = self.corpus.term_id("draft")
+        self.assertEqual(self.corpus.term_starts[draft], self.corpus.term_starts[draft + 1])
+    
+    def test_filters_and_citation_prior(self):
+        papers = self.corpus.search("graph", max_results=10, min_year=2021)
+        self.assertNotIn("1901.00002", [p["arxiv_id"] for p in papers])
+        self.assertEqual(self.corpus.search("zebrafish"), [])
+        boosted = LocalCorpus(self.path, citation_weight=10.0).search("graph", max_results=1)
+        self.assertEqual(boosted[0]["arxiv_id"], "1901.00002")
+    
+    def test_tool_and_fanout(self):
+        settings = {"enabled": True, "path": str(self.path), "k1": 1.2, "b": 0.75, "citation_weight": 0.0}
+        with patch.dict(get_config()["tools"]["local_corpus"], settings), \
+                patch.dict(get_config()["tools"]["literature_fanout"], {"sources": ["local_corpus"]}):
+            self.assertEqual(search_local_corpus_func("protein", 5)[0]["arxiv_id"], "2201.00003")
+            papers = search_literature_func("graph neural networks", max_results=5)
+        self.assertEqual(papers[0]["sources"], ["local_corpus"])
+        self.assertEqual(papers[0]["arxiv_id"], "2101.00001")
+        with patch.dict(get_config()["tools"]["local_corpus"], {"path": str(self.path / "missing")}):
+            self.assertEqual(search_local_corpus_func("protein"), [])
+
+    
+    def test_reingest_closes_cached_corpus(self):
+        """Replacing an index unmaps the cached reader instead of leaking its files."""
+        def open_files():
+            return len(os.listdir("/proc/self/fd")) if os.path.isdir("/proc/self/fd") else 0
+
+        dump = Path(self.temp_dir.name) / "dump.jsonl"
+        settings = {"enabled": True, "path": str(self.path), "k1": 1.2, "b": 0.75, "citation_weight": 0.0}
+        with patch.dict(get_config()["tools"]["local_corpus"], settings), \
+                patch.dict('tools.local_corpus._corpora', clear=True):
+            self.corpus.close()
+            old = get_local_corpus()
+            self.assertEqual(len(search_local_corpus_func("protein")), 1)
+            baseline = open_files()
+            for _ in range(3):
+                ingest([dump], self.path, block_docs=2)
+                self.assertTrue(old.closed)
+                self.assertEqual(old._maps, [])
+                with self.assertRaises(ValueError):
+                    old.search("protein")
+                self.assertEqual(len(search_local_corpus_func("protein")), 1)
+                old = get_local_corpus()
+            self.assertEqual(open_files(), baseline)
+
+
+class TestPaperIndex(unittest.TestCase):
+    """Tests for cross-source paper normalization and deduplication."""
+    
+    def test_normalize_arxiv_id(self):
+        """Versions, prefixes and URLs reduce to the same ID."""
+        for value in ["2101.00001", "2101.00001v3", "arXiv:2101.00001",
+                      "http://arxiv.org/pdf/2101.00001v2"]:
+            self.assertEqual(normalize_arxiv_id(value), "2101.00001")
+        self.assertEqual(normalize_arxiv_id("hep-th/9901001v1"), "hep-th/9901001")
+        self.assertEqual(normalize_arxiv_id(""), "")
+    
+    def test_merges_arxiv_and_semantic_records(self):
+        """Records sharing an arXiv ID merge despite different titles and schemas."""
+        index = PaperIndex()
+        index.add(Paper.from_arxiv({
+            "title": "Attention Is All You Need", "summary": "Transformers.",
+            "url": "http://arxiv.org/pdf/1706.03762v5", "authors": ["A. Vaswani"],
+            "published": "2017-06-12",
+        }))
+        merged = index.add(Paper.from_semantic({
+            "title": "Attention is All you Need (NeurIPS)", "abstract": "",
+            "authors": ["Ashish Vaswani"], "year": 2017, "citation_count": 90000,
+            "arxiv_id": "1706.03762", "doi": "10.5555/3295222.3295349",
+        }))
+        self.assertEqual(len(index), 1)
+        self.assertEqual(merged.citation_count, 90000)
+        self.assertEqual(merged.doi, "10.5555/3295222.3295349")
+        self.assertEqual(merged.abstract, "Transformers.")
+        self.assertEqual(merged.sources, ["arxiv", "semantic_scholar"])
+    
+    def test_title_fingerprint_and_near_duplicates(self):
+        """Exact and near-identical titles merge; unrelated titles do not."""
+        index = PaperIndex()
+        index.add(Paper(title="Graph Neural Networks: A Review of Methods and Applications"))
+        index.add(Paper(title="graph neural networks - a review of methods and applications"))
+        index.add(Paper(title="Graph Neural Networks: A Review of Methods and Application"))
+        index.add(Paper(title="Diffusion Models Beat GANs on Image Synthesis"))
+        self.assertEqual(len(index), 2)
+    
+    def test_conflicting_ids_are_not_merged(self):
+        """Similar titles with different arXiv IDs stay separate."""
+        index = PaperIndex()
+        index.add(Paper(title="Scaling Laws for Neural Language Models, Part I", arxiv_id="2001.00001"))
+        index.add(Paper(title="Scaling Laws for Neural Language Models, Part II", arxiv_id="2001.00002"))
+        self.assertEqual(len(index), 2)
+
+
+
+class TestRetrieval(unittest.TestCase):
+    """Tests for per-section paper retrieval."""
+    
+    PAPERS = [
+        {"title": "Protein structure prediction with deep learning", "abstract": "Folding proteins."},
+        {"title": "Graph attention networks", "abstract": "Attention over graph neighbourhoods."},
+        {"title": "Benchmarking message passing on molecules", "abstract": "Experiments and datasets."},
+    ]
+    
+    def test_bm25_ranking(self):
+        """The document sharing the rarest query terms ranks first."""
+        index = BM25Index([p["title"] + " " + p["abstract"] for p in self.PAPERS])
+        self.assertEqual(index.top_k("graph attention", 2)[0], 1)
+        self.assertEqual(index.top_k("protein folding", 1), [0])
+        self.assertEqual(len(index.top_k("protein", 10)), 3)
+    
+    def test_incremental_add(self):
+        """Documents added after the first query are scored too."""
+        index = BM25Index(["graph attention networks"])
+        index.top_k("graph", 1)
+        index.add(["protein folding"])
+        self.assertEqual(index.top_k("protein", 1), [1])
+    
+    def test_update_matches_rebuilt_index(self):
+        """Replacing a document's text scores exactly like indexing the new text."""
+        documents = [p["title"] + " " + p["abstract"] for p in self.PAPERS]
+        index = BM25Index(documents)
+        index.update(0, "graph attention for proteins")
+        index.update(2, "")
+        rebuilt = BM25Index([documents[1], "graph attention for proteins", ""])
+        for query in ("graph attention", "protein folding", "molecules benchmarking"):
+            np.testing.assert_allclose(index.scores(query)[[1, 0, 2]], rebuilt.scores(query), rtol=1e-6)
+        self.assertEqual(index.top_k("proteins", 1), [0])
+    
+    def test_incremental_scores_match_dense_bm25(self):
+        """Scores from the postings index equal textbook BM25 over all documents."""
+        documents = [p["title"] + " " + p["abstract"] for p in self.PAPERS] + ["graph graph protein", ""]
+        index = BM25Index(documents[:2], k1=1.2, b=0.75)
+        index.add(documents[2:])
+        
+        tokens = [tokenize(d) for d in documents]
+        avg_len = np.mean([len(t) for t in tokens])
+        expected = np.zeros(len(documents))
+        for term in tokenize("graph protein attention"):
+            df = sum(term in t for t in tokens)
+            idf = np.log1p((len(documents) - df + 0.5) / (df + 0.5))
+            for i, t in enumerate(tokens):
+                tf = t.count(term)
+                expected[i] += idf * tf * 2.2 / (tf + 1.2 * (0.25 + 0.75 * len(t) / avg_len))
+        np.testing.assert_allclose(index.scores("graph protein attention"), expected, rtol=1e-5)
+        self.assertEqual(len(index), 5)
+    
+    def test_select_papers_uses_session_state(self):
+        """Only the top-k papers from the stored literature list are returned."""
+        context = MagicMock()
+        context.state = {PAPERS_STATE_KEY: self.PAPERS}
+        result = select_papers_func("Experiments", "datasets and benchmarks", k=1, tool_context=context)
+        self.assertEqual(result["status"], "success")
+        self.assertEqual([p["title"] for p in result["papers"]], [self.PAPERS[2]["title"]])
+        
+        self.assertEqual(select_papers_func("Experiments", tool_context=None)["status"], "error")
+
+
+class TestTemplates(unittest.TestCase):
+    """Tests for the shared LaTeX template registry."""
+
+    def setUp(self):
+        self.addCleanup(template_utils.reset_template_cache)
+        template_utils.reset_template_cache()
+
+    def test_named_templates_render(self):
+        """Every named template renders the paper fields."""
+        context = {"title": "Sparse Attention", "abstract": "Short abstract", "keywords": "",
+                   "references": "", "appendix": None}
+        for name in template_utils.available_templates():
+            latex = template_utils.render_template(name, context)
+            self.assertIn("Sparse Attention", latex)
+            self.assertIn("Short abstract", latex)
+            self.assertNotIn("BLOCK", latex)
+        with self.assertRaises(FileNotFoundError):
+            template_utils.get_template("missing")
+
+    def test_compiled_once_and_reloaded_on_change(self):
+        """Templates are cached until their file's mtime changes."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / "custom.tex"
+            path.write_text("v1 {{title}}")
+            with patch.object(template_utils, "TEMPLATES_DIR", Path(temp_dir)):
+                template = template_utils.get_template("custom.tex")
+                self.assertIs(template_utils.get_template("custom.tex"), template)
+
+                path.write_text("v2 {{title}}")
+                os.utime(path, (time.time() + 10, time.time() + 10))
+                self.assertEqual(template_utils.render_template("custom.tex", {"title": "x"}), "v2 x")
+
+
+def fake_pdflatex(args, cwd=None, **kwargs):
+    """Stand-in for pdflatex: dumps formats and resolves \\ref on a second pass."""
+    workdir = Path(cwd)
+    jobname = next(arg.split("=", 1)[1] for arg in args if arg.startswith("-jobname="))
+    if "-ini" in args:
+        (workdir / f"{jobname}.fmt").write_text("format")
+        return subprocess.CompletedProcess(args, 0, "", "")
+    source = (workdir / "paper.tex").read_text()
+    aux = workdir / "paper.aux"
+    needs_rerun = "\\ref" in source and not aux.exists()
+    aux.write_text("\\newlabel{sec}{{1}{1}}")
+    (workdir / "paper.log").write_text("LaTeX Warning: Label(s) may have changed. Rerun to get cross-references right." if needs_rerun else "Output written")
+    (workdir / "paper.pdf").write_text("%PDF")
+    return subprocess.CompletedProcess(args, 0, "", "")
+
+
+class TestLatexCompiler(unittest.TestCase):
+    """Tests for the format-preloading, incremental LaTeX compiler."""
+
+    DOCUMENT = (
+        "\\documentclass{article}\n\\usepackage{amsmath}\n\\usepackage{hyperref}\n"
+        "\\title{T}\n\\begin{document}\nSee \\ref{sec}.\n\\end{document}\n"
+    )
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.output = Path(self.temp_dir.name) / "paper.pdf"
+
+    def make_compiler(self, **kwargs):
+        return LatexCompiler(work_dir=self.temp_dir.name, **kwargs)
+
+    def test_split_preamble_stops_before_hyperref(self):
+        """Only the class and packages before hyperref are dumped."""
+        preamble, body = split_preamble(self.DOCUMENT)
+        self.assertEqual(preamble, "\\documentclass{article}\n\\usepackage{amsmath}\n")
+        self.assertTrue(body.startswith("\\usepackage{hyperref}"))
+        self.assertEqual(split_preamble("no class"), ("", "no class"))
+
+    @patch('subprocess.run', side_effect=fake_pdflatex)
+    def test_format_built_once_and_loaded(self, mock_run):
+        """The preamble format is dumped once and passed to every compile."""
+        compiler = self.make_compiler(incremental=False)
+        for _ in range(2):
+            self.assertTrue(compiler.compile(self.DOCUMENT, self.output).used_format)
+        ini_runs = [call for call in mock_run.call_args_list if "-ini" in call.args[0]]
+        self.assertEqual(len(ini_runs), 1)
+        self.assertTrue(any(arg.startswith("-fmt=") for arg in mock_run.call_args.args[0]))
+        self.assertTrue(self.output.exists())
+
+    def test_body_error_keeps_format(self):
+        """A document that fails with and without the format does not discard it."""
+        def engine(args, cwd=None, **kwargs):
+            if "-ini" not in args and "BROKEN" in (Path(cwd) / "paper.tex").read_text():
+                (Path(cwd) / "paper.log").write_text("! Missing $ inserted.")
+                return subprocess.CompletedProcess(args, 1, "", "")
+            return fake_pdflatex(args, cwd, **kwargs)
+
+        compiler = self.make_compiler(incremental=False)
+        with patch('subprocess.run', side_effect=engine) as mock_run:
+            broken = compiler.compile(self.DOCUMENT.replace("See", "BROKEN $x"), self.output)
+            self.assertFalse(broken.ok)
+            self.assertTrue(list((Path(self.temp_dir.name) / "formats").glob("*.fmt")))
+            self.assertTrue(compiler.compile(self.DOCUMENT, self.output).used_format)
+            ini_runs = [call for call in mock_run.call_args_list if "-ini" in call.args[0]]
+            self.assertEqual(len(ini_runs), 1)
+
+    def test_unloadable_format_discarded(self):
+        """A format the engine cannot load is dropped and the document compiled without it."""
+        def engine(args, cwd=None, **kwargs):
+            if any(arg.startswith("-fmt=") for arg in args):
+                return subprocess.CompletedProcess(args, 1, "---! preamble.fmt was written by tex", "")
+            return fake_pdflatex(args, cwd, **kwargs)
+
+        compiler = self.make_compiler(incremental=False)
+        with patch('subprocess.run', side_effect=engine):
+            result = compiler.compile(self.DOCUMENT, self.output)
+            self.assertTrue(result.ok)
+            self.assertFalse(result.used_format)
+            self.assertFalse(list((Path(self.temp_dir.name) / "formats").glob("*.fmt")))
+            self.assertFalse(compiler.compile(self.DOCUMENT, self.output).used_format)
+
+    def test_format_discarded_when_only_retry_succeeds(self):
+        """A format whose documents fail only when it is loaded is dropped."""
+        def engine(args, cwd=None, **kwargs):
+            if any(arg.startswith("-fmt=") for arg in args):
+                return subprocess.CompletedProcess(args, 1, "! Undefined control sequence.", "")
+            return fake_pdflatex(args, cwd, **kwargs)
+
+        compiler = self.make_compiler(incremental=False)
+        with patch('subprocess.run', side_effect=engine):
+            self.assertTrue(compiler.compile(self.DOCUMENT, self.output).ok)
+            self.assertFalse(list((Path(self.temp_dir.name) / "formats").glob("*.fmt")))
+
+    @patch('subprocess.run', side_effect=fake_pdflatex)
+    def test_acmart_compiled_without_format(self, mock_run):
+        """acmart loads hyperref itself, so no format is built for it."""
+        document = self.DOCUMENT.replace("\\documentclass{article}", "\\documentclass[sigconf,nonacm]{acmart}")
+        self.assertEqual(split_preamble(document), ("", document))
+        result = self.make_compiler(incremental=False).compile(document, self.output)
+        self.assertFalse(result.used_format)
+        self.assertFalse(any("-ini" in call.args[0] for call in mock_run.call_args_list))
+        self.assertTrue(result.ok)
+
+    @patch('subprocess.run', side_effect=fake_pdflatex)
+    def test_second_pass_only_when_needed(self, mock_run):
+        """Rerun warnings trigger another pass; a warm workspace needs only one."""
+        compiler = self.make_compiler(use_format=False)
+        self.assertEqual(compiler.compile(self.DOCUMENT, self.output).passes, 2)
+        self.assertEqual(compiler.compile(self.DOCUMENT, self.output).passes, 1)
+        no_refs = self.DOCUMENT.replace("\\ref{sec}", "it")
+        result = compiler.compile(no_refs, Path(self.temp_dir.name) / "other.pdf")
+        self.assertEqual(result.passes, 1)
+        self.assertTrue(result.ok)
+
+
+class TestPdfBuildCache(unittest.TestCase):
+    """Tests for the content-addressed PDF build cache."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.root = Path(self.temp_dir.name)
+        self.cache = PdfBuildCache(str(self.root / "cache"), max_bytes=10)
+
+    def test_key_depends_on_latex_and_template(self):
+        """Any change to the LaTeX or the template version changes the key."""
+        key = PdfBuildCache.build_key("doc", "v1", "pdflatex")
+        self.assertEqual(key, PdfBuildCache.build_key("doc", "v1", "pdflatex"))
+        self.assertNotEqual(key, PdfBuildCache.build_key("doc", "v2", "pdflatex"))
+        self.assertNotEqual(key, PdfBuildCache.build_key("doc2", "v1", "pdflatex"))
+
+    def test_fetch_and_size_bounded_eviction(self):
+        """Hits place the stored PDF; the oldest entries go once over max_bytes."""
+        built = self.root / "built.pdf"
+        built.write_bytes(b"%PDF-1")
+        dest = self.root / "out.pdf"
+        self.assertFalse(self.cache.fetch("a", dest))
+        self.cache.store("a", built)
+        self.assertTrue(self.cache.fetch("a", dest))
+        self.assertEqual(dest.read_bytes(), b"%PDF-1")
+
+        os.utime(self.root / "cache" / "a.pdf", (1, 1))
+        self.cache.store("b", built)
+        self.assertFalse((self.root / "cache" / "a.pdf").exists())
+        self.assertEqual(self.cache.stats()["entries"], 1)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    @patch('subprocess.run', side_effect=fake_pdflatex)
+    def test_repeat_build_skips_compilation(self, mock_run):
+        """Compiling identical LaTeX again is served from the cache."""
+        self.cache.max_bytes = 1024
+        compiler = LatexCompiler(work_dir=str(self.root / "latex"), use_format=False)
+        document = TestLatexCompiler.DOCUMENT
+        with patch('tools.pdf_export.get_pdf_cache', return_value=self.cache), \
+                patch('tools.pdf_export.get_compile_pool', return_value=CompilePool(compiler, max_workers=1)):
+            compile_latex(document, "first.pdf", self.root, "v1")
+            compiled_runs = mock_run.call_count
+            self.assertEqual(compile_latex(document, "second.pdf", self.root, "v1"), "second.pdf")
+            self.assertEqual(mock_run.call_count, compiled_runs)
+            self.assertEqual((self.root / "second.pdf").read_text(), "%PDF")
+            compile_latex(document, "third.pdf", self.root, "v2")
+            self.assertGreater(mock_run.call_count, compiled_runs)
+
+
+class TestCompilePool(unittest.TestCase):
+    """Tests for the bounded LaTeX compile pool."""
+
+    def test_concurrency_bounded_and_metrics(self):
+        """No more than max_workers compiles run at once; the rest queue."""
+        release = threading.Event()
+        running = []
+        peak = []
+
+        def compile(latex, output_path, key=None):
+            running.append(latex)
+            peak.append(len(running))
+            release.wait(5)
+            running.remove(latex)
+            if latex == "slow":
+                raise subprocess.TimeoutExpired("pdflatex", 1)
+            return MagicMock(ok=True)
+
+        pool = CompilePool(MagicMock(compile=compile), max_workers=2)
+        self.addCleanup(pool.shutdown)
+        futures = [pool.submit(latex, "paper.pdf") for latex in ("a", "b", "c", "slow")]
+        deadline = time.time() + 5
+        while len(running) < 2 and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(pool.stats()["queued"], 2)
+
+        release.set()
+        with self.assertRaises(subprocess.TimeoutExpired):
+            futures[-1].result(5)
+        for future in futures[:-1]:
+            future.result(5)
+        stats = pool.stats()
+        self.assertEqual(max(peak), 2)
+        self.assertEqual((stats["completed"], stats["failed"], stats["timed_out"]), (3, 1, 1))
+        self.assertEqual((stats["queued"], stats["running"]), (0, 0))
+
+    @patch('subprocess.run', side_effect=fake_pdflatex)
+    def test_engine_runs_with_limits(self, mock_run):
+        """Each engine run gets the configured timeout and memory limit."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            compiler = LatexCompiler(work_dir=temp_dir, use_format=False, timeout_seconds=30, memory_limit_mb=512)
+            compiler.compile(TestLatexCompiler.DOCUMENT, Path(temp_dir) / "paper.pdf")
+        args, kwargs = mock_run.call_args
+        self.assertEqual(kwargs["timeout"], 30)
+        self.assertNotIn("preexec_fn", kwargs)
+        self.assertEqual(args[0][:2], ["sh", "-c"])
+        self.assertIn("ulimit -v 524288", args[0][2])
+        self.assertEqual(args[0][3], "pdflatex")
+    
+    def test_memory_limit_applied_by_wrapper(self):
+        """The shell wrapper really limits the engine's address space."""
+        compiler = LatexCompiler(memory_limit_mb=512)
+        completed = subprocess.run(compiler._limited(["sh", "-c", "ulimit -v"]),
+                                   capture_output=True, text=True, timeout=10)
+        self.assertEqual(completed.stdout.strip(), "524288")
+
+
+class TestFastPdf(unittest.TestCase):
+    """Tests for the streaming fast PDF renderer."""
+
+    def test_plain_text(self):
+        """Pipeline LaTeX becomes text the standard fonts can draw."""
+        self.assertEqual(plain_text("R\\&D \\textbf{50\\%} \\textbackslash{}"), "R&D 50% \\")
+        self.assertEqual(plain_text("caf\u00e9 \u2713"), "caf\u00e9 ?")
+
+    def test_wrap_line(self):
+        """Lines fit the width and overlong words are split."""
+        lines = wrap_line("short words " * 40 + "x" * 500, "Times-Roman", 10, 200)
+        from reportlab.pdfbase.pdfmetrics import stringWidth
+        self.assertTrue(all(stringWidth(line, "Times-Roman", 10) <= 200 for line in lines))
+        self.assertEqual("".join(lines).replace(" ", ""), ("shortwords" * 40) + "x" * 500)
+
+    def test_long_sections_paginate(self):
+        """Markup-like text and very long sections render to many pages."""
+        content = {
+            "title": "<b>Unbalanced & markup",
+            "introduction": "\n\n".join("Paragraph <i>with</i> a & b < c. " * 30 for _ in range(200)),
+            "references": "\\bibitem{ref1} First\n\\bibitem{ref2} Second",
+        }
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / "paper.pdf"
+            pages = render_fast_pdf(content, path)
+            self.assertGreater(pages, 20)
+            self.assertTrue(path.read_bytes().startswith(b"%PDF"))
+            self.assertEqual(os.listdir(temp_dir), ["paper.pdf"])
+
+    def test_pages_streamed_and_partial_file_removed(self):
+        """Full pages reach disk while rendering; a failed render leaves no file behind."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            def sections(paper_content):
+                yield "Introduction", "\n\n".join("Streaming text. " * 40 for _ in range(100))
+                partial = [name for name in os.listdir(temp_dir) if name.endswith(".tmp")]
+                self.assertEqual(len(partial), 1)
+                written = Path(temp_dir, partial[0]).read_bytes()
+                self.assertGreater(written.count(b"/Type /Page "), 5)
+                raise RuntimeError("interrupted")
+
+            with patch('tools.fast_pdf.iter_sections', side_effect=sections):
+                with self.assertRaises(RuntimeError):
+                    render_fast_pdf({"title": "T"}, Path(temp_dir) / "paper.pdf")
+            self.assertEqual(os.listdir(temp_dir), [])
+
+    def test_fast_renderer_skips_latex(self):
+        """render_paper with the fast renderer never runs pdflatex."""
+        with tempfile.TemporaryDirectory() as temp_dir, patch('subprocess.run') as mock_run:
+            result = render_paper({"title": "Preview"}, output_filename="p.pdf",
+                                  output_dir=Path(temp_dir), renderer="fast")
+            self.assertEqual(result, "p.pdf")
+            self.assertTrue((Path(temp_dir) / "p.pdf").read_bytes().startswith(b"%PDF"))
+            mock_run.assert_not_called()
 
 
 class TestPdfExport(unittest.TestCase):
     """Tests for the PDF export tool."""
     
+    def setUp(self):
+        # Outputs, the PDF build cache and LaTeX workspaces all live in a
+        # throwaway directory so earlier runs can't turn a compile into a hit
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.root = Path(temp_dir.name)
+        pool = CompilePool(LatexCompiler(work_dir=str(self.root / "latex")), max_workers=1)
+        self.addCleanup(pool.shutdown)
+        for patcher in (
+            patch('tools.pdf_export.OUTPUT_DIR', self.root / "outputs"),
+            patch('tools.pdf_export.get_pdf_cache', return_value=PdfBuildCache(str(self.root / "pdf"), 1024 ** 2)),
+            patch('tools.pdf_export.get_compile_pool', return_value=pool),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        (self.root / "outputs").mkdir()
+    
     @patch('subprocess.run')
     def test_tex_to_pdf_success(self, mock_run):
         """Test successful PDF generation."""
@@ -104,38 +1086,46 @@ class TestPdfExport(unittest.TestCase):
                 # Restore working directory
                 os.chdir(old_cwd)
     
+    @patch('tools.pdf_export.traceback.print_exc')
     @patch('subprocess.run')
-    @patch('reportlab.pdfgen.canvas.Canvas')
-    def test_tex_to_pdf_fallback(self, mock_canvas, mock_run):
-        """Test fallback to reportlab when pdflatex fails."""
-        # Set up the mock subprocess.run to fail
+    def test_tex_to_pdf_fallback(self, mock_run, mock_print_exc):
+        """Test fallback to the fast renderer when pdflatex fails."""
         mock_run.side_effect = Exception("pdflatex not found")
         
-        # Set up the mock Canvas
-        mock_canvas_instance = MagicMock()
-        mock_canvas.return_value = mock_canvas_instance
+        output_path = tex_to_pdf("\\documentclass{article}\\begin{document}Test\\end{document}", "test.pdf")
         
-        # Create a temporary directory for testing
-        with tempfile.TemporaryDirectory() as temp_dir:
-            # Save current working directory
-            old_cwd = os.getcwd()
-            try:
-                # Change to the temp directory
-                os.chdir(temp_dir)
-                
-                # Test the PDF generation with fallback
-                output_path = tex_to_pdf("\\documentclass{article}\\begin{document}Test\\end{document}", "test.pdf")
-                
-                # Verify the output path
-                self.assertTrue(output_path.endswith("test.pdf"))
-                
-                # Verify that reportlab was used
-                mock_canvas_instance.drawString.assert_called()
-                mock_canvas_instance.save.assert_called_once()
-                
-            finally:
-                # Restore working directory
-                os.chdir(old_cwd)
+        self.assertTrue(output_path.endswith("test.pdf"))
+        # The fast renderer wrote a real PDF; the plain-text last resort was not used
+        pdf_path = self.root / "outputs" / "test.pdf"
+        self.assertEqual(pdf_path.read_bytes()[:5], b"%PDF-")
+        self.assertFalse((self.root / "outputs" / ".test.pdf.partial").exists())
+        self.assertTrue((self.root / "outputs" / "test.pdf.txt").exists())
+        mock_print_exc.assert_not_called()
+    
+    def test_safe_filename(self):
+        """Requested filenames are reduced to plain PDF basenames."""
+        self.assertEqual(safe_filename("../../etc/passwd"), "passwd.pdf")
+        self.assertEqual(safe_filename("my paper.pdf"), "my_paper.pdf")
+        self.assertEqual(safe_filename(""), "research_paper.pdf")
+        with self.assertRaises(ValueError):
+            job_output_dir("../escape")
+        with self.assertRaises(ValueError):
+            remove_job_output("../escape")
+        (job_output_dir("job_x") / "paper.pdf").touch()
+        remove_job_output("job_x")
+        self.assertFalse((self.root / "outputs" / "job_x").exists())
+    
+    @patch('subprocess.run', side_effect=FileNotFoundError("pdflatex not found"))
+    def test_concurrent_jobs_isolated(self, mock_run):
+        """Jobs writing the same filename land in their own directories."""
+        for job_id in ("job_a", "job_b"):
+            render_paper({"title": job_id}, output_filename="paper.pdf", output_dir=job_output_dir(job_id))
+        for job_id in ("job_a", "job_b"):
+            job_dir = self.root / "outputs" / job_id
+            self.assertTrue((job_dir / "paper.pdf").exists())
+            self.assertIn(job_id, (job_dir / "paper.pdf.input.json").read_text())
+            # No temporary files are left behind
+            self.assertEqual([p.name for p in job_dir.iterdir() if p.name.startswith(".")], [])
 
 
 if __name__ == '__main__':
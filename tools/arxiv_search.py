@@ -1,27 +1,97 @@
 """Custom ADK tool: search arXiv and return structured metadata."""
 from typing import List, Dict
-import arxiv
+from xml.etree import ElementTree
+
 from google.adk.tools import FunctionTool
 
+from callbacks.metrics import SEARCH_DURATION
+from config import get_config
+from tools.cache import get_search_cache, make_key, normalize_query
+from tools.http_client import get_http_client
+from tools.rate_limit import call_upstream
+
+ATOM = "{http://www.w3.org/2005/Atom}"
+ARXIV = "{http://arxiv.org/schemas/atom}"
+
 def search_arxiv_func(query: str, max_results: int = 10) -> List[Dict]:
     """Search arXiv for papers related to a query.
-    
+
+    Results are served from the shared search cache when the same normalized
+    query and result count were fetched recently.
+
     Args:
         query: The search query string
         max_results: Maximum number of results to return (default: 10)
-        
+
     Returns:
         List of dictionaries containing paper metadata
     """
-    search = arxiv.Search(query=query, max_results=max_results)
+    cache = get_search_cache()
+    key = make_key("arxiv", normalize_query(query), max_results)
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+    out = _fetch_arxiv(query, max_results)
+    if cache is not None:
+        try:
+            cache.set(key, out)
+        except Exception as e:
+            print(f"Could not cache arXiv results for '{query}': {e}")
+    return out
+
+def _fetch_arxiv(query: str, max_results: int) -> List[Dict]:
+    """Query the arXiv API directly, bypassing the cache."""
+    return get_http_client().run(fetch_arxiv_async(query, max_results))
+
+async def fetch_arxiv_async(query: str, max_results: int) -> List[Dict]:
+    """Query the arXiv API on the shared HTTP client's loop, bypassing the cache.
+
+    The request is paced, retried and circuit-broken by ``call_upstream``.
+    """
+    # Same arguments the arxiv package sends for a default Search
+    params = {
+        "search_query": query,
+        "id_list": "",
+        "sortBy": "relevance",
+        "sortOrder": "descending",
+        "start": 0,
+        "max_results": max_results,
+    }
+    url = get_config()["tools"]["arxiv"]["api_url"]
+
+    async def request() -> str:
+        with SEARCH_DURATION.time(source="arxiv"):
+            return await get_http_client().get_text(url, params)
+    feed = await call_upstream("arxiv", request)
+    return parse_arxiv_feed(feed)[:max_results]
+
+def parse_arxiv_feed(feed: str) -> List[Dict]:
+    """Convert an arXiv API Atom feed into paper dictionaries.
+
+    Raises:
+        ValueError: If arXiv reported an error for the query
+    """
+    root = ElementTree.fromstring(feed)
     out = []
-    for result in search.results():
+    for entry in root.findall(f"{ATOM}entry"):
+        entry_id = entry.findtext(f"{ATOM}id", "")
+        if "/abs/" not in entry_id:
+            # Malformed queries come back as a single error entry
+            raise ValueError(f"arXiv rejected the query: {entry.findtext(f'{ATOM}summary', '').strip()}")
+        pdf_url = next(
+            (link.get("href") for link in entry.findall(f"{ATOM}link") if link.get("title") == "pdf"),
+            entry_id.replace("/abs/", "/pdf/"),
+        )
         out.append({
-            "title": result.title,
-            "url": result.pdf_url,
-            "summary": result.summary,
-            "authors": [a.name for a in result.authors],
-            "published": result.published.strftime("%Y-%m-%d"),
+            "title": " ".join(entry.findtext(f"{ATOM}title", "").split()),
+            "url": pdf_url,
+            "summary": entry.findtext(f"{ATOM}summary", "").strip(),
+            "authors": [a.findtext(f"{ATOM}name", "") for a in entry.findall(f"{ATOM}author")],
+            "published": entry.findtext(f"{ATOM}published", "")[:10],
+            "arxiv_id": entry_id.split("/abs/")[-1],
+            "doi": entry.findtext(f"{ARXIV}doi", ""),
         })
     return out
 
@@ -30,4 +100,4 @@ search_arxiv = FunctionTool(
     func=search_arxiv_func,  # Reverted 'function' back to 'func'
     # name="search_arxiv",  # Name/description might be inferred or set differently
     # description="Search arXiv for papers related to a query"
-)
\ No newline at end of file
+)
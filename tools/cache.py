@@ -0,0 +1,216 @@
+"""Persistent result cache backed by SQLite.
+
+The cache is content-addressed: callers build a key from the inputs that
+determine a result (see ``make_key``) and store any JSON-serializable value
+under it. Entries expire after a TTL and the table is bounded by an LRU
+policy on last access time. SQLite in WAL mode lets every worker thread and
+process share the same file safely.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from config import get_config
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS entries_lru ON entries (namespace, accessed);
+CREATE TABLE IF NOT EXISTS counters (
+    namespace TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (namespace, name)
+);
+"""
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a free-text search query so trivial variations share a key."""
+    return " ".join(query.lower().split())
+
+
+def make_key(*parts: Any) -> str:
+    """Build a stable content hash from the given key parts."""
+    payload = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """SQLite-backed key/value cache with TTL expiry and LRU eviction."""
+
+    def __init__(
+        self,
+        path: str,
+        namespace: str = "default",
+        ttl_seconds: float = 86400,
+        max_entries: int = 1000,
+    ):
+        """
+        Open (or create) a cache file.
+
+        Args:
+            path: Location of the SQLite database file
+            namespace: Logical partition inside the file; eviction and
+                counters are tracked per namespace
+            ttl_seconds: Age after which an entry is treated as a miss
+            max_entries: Maximum number of entries kept in this namespace
+        """
+        self.path = Path(path)
+        self.namespace = namespace
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connect().executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Return this thread's connection, opening it on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _bump(self, conn: sqlite3.Connection, name: str) -> None:
+        conn.execute(
+            "INSERT INTO counters (namespace, name, value) VALUES (?, ?, 1) "
+            "ON CONFLICT(namespace, name) DO UPDATE SET value = value + 1",
+            (self.namespace, name),
+        )
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Look up a key.
+
+        Args:
+            key: Cache key, usually produced by ``make_key``
+
+        Returns:
+            The stored value, or None on a miss or an expired entry
+        """
+        conn = self._connect()
+        now = time.time()
+        row = conn.execute(
+            "SELECT value, created FROM entries WHERE namespace = ? AND key = ?",
+            (self.namespace, key),
+        ).fetchone()
+        if row is None or now - row[1] > self.ttl_seconds:
+            if row is not None:
+                conn.execute(
+                    "DELETE FROM entries WHERE namespace = ? AND key = ?",
+                    (self.namespace, key),
+                )
+            self._bump(conn, "misses")
+            return None
+        conn.execute(
+            "UPDATE entries SET accessed = ? WHERE namespace = ? AND key = ?",
+            (now, self.namespace, key),
+        )
+        self._bump(conn, "hits")
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any) -> None:
+        """
+        Store a JSON-serializable value and evict least recently used entries.
+
+        Args:
+            key: Cache key, usually produced by ``make_key``
+            value: Value to store
+        """
+        payload = json.dumps(value)
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (namespace, key, value, created, accessed) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (self.namespace, key, payload, now, now),
+            )
+            conn.execute(
+                "DELETE FROM entries WHERE namespace = ? AND created < ?",
+                (self.namespace, now - self.ttl_seconds),
+            )
+            conn.execute(
+                "DELETE FROM entries WHERE namespace = ? AND key IN ("
+                "  SELECT key FROM entries WHERE namespace = ? "
+                "  ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.namespace, self.namespace, self.max_entries),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def clear(self) -> None:
+        """Remove every entry and reset the counters for this namespace."""
+        conn = self._connect()
+        conn.execute("DELETE FROM entries WHERE namespace = ?", (self.namespace,))
+        conn.execute("DELETE FROM counters WHERE namespace = ?", (self.namespace,))
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters (shared across processes) and the entry count."""
+        conn = self._connect()
+        counters = dict(conn.execute(
+            "SELECT name, value FROM counters WHERE namespace = ?", (self.namespace,)
+        ).fetchall())
+        entries = conn.execute(
+            "SELECT COUNT(*) FROM entries WHERE namespace = ?", (self.namespace,)
+        ).fetchone()[0]
+        hits = counters.get("hits", 0)
+        misses = counters.get("misses", 0)
+        lookups = hits + misses
+        return {
+            "namespace": self.namespace,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+        }
+
+
+_shared_caches: Dict[str, ResultCache] = {}
+_shared_caches_lock = threading.Lock()
+
+
+def _shared_cache(namespace: str, settings: Dict[str, Any]) -> Optional[ResultCache]:
+    """Return the process-wide cache for a namespace, or None if it is disabled."""
+    if not settings["enabled"]:
+        return None
+    with _shared_caches_lock:
+        cache = _shared_caches.get(namespace)
+        if cache is None:
+            cache = _shared_caches[namespace] = ResultCache(
+                settings["path"],
+                namespace=namespace,
+                ttl_seconds=settings["ttl_seconds"],
+                max_entries=settings["max_entries"],
+            )
+    return cache
+
+
+def get_search_cache() -> Optional[ResultCache]:
+    """Return the shared literature search cache, or None if it is disabled."""
+    return _shared_cache("search", get_config()["tools"]["search_cache"])
+
+
+def get_response_cache() -> Optional[ResultCache]:
+    """Return the shared agent response cache, or None if it is disabled."""
+    return _shared_cache("responses", get_config()["pipeline"]["response_cache"])
@@ -0,0 +1,128 @@
+"""Bounded pool for LaTeX compilation.
+
+Tool calls from concurrent jobs used to start pdflatex on whichever thread
+they ran on, so a burst of jobs meant an unbounded number of TeX processes
+competing for CPU and memory. Compiles are now submitted to a fixed number
+of worker threads, each running one engine process at a time (with the
+timeout and memory limit configured on the compiler); everyone else waits
+in the queue. ``submit`` returns a ``concurrent.futures.Future``, which
+async callers can await through ``asyncio.wrap_future``.
+"""
+import subprocess
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from callbacks.tracing import propagating, span
+from config import get_config
+from tools.latex_compiler import CompileResult, LatexCompiler, get_compiler
+
+
+class CompilePool:
+    """Runs LaTeX compiles on a bounded set of workers and tracks queue metrics."""
+
+    def __init__(self, compiler: Optional[LatexCompiler] = None, max_workers: Optional[int] = None):
+        """
+        Args:
+            compiler: Compiler used by the workers (default: the shared compiler)
+            max_workers: Compiles running at once (default: tools.latex.max_workers)
+        """
+        self.compiler = compiler or get_compiler()
+        self.max_workers = max_workers or get_config()["tools"]["latex"]["max_workers"]
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="latex-compile")
+        self._lock = threading.Lock()
+        self._counters = {
+            "queued": 0,
+            "running": 0,
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "timed_out": 0,
+        }
+        self._wait_seconds = 0.0
+        self._compile_seconds = 0.0
+
+    def _bump(self, **deltas: int) -> None:
+        with self._lock:
+            for name, delta in deltas.items():
+                self._counters[name] += delta
+
+    def _compile(self, latex: str, output_path: Path, key: Optional[str], submitted: float) -> CompileResult:
+        started = time.monotonic()
+        with self._lock:
+            self._counters["queued"] -= 1
+            self._counters["running"] += 1
+            self._wait_seconds += started - submitted
+        try:
+            with span("latex compile", **{"compile.wait_seconds": started - submitted}) as compile_span:
+                result = self.compiler.compile(latex, output_path, key)
+                compile_span.set_attribute("compile.passes", result.passes)
+                if not result.ok:
+                    compile_span.record_error(f"exit code {result.returncode}")
+        except subprocess.TimeoutExpired:
+            self._bump(timed_out=1, failed=1)
+            raise
+        except Exception:
+            self._bump(failed=1)
+            raise
+        else:
+            if result.ok:
+                self._bump(completed=1)
+            else:
+                self._bump(failed=1)
+            return result
+        finally:
+            with self._lock:
+                self._counters["running"] -= 1
+                self._compile_seconds += time.monotonic() - started
+
+    def submit(self, latex: str, output_path: Path, key: Optional[str] = None) -> "Future[CompileResult]":
+        """
+        Queue a compile; see ``LatexCompiler.compile`` for the arguments.
+
+        Returns:
+            Future resolving to the CompileResult, or raising the compile's
+            exception (e.g. ``subprocess.TimeoutExpired``)
+        """
+        self._bump(queued=1, submitted=1)
+        try:
+            # Run in the submitter's context so the compile is traced under its span
+            return self._executor.submit(
+                propagating(self._compile), latex, Path(output_path), key, time.monotonic()
+            )
+        except RuntimeError:
+            self._bump(queued=-1, submitted=-1)
+            raise
+
+    def compile(self, latex: str, output_path: Path, key: Optional[str] = None) -> CompileResult:
+        """Submit a compile and wait for its result."""
+        return self.submit(latex, output_path, key).result()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return queue depth, in-flight compiles and cumulative counters."""
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._counters)
+            started = stats["submitted"] - stats["queued"]
+            finished = stats["completed"] + stats["failed"]
+            stats["max_workers"] = self.max_workers
+            stats["avg_wait_seconds"] = self._wait_seconds / started if started else 0.0
+            stats["avg_compile_seconds"] = self._compile_seconds / finished if finished else 0.0
+            return stats
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+
+
+_pool: Optional[CompilePool] = None
+_pool_lock = threading.Lock()
+
+
+def get_compile_pool() -> CompilePool:
+    """Return the process-wide compile pool."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = CompilePool()
+        return _pool
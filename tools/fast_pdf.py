@@ -0,0 +1,306 @@
+"""Fast, dependency-light PDF renderer drawing paper text straight onto pages.
+
+Used as the fallback when LaTeX fails and as the ``fast`` renderer for
+previews. Unlike a platypus story, nothing is parsed as markup: text is
+converted from the light LaTeX the pipeline produces to plain text, reduced
+to characters the standard PDF fonts can show, wrapped greedily word by word
+(linear in the text length, however long a section is) and drawn line by
+line, starting a new page whenever the current one is full.
+
+Pages are streamed: each one is compressed and written to disk as soon as it
+is full, so memory stays bounded by a single page however long the paper is.
+reportlab is used only for font metrics.
+"""
+import os
+import re
+import tempfile
+import unicodedata
+import zlib
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Tuple
+
+# Order in which known paper_content keys are rendered; any other text keys follow
+SECTION_ORDER = [
+    "abstract", "keywords", "introduction", "related_work", "methodology",
+    "experiments", "results", "discussion", "limitations", "future_work",
+    "conclusion", "acknowledgment", "references", "appendix",
+]
+
+MARGIN = 72
+# (font, size, leading) per kind of line
+STYLES = {
+    "title": ("Helvetica-Bold", 18, 24),
+    "heading": ("Helvetica-Bold", 13, 18),
+    "subheading": ("Helvetica-Bold", 11, 15),
+    "body": ("Times-Roman", 10.5, 13.5),
+    "notice": ("Helvetica-Oblique", 9, 12),
+}
+
+_SUBSECTION = re.compile(r"^\\subsection\*?\{(.*)\}\s*$")
+_BIBITEM = re.compile(r"\\bibitem\{[^}]*\}\s*")
+_TEXT_COMMANDS = re.compile(r"\\(?:textbf|textit|emph|texttt|underline)\{([^{}]*)\}")
+_LATEX_SYMBOLS = [
+    (re.compile(r"\\textbackslash\{\}"), r"\\"),
+    (re.compile(r"\\textasciitilde\{\}"), "~"),
+    (re.compile(r"\\textasciicircum\{\}"), "^"),
+    (re.compile(r"\\([&%$#_{}])"), r"\1"),
+]
+_CONTROL_CHARS = re.compile(r"[\x00-\x08\x0b-\x1f\x7f]")
+
+
+def plain_text(text: str) -> str:
+    """
+    Turn pipeline LaTeX (escaped specials, \\textbf, \\bibitem) into printable text.
+
+    Characters the standard (WinAnsi-encoded) PDF fonts cannot show are
+    decomposed where possible and replaced with '?' otherwise.
+    """
+    text = _TEXT_COMMANDS.sub(r"\1", text)
+    for pattern, replacement in _LATEX_SYMBOLS:
+        text = pattern.sub(replacement, text)
+    text = _CONTROL_CHARS.sub("", unicodedata.normalize("NFKC", text))
+    return text.encode("cp1252", errors="replace").decode("cp1252")
+
+
+def _section_text(value: Any) -> str:
+    if isinstance(value, dict):
+        return "\n\n".join(f"{key}: {item}" for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return "\n\n".join(str(item) for item in value)
+    return str(value)
+
+
+def iter_sections(paper_content: Dict[str, Any]) -> Iterator[Tuple[str, str]]:
+    """Yield (heading, text) for every non-empty section in reading order."""
+    extra = [key for key in paper_content if key not in SECTION_ORDER and key != "title"]
+    for key in SECTION_ORDER + extra:
+        value = paper_content.get(key)
+        if value:
+            yield key.replace("_", " ").title(), _section_text(value)
+
+
+def wrap_line(text: str, font: str, size: float, width: float) -> List[str]:
+    """Greedily wrap one paragraph to ``width`` points; overlong words are split."""
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+
+    space = stringWidth(" ", font, size)
+    lines: List[str] = []
+    current: List[str] = []
+    current_width = 0.0
+    for word in text.split():
+        word_width = stringWidth(word, font, size)
+        while word_width > width:
+            # Split a word that cannot fit on any line (URLs, long identifiers)
+            if current:
+                lines.append(" ".join(current))
+                current, current_width = [], 0.0
+            cut = max(1, int(len(word) * width / word_width))
+            while cut > 1 and stringWidth(word[:cut], font, size) > width:
+                cut -= 1
+            lines.append(word[:cut])
+            word = word[cut:]
+            word_width = stringWidth(word, font, size)
+        if not word:
+            continue
+        needed = word_width + (space if current else 0.0)
+        if current and current_width + needed > width:
+            lines.append(" ".join(current))
+            current, current_width = [word], word_width
+        else:
+            current.append(word)
+            current_width += needed
+    if current:
+        lines.append(" ".join(current))
+    return lines
+
+
+LETTER = (612.0, 792.0)
+
+
+def _pdf_string(text: str) -> bytes:
+    """Encode text as a WinAnsi PDF string literal."""
+    raw = text.encode("cp1252", errors="replace")
+    return b"(" + raw.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)") + b")"
+
+
+class _StreamingPdf:
+    """
+    Minimal PDF writer that writes each page to ``stream`` as soon as it ends.
+
+    Only what the renderer needs is supported: the standard Type 1 fonts and
+    single lines of text. Objects are numbered as they are written; the page
+    tree, document info and cross-reference table follow the last page.
+    """
+
+    _CATALOG, _PAGES = 1, 2
+
+    def __init__(self, stream: BinaryIO, page_size: Tuple[float, float]):
+        self.stream = stream
+        self.page_size = page_size
+        self.title = ""
+        self._offsets: Dict[int, int] = {}
+        self._page_ids: List[int] = []
+        self._fonts: Dict[str, str] = {}
+        self._next_id = self._PAGES + 1
+        self._content: List[bytes] = []
+        self._font = b""
+        self.stream.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        self._write_object(self._CATALOG, b"<< /Type /Catalog /Pages 2 0 R >>")
+        # Every font the renderer can use goes into one shared resource dictionary
+        font_refs = []
+        for font in sorted({style[0] for style in STYLES.values()}):
+            name = f"F{len(self._fonts) + 1}"
+            self._fonts[font] = name
+            font_refs.append(f"/{name} {self._write_new(f'<< /Type /Font /Subtype /Type1 /BaseFont /{font} /Encoding /WinAnsiEncoding >>'.encode())} 0 R")
+        self._resources = self._write_new(f"<< /Font << {' '.join(font_refs)} >> >>".encode())
+
+    def _write_object(self, object_id: int, body: bytes) -> None:
+        self._offsets[object_id] = self.stream.tell()
+        self.stream.write(b"%d 0 obj\n" % object_id + body + b"\nendobj\n")
+
+    def _write_new(self, body: bytes) -> int:
+        object_id = self._next_id
+        self._next_id += 1
+        self._write_object(object_id, body)
+        return object_id
+
+    def setTitle(self, title: str) -> None:
+        self.title = title
+
+    def setFont(self, font: str, size: float) -> None:
+        self._font = f"/{self._fonts[font]} {size:g} Tf".encode()
+
+    def drawString(self, x: float, y: float, text: str) -> None:
+        self._content.append(b"BT %s %.2f %.2f Td %s Tj ET" % (self._font, x, y, _pdf_string(text)))
+
+    def showPage(self) -> None:
+        """Write the current page and start an empty one."""
+        data = zlib.compress(b"\n".join(self._content))
+        self._content = []
+        contents = self._write_new(
+            b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(data) + data + b"\nendstream"
+        )
+        width, height = self.page_size
+        self._page_ids.append(self._write_new(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %g %g] /Resources %d 0 R /Contents %d 0 R >>"
+            % (width, height, self._resources, contents)
+        ))
+
+    def save(self) -> None:
+        """Write the last page, the page tree and the trailer."""
+        if self._content or not self._page_ids:
+            self.showPage()
+        kids = b" ".join(b"%d 0 R" % page_id for page_id in self._page_ids)
+        self._write_object(self._PAGES, b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(self._page_ids)))
+        title = "\ufeff".encode("utf-16-be") + self.title.encode("utf-16-be")
+        info = self._write_new(b"<< /Title <%s> /Producer (fast_pdf) >>" % title.hex().encode())
+        xref = self.stream.tell()
+        self.stream.write(b"xref\n0 %d\n0000000000 65535 f \n" % self._next_id)
+        for object_id in range(1, self._next_id):
+            self.stream.write(b"%010d 00000 n \n" % self._offsets[object_id])
+        self.stream.write(
+            b"trailer\n<< /Size %d /Root 1 0 R /Info %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+            % (self._next_id, info, xref)
+        )
+
+
+class _PageWriter:
+    """Draws lines top to bottom, starting a new page when the current one is full."""
+
+    def __init__(self, pdf_canvas: "_StreamingPdf", page_size: Tuple[float, float]):
+        self.canvas = pdf_canvas
+        self.width, self.height = page_size
+        self.text_width = self.width - 2 * MARGIN
+        self.pages = 1
+        self.y = self.height - MARGIN
+
+    def _new_page(self) -> None:
+        self.canvas.showPage()
+        self.pages += 1
+        self.y = self.height - MARGIN
+
+    def gap(self, points: float) -> None:
+        self.y -= points
+
+    def paragraph(self, text: str, style: str = "body", keep_with_next: int = 0) -> None:
+        font, size, leading = STYLES[style]
+        lines = wrap_line(text, font, size, self.text_width)
+        # Headings move to the next page rather than end up alone at the bottom
+        if keep_with_next and self.y - leading * (len(lines) + keep_with_next) < MARGIN:
+            self._new_page()
+        for line in lines:
+            if self.y - leading < MARGIN:
+                self._new_page()
+            self.y -= leading
+            self.canvas.setFont(font, size)
+            self.canvas.drawString(MARGIN, self.y, line)
+
+    def section(self, heading: str, text: str) -> None:
+        self.gap(6)
+        self.paragraph(plain_text(heading), "heading", keep_with_next=2)
+        self.gap(2)
+        references = 0
+        for block in re.split(r"\n\s*\n", text):
+            # Consecutive plain lines of a block form one paragraph
+            pending: List[str] = []
+            for line in block.splitlines():
+                line = line.strip()
+                subsection = _SUBSECTION.match(line)
+                if not (subsection or _BIBITEM.match(line)):
+                    if line:
+                        pending.append(line)
+                    continue
+                if pending:
+                    self.paragraph(plain_text(" ".join(pending)))
+                    pending = []
+                if subsection:
+                    self.gap(4)
+                    self.paragraph(plain_text(subsection.group(1)), "subheading", keep_with_next=2)
+                else:
+                    references += 1
+                    self.paragraph(plain_text(f"[{references}] " + _BIBITEM.sub("", line, count=1)))
+            if pending:
+                self.paragraph(plain_text(" ".join(pending)))
+            self.gap(4)
+
+
+def render_fast_pdf(
+    paper_content: Dict[str, Any],
+    output_path: Path,
+    notices: Iterable[str] = (),
+) -> int:
+    """
+    Render paper content to a PDF without LaTeX.
+
+    The PDF is written page by page to a temporary file next to
+    ``output_path`` and renamed into place when complete; the temporary file
+    is removed if rendering fails.
+
+    Args:
+        paper_content: Paper sections keyed as for paper_to_pdf (plus any extra text keys)
+        output_path: Where to write the PDF
+        notices: Lines printed under the title, e.g. why this renderer was used
+
+    Returns:
+        Number of pages written
+    """
+    output_path = Path(output_path)
+    fd, tmp = tempfile.mkstemp(dir=str(output_path.parent), prefix=f".{output_path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as stream:
+            pdf = _StreamingPdf(stream, LETTER)
+            title = plain_text(str(paper_content.get("title") or "Research Paper"))
+            pdf.setTitle(title)
+            writer = _PageWriter(pdf, LETTER)
+            writer.paragraph(title, "title")
+            writer.gap(6)
+            for notice in notices:
+                writer.paragraph(plain_text(notice), "notice")
+            for heading, text in iter_sections(paper_content):
+                writer.section(heading, text)
+            pdf.save()
+        os.replace(tmp, output_path)
+    finally:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+    return writer.pages
@@ -0,0 +1,229 @@
+"""Shared asynchronous HTTP transport for the literature APIs.
+
+Each search used to build its own client, so every call paid a fresh TCP
+(and TLS) handshake. This module keeps a single ``aiohttp.ClientSession``
+for the whole process, running on its own event-loop thread. The session's
+connector pools keep-alive connections by host. A semaphore per host caps
+the number of requests in flight against that host, so concurrent jobs wait
+here instead of opening more and more sockets.
+
+aiohttp does not pipeline HTTP/1.1 requests, so connections are reused
+through keep-alive only. After each response the connection goes back to
+the pool, and the next request to the same host picks it up.
+
+Coroutines such as ``HttpClient.get_json`` run on the client's loop.
+Synchronous callers, like the functions behind ADK ``FunctionTool`` objects,
+hand a coroutine to ``HttpClient.run``, which blocks the calling thread until
+the loop has a result. The coroutine runs in a copy of the caller's context,
+so tracing spans nest as they would for a direct call.
+"""
+import asyncio
+import atexit
+import concurrent.futures
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, Mapping, Optional, TypeVar
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from config import get_config
+
+T = TypeVar("T")
+
+
+class HttpError(RuntimeError):
+    """Non-success response from an upstream API."""
+
+    def __init__(self, status: int, url: str, message: str = "", retry_after: Optional[float] = None):
+        super().__init__(f"HTTP {status} from {url}" + (f": {message}" if message else ""))
+        self.status = status
+        self.url = url
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait according to a Retry-After header (delta or HTTP date)."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class HttpClient:
+    """Pooled keep-alive HTTP client with per-host concurrency caps."""
+
+    def __init__(
+        self,
+        max_connections: int = 100,
+        max_per_host: int = 8,
+        host_limits: Optional[Mapping[str, int]] = None,
+        keepalive_seconds: float = 30.0,
+        timeout_seconds: float = 30.0,
+        user_agent: str = "ai_research_agent",
+    ):
+        """
+        Start the client's event-loop thread.
+
+        Args:
+            max_connections: Open sockets across all hosts
+            max_per_host: Requests in flight against any one host
+            host_limits: Per-host overrides of ``max_per_host``, keyed by host[:port]
+            keepalive_seconds: Idle pooled connections are closed after this
+            timeout_seconds: Total time allowed per request, excluding the wait for a slot
+            user_agent: User-Agent header sent with every request
+        """
+        self.max_connections = max_connections
+        self.max_per_host = max_per_host
+        self.host_limits = dict(host_limits or {})
+        self.keepalive_seconds = keepalive_seconds
+        self.timeout_seconds = timeout_seconds
+        self.user_agent = user_agent
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        # Only ever updated on the loop thread
+        self._stats = {"requests": 0, "in_flight": 0, "errors": 0,
+                       "connections_opened": 0, "connections_reused": 0}
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="http-client", daemon=True)
+        self._thread.start()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # Created lazily on the loop thread, where aiohttp expects it
+        if self._session is None:
+            trace = aiohttp.TraceConfig()
+            trace.on_connection_create_end.append(self._count("connections_opened"))
+            trace.on_connection_reuseconn.append(self._count("connections_reused"))
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                limit_per_host=0,  # The per-host semaphores enforce the caps
+                keepalive_timeout=self.keepalive_seconds,
+                ttl_dns_cache=300,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout_seconds),
+                headers={"User-Agent": self.user_agent},
+                trace_configs=[trace],
+            )
+        return self._session
+
+    def _count(self, name: str) -> Callable[..., Awaitable[None]]:
+        async def count(session: Any, context: Any, params: Any) -> None:
+            self._stats[name] += 1
+        return count
+
+    def _semaphore(self, host: str) -> asyncio.Semaphore:
+        semaphore = self._semaphores.get(host)
+        if semaphore is None:
+            limit = self.host_limits.get(host, self.max_per_host)
+            semaphore = self._semaphores[host] = asyncio.Semaphore(max(1, limit))
+        return semaphore
+
+    async def _get(
+        self,
+        url: str,
+        params: Optional[Mapping[str, Any]],
+        headers: Optional[Mapping[str, str]],
+        read: Callable[[aiohttp.ClientResponse], Awaitable[T]],
+    ) -> T:
+        session = self._get_session()
+        if params is not None:
+            params = {name: str(value) for name, value in params.items()}
+        async with self._semaphore(urlsplit(url).netloc):
+            self._stats["requests"] += 1
+            self._stats["in_flight"] += 1
+            try:
+                async with session.get(url, params=params, headers=headers) as response:
+                    if response.status >= 400:
+                        body = (await response.text(errors="replace"))[:200]
+                        raise HttpError(response.status, str(response.url), body.strip(),
+                                        parse_retry_after(response.headers.get("Retry-After")))
+                    return await read(response)
+            except Exception:
+                self._stats["errors"] += 1
+                raise
+            finally:
+                self._stats["in_flight"] -= 1
+
+    async def get_text(
+        self,
+        url: str,
+        params: Optional[Mapping[str, Any]] = None,
+        headers: Optional[Mapping[str, str]] = None,
+    ) -> str:
+        """GET a URL on the client's loop and return the decoded body.
+
+        Raises:
+            HttpError: For 4xx and 5xx responses
+        """
+        return await self._get(url, params, headers, lambda response: response.text())
+
+    async def get_json(
+        self,
+        url: str,
+        params: Optional[Mapping[str, Any]] = None,
+        headers: Optional[Mapping[str, str]] = None,
+    ) -> Any:
+        """GET a URL on the client's loop and return the parsed JSON body.
+
+        Raises:
+            HttpError: For 4xx and 5xx responses
+        """
+        return await self._get(url, params, headers, lambda response: response.json(content_type=None))
+
+    def run(self, coro: Awaitable[T], timeout: Optional[float] = None) -> T:
+        """Run a coroutine on the client's loop and block until it finishes."""
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("HttpClient.run() called from the client's own loop; await the coroutine instead")
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+    def stats(self) -> Dict[str, int]:
+        """Request and connection counters since the client started."""
+        return dict(self._stats)
+
+    def close(self) -> None:
+        """Close pooled connections and stop the loop thread."""
+        if not self._thread.is_alive():
+            return
+        if self._session is not None:
+            try:
+                self.run(self._session.close(), timeout=5)
+            except Exception as e:
+                print(f"Could not close HTTP session: {e}")
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+
+
+_client: Optional[HttpClient] = None
+_client_lock = threading.Lock()
+
+
+def get_http_client() -> HttpClient:
+    """Return the process-wide client configured under ``tools.http``."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            settings = get_config()["tools"]["http"]
+            _client = HttpClient(
+                max_connections=settings["max_connections"],
+                max_per_host=settings["max_per_host"],
+                host_limits=settings.get("host_limits"),
+                keepalive_seconds=settings["keepalive_seconds"],
+                timeout_seconds=settings["timeout_seconds"],
+                user_agent=settings["user_agent"],
+            )
+            atexit.register(_client.close)
+        return _client
+
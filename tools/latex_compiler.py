@@ -0,0 +1,362 @@
+"""LaTeX compilation with a preloaded preamble format and warm workspaces.
+
+Every paper rendered from a template starts with the same ``\\documentclass``
+and ``\\usepackage`` lines, and loading them dominates a pdflatex run. The
+compiler dumps that static preamble once into a custom format file (``.fmt``)
+keyed by its content hash; later compiles start from the format instead of
+re-reading the class and packages.
+
+pdflatex cannot stay resident between documents, so the "warm" state kept
+between runs is a pool of reusable workspaces: in incremental mode the same
+output reuses its workspace, so the ``.aux`` of the previous build is
+already present (as with latexmk) and a second pass is only run when the log
+asks for one and the auxiliary files actually changed.
+"""
+import hashlib
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from callbacks.metrics import PDFLATEX_DURATION
+from callbacks.tracing import CLIENT, span
+from config import get_config
+
+# Lines that may be dumped into a format: the class, packages, blanks and comments
+_DUMPABLE_LINE = re.compile(
+    r"^\s*(?:\\(?:documentclass|usepackage|RequirePackage)(?:\[[^\]]*\])?\{[^}]*\})?\s*(?:%.*)?$"
+)
+# Packages that hook \begin{document} and misbehave when loaded from a format,
+# and classes that load them (acmart pulls in hyperref), so nothing is dumped
+_NO_DUMP_PACKAGES = re.compile(
+    r"\\(?:usepackage(?:\[[^\]]*\])?\{[^}]*\b(?:hyperref|cleveref)\b"
+    r"|documentclass(?:\[[^\]]*\])?\{acmart\})"
+)
+# Engine messages saying the format itself could not be loaded
+_FORMAT_ERROR_PATTERN = re.compile(
+    r"Fatal format file error|can't find the format file|was written by|made by different executable"
+)
+# Log messages after which another pass is needed to resolve references
+_RERUN_PATTERN = re.compile(
+    r"Rerun to get|Label\(s\) may have changed|There were undefined (?:references|citations)|Please rerun"
+)
+# Auxiliary files whose changes between passes mean references moved
+_AUX_SUFFIXES = (".aux", ".toc", ".out")
+
+JOB_NAME = "paper"
+
+
+@dataclass
+class CompileResult:
+    """Outcome of compiling one document."""
+
+    pdf_path: Optional[Path]
+    log: str
+    passes: int
+    used_format: bool
+    returncode: int
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0 and self.pdf_path is not None and self.pdf_path.exists()
+
+
+def split_preamble(latex: str) -> Tuple[str, str]:
+    """
+    Split a document into the static preamble that can be dumped into a
+    format and the remainder that must be compiled every time.
+
+    Args:
+        latex: Complete LaTeX document
+
+    Returns:
+        (preamble, body); preamble is empty when nothing can be preloaded
+    """
+    lines = latex.splitlines(keepends=True)
+    count = 0
+    for line in lines:
+        if not _DUMPABLE_LINE.match(line) or _NO_DUMP_PACKAGES.search(line):
+            break
+        count += 1
+    preamble = "".join(lines[:count])
+    if "\\documentclass" not in preamble:
+        return "", latex
+    return preamble, "".join(lines[count:])
+
+
+def _aux_digest(workspace: Path) -> str:
+    digest = hashlib.sha256()
+    for suffix in _AUX_SUFFIXES:
+        path = workspace / f"{JOB_NAME}{suffix}"
+        if path.exists():
+            digest.update(path.read_bytes())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _read_log(workspace: Path) -> str:
+    log_path = workspace / f"{JOB_NAME}.log"
+    return log_path.read_text(errors="replace") if log_path.exists() else ""
+
+
+class LatexCompiler:
+    """Compiles LaTeX documents, reusing preamble formats and workspaces."""
+
+    def __init__(
+        self,
+        work_dir: Optional[str] = None,
+        use_format: Optional[bool] = None,
+        incremental: Optional[bool] = None,
+        max_passes: Optional[int] = None,
+        max_workspaces: Optional[int] = None,
+        command: Optional[str] = None,
+        timeout_seconds: Optional[float] = None,
+        memory_limit_mb: Optional[int] = None,
+    ):
+        """
+        Args:
+            work_dir: Directory holding formats and workspaces (default: tools.latex.work_dir)
+            use_format: Preload the static preamble from a dumped format
+            incremental: Keep a workspace per output so auxiliary files carry over
+            max_passes: Upper bound on pdflatex runs per compile
+            max_workspaces: Warm workspaces kept before the least recently used is removed
+            command: TeX engine to run (default: pdflatex)
+            timeout_seconds: Wall-clock limit of one engine run; the process is
+                killed and TimeoutExpired raised when it is exceeded
+            memory_limit_mb: Address-space limit of each engine process (0: none)
+        """
+        settings = get_config()["tools"]["latex"]
+        self.work_dir = Path(work_dir or settings["work_dir"])
+        self.use_format = settings["use_format"] if use_format is None else use_format
+        self.incremental = settings["incremental"] if incremental is None else incremental
+        self.max_passes = max_passes or settings["max_passes"]
+        self.max_workspaces = max_workspaces or settings["max_workspaces"]
+        self.command = command or settings["command"]
+        self.timeout_seconds = timeout_seconds or settings["timeout_seconds"]
+        self.memory_limit_mb = settings["memory_limit_mb"] if memory_limit_mb is None else memory_limit_mb
+        self._lock = threading.Lock()
+        self._workspaces: "OrderedDict[str, threading.Lock]" = OrderedDict()
+        self._format_locks: Dict[str, threading.Lock] = {}
+        self._broken_formats: Set[str] = set()
+
+    def _format_lock(self, name: str) -> threading.Lock:
+        with self._lock:
+            return self._format_locks.setdefault(name, threading.Lock())
+
+    def ensure_format(self, preamble: str) -> Optional[Path]:
+        """
+        Return the format file for a preamble, building it on first use.
+
+        Returns:
+            Path to the ``.fmt`` file, or None if it cannot be built
+        """
+        name = "preamble-" + hashlib.sha256(f"{self.command}\n{preamble}".encode("utf-8")).hexdigest()[:16]
+        format_dir = self.work_dir / "formats"
+        fmt_path = format_dir / f"{name}.fmt"
+        with self._format_lock(name):
+            if fmt_path.exists():
+                return fmt_path
+            if name in self._broken_formats:
+                return None
+            format_dir.mkdir(parents=True, exist_ok=True)
+            with tempfile.TemporaryDirectory(dir=str(format_dir)) as build_dir:
+                source = Path(build_dir) / f"{name}.tex"
+                source.write_text(preamble + "\\dump\n")
+                try:
+                    self._run(
+                        [self.command, "-ini", "-interaction=nonstopmode", f"-jobname={name}",
+                         f"&{self.command}", source.name],
+                        build_dir,
+                    )
+                except (OSError, subprocess.SubprocessError) as e:
+                    print(f"Could not build LaTeX format: {e}")
+                built = Path(build_dir) / f"{name}.fmt"
+                if not built.exists():
+                    print(f"LaTeX format {name} could not be built; compiling without it")
+                    self._broken_formats.add(name)
+                    return None
+                os.replace(built, fmt_path)
+            print(f"Built LaTeX format {fmt_path}")
+            return fmt_path
+
+    def _discard_format(self, fmt_path: Path) -> None:
+        with self._format_lock(fmt_path.stem):
+            self._broken_formats.add(fmt_path.stem)
+            if fmt_path.exists():
+                fmt_path.unlink()
+
+    def _acquire_workspace(self, key: str) -> Tuple[Path, threading.Lock]:
+        name = hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+        workspace = self.work_dir / "workspaces" / name
+        with self._lock:
+            lock = self._workspaces.pop(name, None) or threading.Lock()
+            self._workspaces[name] = lock
+            while len(self._workspaces) > self.max_workspaces:
+                old_name, old_lock = next(iter(self._workspaces.items()))
+                if not old_lock.acquire(blocking=False):
+                    break  # Oldest workspace is in use; trim it on a later call
+                try:
+                    del self._workspaces[old_name]
+                    shutil.rmtree(self.work_dir / "workspaces" / old_name, ignore_errors=True)
+                finally:
+                    old_lock.release()
+        return workspace, lock
+
+    @contextmanager
+    def _workspace(self, key: Optional[str]) -> Iterator[Path]:
+        """Hold the warm workspace of ``key`` (incremental mode) or a throwaway one."""
+        if self.incremental and key:
+            workspace, lock = self._acquire_workspace(key)
+            with lock:
+                workspace.mkdir(parents=True, exist_ok=True)
+                yield workspace
+        else:
+            with tempfile.TemporaryDirectory() as temp_dir:
+                yield Path(temp_dir)
+
+    def _run_pass(self, workspace: Path, fmt_path: Optional[Path]) -> subprocess.CompletedProcess:
+        args = [self.command, "-interaction=nonstopmode", f"-jobname={JOB_NAME}"]
+        if fmt_path is not None:
+            args.append(f"-fmt={fmt_path.stem}")
+        args.append(f"{JOB_NAME}.tex")
+        return self._run(args, str(workspace))
+
+    def _limited(self, args: List[str]) -> List[str]:
+        """Wrap a command so it runs under the configured address-space limit.
+
+        The limit is set by a shell that then execs the engine. preexec_fn
+        would do it in the forked child, but that is unsafe here because the
+        process always has other threads running (compile pool, HTTP loop, job
+        workers).
+        """
+        if not self.memory_limit_mb or os.name != "posix":
+            return args
+        # ulimit -v takes KiB; "$0" and "$@" are the engine and its arguments
+        return ["sh", "-c", f'ulimit -v {self.memory_limit_mb * 1024} && exec "$0" "$@"'] + args
+
+    def _run(self, args: List[str], cwd: str) -> subprocess.CompletedProcess:
+        """Run the engine with the configured timeout and memory limit."""
+        with span(Path(args[0]).name, CLIENT, **{"process.command_line": " ".join(args)}) as engine_span:
+            with PDFLATEX_DURATION.time():
+                completed = subprocess.run(
+                    self._limited(args),
+                    cwd=cwd,
+                    capture_output=True,
+                    text=True,
+                    timeout=self.timeout_seconds,
+                )
+            engine_span.set_attribute("process.exit_code", completed.returncode)
+            engine_span.set_attribute("process.stdout.bytes", len(completed.stdout or ""))
+            if completed.returncode != 0:
+                engine_span.record_error(f"exit code {completed.returncode}")
+            return completed
+
+    def _prepare(self, workspace: Path, latex: str) -> Optional[Path]:
+        """Write the document into the workspace; returns the format to load, if any."""
+        preamble, body = split_preamble(latex) if self.use_format else ("", latex)
+        fmt_path = self.ensure_format(preamble) if preamble else None
+        if fmt_path is not None:
+            # The engine looks formats up by name; a link in the workspace is the cheapest way
+            local = workspace / fmt_path.name
+            if not local.exists():
+                try:
+                    os.link(fmt_path, local)
+                except OSError:
+                    shutil.copy(fmt_path, local)
+            latex = body
+        (workspace / f"{JOB_NAME}.tex").write_text(latex)
+        return fmt_path
+
+    def _compile_in(self, workspace: Path, latex: str) -> CompileResult:
+        fmt_path = self._prepare(workspace, latex)
+        # Format under suspicion after a failed first pass; discarded only if the
+        # document then compiles without it
+        suspect: Optional[Path] = None
+        passes = 0
+        returncode = 0
+        while passes < self.max_passes:
+            before = _aux_digest(workspace)
+            process = self._run_pass(workspace, fmt_path)
+            passes += 1
+            returncode = process.returncode
+            if returncode != 0 and fmt_path is not None and passes == 1:
+                if _FORMAT_ERROR_PATTERN.search((process.stdout or "") + _read_log(workspace)):
+                    # A stale or incompatible format: no document can use it
+                    print(f"Format {fmt_path.name} could not be loaded; discarding it")
+                    self._discard_format(fmt_path)
+                else:
+                    # Usually an error in the body, which fails without the format too
+                    print(f"Compilation with format {fmt_path.name} failed; retrying without it")
+                    suspect = fmt_path
+                (workspace / f"{JOB_NAME}.tex").write_text(latex)
+                fmt_path = None
+                passes = 0
+                continue
+            if returncode != 0:
+                break
+            if not _RERUN_PATTERN.search(_read_log(workspace)) or _aux_digest(workspace) == before:
+                break
+        if suspect is not None and returncode == 0:
+            print(f"Document compiles only without format {suspect.name}; discarding it")
+            self._discard_format(suspect)
+        pdf_path = workspace / f"{JOB_NAME}.pdf"
+        return CompileResult(
+            pdf_path=pdf_path if pdf_path.exists() else None,
+            log=_read_log(workspace),
+            passes=passes,
+            used_format=fmt_path is not None,
+            returncode=returncode,
+        )
+
+    def compile(self, latex: str, output_path: Path, key: Optional[str] = None) -> CompileResult:
+        """
+        Compile a document and copy the PDF to ``output_path``.
+
+        Args:
+            latex: Complete LaTeX document
+            output_path: Where the PDF is written (atomically) on success
+            key: Identifies the output for incremental builds (default: output_path)
+
+        Returns:
+            CompileResult; ``pdf_path`` is ``output_path`` when compilation succeeded
+
+        Raises:
+            OSError: If the TeX engine cannot be started
+        """
+        output_path = Path(output_path)
+        with self._workspace(key or str(output_path)) as workspace:
+            result = self._compile_in(workspace, latex)
+            if result.ok:
+                fd, tmp = tempfile.mkstemp(dir=str(output_path.parent), prefix=f".{output_path.name}.", suffix=".tmp")
+                os.close(fd)
+                try:
+                    shutil.copy(result.pdf_path, tmp)
+                    os.replace(tmp, output_path)
+                finally:
+                    if os.path.exists(tmp):
+                        os.unlink(tmp)
+                result.pdf_path = output_path
+            else:
+                result.pdf_path = None
+            print(f"LaTeX compile: {result.passes} pass(es), format {'used' if result.used_format else 'not used'}")
+            return result
+
+
+_compiler: Optional[LatexCompiler] = None
+_compiler_lock = threading.Lock()
+
+
+def get_compiler() -> LatexCompiler:
+    """Return the process-wide compiler configured from ``tools.latex``."""
+    global _compiler
+    with _compiler_lock:
+        if _compiler is None:
+            _compiler = LatexCompiler()
+        return _compiler
@@ -0,0 +1,254 @@
+"""Custom ADK tool: run one literature query per outline section, concurrently.
+
+A single broad query lets one phrasing decide the whole bibliography. This
+tool derives a sub-query per outline section, runs every (query, source)
+pair on a bounded thread pool against arXiv and Semantic Scholar (and the
+offline ``local_corpus`` index when it is listed in the sources), and merges
+the results through the cross-source ``PaperIndex``. Per-source pacing is
+enforced inside the individual search tools, so concurrent jobs share the
+same limits.
+
+``stream_literature`` yields each search's results as soon as it returns,
+and ``LiteratureStream`` indexes them incrementally. The pipeline therefore
+starts drafting a section once the searches behind it are in, while the
+remaining searches are still running.
+"""
+import copy
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from google.adk.tools import FunctionTool, ToolContext
+
+from callbacks.tracing import CLIENT, propagating, span
+from config import get_config
+from tools.arxiv_search import search_arxiv_func
+from tools.local_corpus import search_local_corpus_func
+from tools.outline_utils import is_content_section, parse_outline_sections, section_query
+from tools.papers import Paper, PaperIndex, title_fingerprint
+from tools.retrieval import BM25Index, paper_document, remember_papers
+from tools.semantic_scholar import search_semantic_func
+
+SEARCH_FUNCS: Dict[str, Callable[[str, int], List[Dict]]] = {
+    "arxiv": search_arxiv_func,
+    "semantic_scholar": search_semantic_func,
+    "local_corpus": search_local_corpus_func,
+}
+
+
+def build_queries(topic: str, outline: str = "") -> List[str]:
+    """
+    Derive the list of sub-queries for a topic and its outline.
+
+    The bare topic always comes first; each content section of the outline
+    contributes one more query. Duplicate queries are dropped.
+    """
+    queries = [topic]
+    for section in parse_outline_sections(outline):
+        if is_content_section(section["name"]):
+            query = section_query(topic, section)
+            if query not in queries:
+                queries.append(query)
+    return queries
+
+
+def _run_query(source: str, query: str, limit: int) -> List[Paper]:
+    with span(f"search {source}", CLIENT, **{"search.source": source, "search.query": query}) as search_span:
+        try:
+            papers = [Paper.from_dict(p, source) for p in SEARCH_FUNCS[source](query, limit)]
+        except Exception as e:
+            search_span.record_error(e)
+            print(f"Literature fan-out: {source} query '{query}' failed: {e}")
+            return []
+        search_span.set_attribute("search.results", len(papers))
+        return papers
+
+
+@dataclass
+class LiteratureBatch:
+    """The results of one (source, query) search."""
+
+    task: int
+    source: str
+    query: str
+    papers: List[Paper]
+
+
+def stream_literature(topic: str, outline: str = "") -> Iterator[LiteratureBatch]:
+    """
+    Run the fan-out searches and yield each one's results as it completes.
+
+    Args:
+        topic: The research topic
+        outline: Full outline text from the outline agent (optional)
+
+    Yields:
+        One LiteratureBatch per (source, query) pair, in completion order;
+        ``task`` is the pair's position in the fixed search order
+    """
+    settings = get_config()["tools"]["literature_fanout"]
+    sources = [s for s in settings["sources"] if s in SEARCH_FUNCS]
+    limit = settings["results_per_query"]
+    tasks = [(source, query) for query in build_queries(topic, outline) for source in sources]
+    if not tasks:
+        return
+    run_query = propagating(_run_query)
+    with ThreadPoolExecutor(max_workers=max(1, min(settings["max_workers"], len(tasks)))) as pool:
+        futures = {pool.submit(run_query, source, query, limit): i for i, (source, query) in enumerate(tasks)}
+        try:
+            for future in as_completed(futures):
+                source, query = tasks[futures[future]]
+                yield LiteratureBatch(futures[future], source, query, future.result())
+        finally:
+            # The consumer stopped early: don't start searches nobody will read
+            for future in futures:
+                future.cancel()
+
+
+def merge_results(result_lists: Iterable[List[Paper]]) -> List[Paper]:
+    """
+    Merge per-search result lists into one deduplicated list.
+
+    The lists are interleaved so every section contributes its best hits
+    before any one query fills the budget. Duplicates found later still
+    merge their metadata into the record that was kept.
+    """
+    result_lists = list(result_lists)
+    index = PaperIndex()
+    for rank in range(max((len(r) for r in result_lists), default=0)):
+        for results in result_lists:
+            if rank < len(results):
+                index.add(copy.deepcopy(results[rank]))
+    return index.papers()
+
+
+class LiteratureStream:
+    """Consumes ``stream_literature`` while keeping a growing, searchable index.
+
+    Drafting can rank the papers collected so far with ``top_k`` and ask
+    whether the searches behind a section have finished with ``ready``.
+    Once the stream is exhausted, ``papers`` returns the same merged list
+    ``search_literature_func`` would have.
+    """
+
+    def __init__(self, topic: str, outline: str = "", batches: Optional[Iterable[LiteratureBatch]] = None):
+        """
+        Args:
+            topic: The research topic
+            outline: Full outline text from the outline agent (optional)
+            batches: Search results to consume (default: stream_literature)
+        """
+        settings = get_config()["tools"]["retrieval"]
+        self.topic = topic
+        self.batches = stream_literature(topic, outline) if batches is None else batches
+        self.finished = False
+        self._results: Dict[int, List[Paper]] = {}
+        self._done: Set[Tuple[str, str]] = set()
+        self._index = PaperIndex()
+        self._records: List[Paper] = []
+        # Indexed text of each record and each record's position, by identity
+        self._documents: List[str] = []
+        self._positions: Dict[int, int] = {}
+        self._bm25 = BM25Index(k1=settings["k1"], b=settings["b"])
+        self._lock = threading.Lock()
+
+    def __iter__(self) -> Iterator[LiteratureBatch]:
+        """Consume the stream, indexing each batch before yielding it."""
+        for batch in self.batches:
+            self._add(batch)
+            yield batch
+        self.finished = True
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def _add(self, batch: LiteratureBatch) -> None:
+        with self._lock:
+            self._results[batch.task] = batch.papers
+            self._done.add((batch.source, batch.query))
+            first = len(self._records)
+            merged = set()
+            for paper in batch.papers:
+                # Copies: merging must not touch the lists papers() re-merges
+                record = self._index.add(copy.deepcopy(paper))
+                if len(self._index) > len(self._records):
+                    self._positions[id(record)] = len(self._records)
+                    self._records.append(record)
+                else:
+                    merged.add(self._positions[id(record)])
+            self._documents.extend(paper_document(record.to_dict()) for record in self._records[first:])
+            self._bm25.add(self._documents[first:])
+            # A duplicate may have filled in a better abstract: rank on the merged record
+            for position in sorted(p for p in merged if p < first):
+                document = paper_document(self._records[position].to_dict())
+                if document != self._documents[position]:
+                    self._documents[position] = document
+                    self._bm25.update(position, document)
+
+    def ready(self, section: Dict[str, str]) -> bool:
+        """Whether every search for the topic and for this section has returned."""
+        if self.finished:
+            return True
+        with self._lock:
+            done = set(self._done)
+        queries = {self.topic, section_query(self.topic, section)}
+        sources = [s for s in get_config()["tools"]["literature_fanout"]["sources"] if s in SEARCH_FUNCS]
+        return all((source, query) in done for query in queries for source in sources)
+
+    def top_k(self, query: str, k: int) -> List[Dict[str, Any]]:
+        """The k most relevant papers collected so far, best first."""
+        with self._lock:
+            records = list(self._records)
+        best = self._bm25.top_k(query, k)
+        return [records[i].to_dict() for i in best if i < len(records)]
+
+    def papers(self, max_results: Optional[int] = None, keep: Iterable[Dict[str, Any]] = ()) -> List[Dict[str, Any]]:
+        """
+        The merged list of everything received, capped at ``max_results``.
+
+        Args:
+            max_results: Size of the merged, deduplicated paper list (default: no cap)
+            keep: Papers that must stay in the list even past the cap, e.g.
+                the ones drafting has already been grounded in
+        """
+        with self._lock:
+            result_lists = [self._results[task] for task in sorted(self._results)]
+        merged = merge_results(result_lists)
+        if max_results is None:
+            max_results = len(merged)
+        kept = {title_fingerprint(p.get("title") or "") for p in keep} - {""}
+        return [
+            paper.to_dict() for i, paper in enumerate(merged)
+            if i < max_results or title_fingerprint(paper.title) in kept
+        ]
+
+
+def search_literature_func(
+    topic: str,
+    outline: str = "",
+    max_results: int = 50,
+    tool_context: Optional[ToolContext] = None,
+) -> List[Dict]:
+    """Search arXiv and Semantic Scholar with one sub-query per outline section.
+
+    Args:
+        topic: The research topic
+        outline: Full outline text from the outline agent (optional)
+        max_results: Size of the merged, deduplicated paper list (default: 50)
+
+    Returns:
+        List of paper dictionaries with keys title, authors, abstract, url,
+        year, published_date, arxiv_id, doi, citation_count and sources.
+        The list is also stored in the job's session state for select_papers.
+    """
+    batches = sorted(stream_literature(topic, outline), key=lambda batch: batch.task)
+    papers = [paper.to_dict() for paper in merge_results(b.papers for b in batches)[:max_results]]
+    remember_papers(tool_context, papers)
+    return papers
+
+
+# Create the FunctionTool instance
+search_literature = FunctionTool(
+    func=search_literature_func,
+)
@@ -0,0 +1,542 @@
+"""Custom ADK tool: search a local, on-disk paper corpus without network access.
+
+For domains we write about repeatedly, and for air-gapped deployments,
+arXiv metadata dumps (JSONL, e.g. the Kaggle ``arxiv-metadata-oai-snapshot``)
+are ingested once into a compact index directory:
+
+- ``records.jsonl`` / ``offsets.npy``: one result dict per paper, already in
+  the ``search_arxiv_func`` schema, plus the byte offset where each starts
+- ``vocab_terms.bin`` / ``vocab_offsets.npy``: every term in UTF-8, sorted,
+  and where each starts; a term's id is its position, found by binary search
+- ``term_starts.npy``: where each term's postings begin
+- ``postings_docs.npy`` / ``postings_tf.npy``: the inverted index (document
+  ids and term frequencies over title and abstract), grouped by term
+- ``doc_len.npy``, ``year.npy``, ``citations.npy``: per-document numbers
+
+Every file is memory-mapped read-only, so searching a corpus of
+millions of papers reads only the postings of the query terms and pages in
+the few records it returns. Scoring is Okapi BM25, vectorized over the
+postings, with an optional log-citation prior.
+
+Ingest runs out of core. Documents are tokenized in blocks and their
+(term, doc, tf) triples are spilled to temporary files. A counting sort then
+scatters them into the final postings arrays one chunk at a time. No text
+is held in memory beyond the current block and the vocabulary. Each paper
+costs about 30 bytes of typed-array bookkeeping (offset, length, year,
+citations, id hash and version), so memory still grows with the corpus, at
+roughly 80 MB for the full arXiv snapshot. Papers listed more than once, for
+example under several versions or in overlapping dumps, are deduplicated on
+their versionless arXiv id after tokenization. The latest version is kept,
+and the others never reach the postings. Their lines stay in
+``records.jsonl``, unreferenced.
+
+Usage::
+
+    python -m tools.local_corpus ingest arxiv-metadata-oai-snapshot.json
+    python -m tools.local_corpus search "graph neural networks"
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import re
+import shutil
+import sys
+import threading
+from array import array
+from collections import Counter
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from google.adk.tools import FunctionTool
+
+from callbacks.metrics import SEARCH_DURATION
+from config import get_config
+from tools.retrieval import tokenize
+
+FORMAT_VERSION = 2
+
+
+def _clean(text: Any) -> str:
+    return " ".join(str(text or "").split())
+
+
+def _published(raw: Dict[str, Any]) -> str:
+    """Earliest known date of a dump record as YYYY-MM-DD."""
+    versions = raw.get("versions") or []
+    if versions and isinstance(versions[0], dict) and versions[0].get("created"):
+        try:
+            return parsedate_to_datetime(versions[0]["created"]).strftime("%Y-%m-%d")
+        except (TypeError, ValueError):
+            pass
+    return str(raw.get("published") or raw.get("update_date") or "")[:10]
+
+
+def _authors(raw: Dict[str, Any]) -> List[str]:
+    parsed = raw.get("authors_parsed")
+    if parsed:
+        # [last, first, suffix]
+        return [_clean(" ".join([p[1] if len(p) > 1 else "", p[0], p[2] if len(p) > 2 else ""]))
+                for p in parsed]
+    authors = raw.get("authors") or []
+    if isinstance(authors, str):
+        authors = re.split(r",\s*|\s+and\s+", authors)
+    return [_clean(a) for a in authors if _clean(a)]
+
+
+def normalize_record(raw: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Convert one metadata dump line into the ``search_arxiv_func`` schema.
+
+    Accepts arXiv OAI snapshot records (id, abstract, versions,
+    authors_parsed, ...) as well as records already in the tool schema.
+
+    Returns:
+        The result dict, or None for records without an id or title
+    """
+    arxiv_id = str(raw.get("arxiv_id") or raw.get("id") or "").strip()
+    title = _clean(raw.get("title"))
+    if not arxiv_id or not title:
+        return None
+    versions = raw.get("versions") or []
+    if versions and isinstance(versions[-1], dict) and not re.search(r"v\d+$", arxiv_id):
+        arxiv_id += versions[-1].get("version", "")
+    return {
+        "title": title,
+        "url": raw.get("url") or f"http://arxiv.org/pdf/{arxiv_id}",
+        "summary": _clean(raw.get("summary") or raw.get("abstract")),
+        "authors": _authors(raw),
+        "published": _published(raw),
+        "arxiv_id": arxiv_id,
+        "doi": (str(raw.get("doi") or "").split() or [""])[0],
+    }
+
+
+def _citations(raw: Dict[str, Any]) -> int:
+    value = raw.get("citation_count", raw.get("citationCount"))
+    try:
+        return max(0, int(value or 0))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _id_key(arxiv_id: str) -> Tuple[int, int]:
+    """64-bit hash of the versionless id, and the version number (0 if none)."""
+    match = re.search(r"v(\d+)$", arxiv_id)
+    base = arxiv_id[:match.start()] if match else arxiv_id
+    digest = hashlib.blake2b(base.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little"), int(match.group(1)) if match else 0
+
+
+def _latest_versions(id_hashes: np.ndarray, versions: np.ndarray) -> np.ndarray:
+    """Mask of the documents to index: the latest version of each paper, earliest ingested on ties."""
+    live = np.zeros(len(id_hashes), dtype=bool)
+    if not len(id_hashes):
+        return live
+    docs = np.arange(len(id_hashes))
+    # Within each id, ascending version and then descending doc: the last entry wins
+    order = np.lexsort((-docs, versions, id_hashes))
+    sorted_ids = id_hashes[order]
+    last = np.append(sorted_ids[1:] != sorted_ids[:-1], True)
+    live[order[last]] = True
+    return live
+
+
+def _read_dumps(paths: Iterable[Path]) -> Iterator[Dict[str, Any]]:
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    print(f"Skipping {path}:{number}: {e}")
+
+
+def ingest(
+    dumps: Iterable[Path],
+    path: Optional[Path] = None,
+    block_docs: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Build a corpus index from JSONL metadata dumps, replacing any existing one.
+
+    Args:
+        dumps: JSONL files, one paper per line
+        path: Index directory (default: tools.local_corpus.path)
+        block_docs: Documents tokenized per spill block (default: from config)
+
+    Returns:
+        The index metadata (document, term and posting counts)
+    """
+    settings = get_config()["tools"]["local_corpus"]
+    path = Path(path or settings["path"])
+    block_docs = block_docs or settings["block_docs"]
+    build = path.with_name(f"{path.name}.build-{os.getpid()}")
+    shutil.rmtree(build, ignore_errors=True)
+    build.mkdir(parents=True)
+
+    vocab: Dict[str, int] = {}
+    # Typed arrays keep per-paper bookkeeping at a few bytes per entry
+    offsets = array("Q", [0])
+    doc_len = array("I")
+    years = array("H")
+    citations = array("I")
+    id_hashes = array("Q")
+    versions = array("H")
+    spill = {name: open(build / f"spill_{name}.bin", "wb") for name in ("terms", "docs", "tf")}
+    block = {"terms": array("I"), "docs": array("I"), "tf": array("H")}
+
+    def flush() -> None:
+        for name, values in block.items():
+            values.tofile(spill[name])
+            del values[:]
+
+    try:
+        with open(build / "records.jsonl", "wb") as records:
+            for raw in _read_dumps(dumps):
+                record = normalize_record(raw)
+                if record is None:
+                    continue
+                id_hash, version = _id_key(record["arxiv_id"])
+                id_hashes.append(id_hash)
+                versions.append(min(version, 65535))
+                doc = len(doc_len)
+                line = (json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+                records.write(line)
+                offsets.append(offsets[-1] + len(line))
+                # The title counts twice, a cheap field weighting
+                terms = Counter(tokenize(f"{record['title']} {record['title']} {record['summary']}"))
+                block["terms"].extend([vocab.setdefault(term, len(vocab)) for term in terms])
+                block["docs"].extend([doc] * len(terms))
+                block["tf"].extend([min(count, 65535) for count in terms.values()])
+                doc_len.append(sum(terms.values()))
+                year = record["published"][:4]
+                years.append(int(year) if year.isdigit() else 0)
+                citations.append(_citations(raw))
+                if (doc + 1) % block_docs == 0:
+                    flush()
+                    print(f"Ingested {doc + 1} papers ({len(vocab)} terms)")
+        flush()
+    finally:
+        for f in spill.values():
+            f.close()
+
+    live = _latest_versions(np.frombuffer(id_hashes, dtype=np.uint64), np.frombuffer(versions, dtype=np.uint16))
+    del id_hashes, versions
+    lengths = np.frombuffer(doc_len, dtype=np.uint32)
+
+    # Term ids become positions in the sorted vocabulary, so readers can
+    # binary-search a mapped term list instead of loading a dict
+    terms_sorted = sorted(vocab)
+    remap = np.empty(len(vocab), dtype=np.uint32)
+    for term_id, term in enumerate(terms_sorted):
+        remap[vocab[term]] = term_id
+    del vocab
+    vocab_offsets = array("Q", [0])
+    with open(build / "vocab_terms.bin", "wb") as f:
+        for term in terms_sorted:
+            encoded = term.encode("utf-8")
+            f.write(encoded)
+            vocab_offsets.append(vocab_offsets[-1] + len(encoded))
+    del terms_sorted
+
+    # Counting sort of the spilled triples into per-term postings lists,
+    # leaving out superseded versions
+    chunk = 1 << 22
+    # np.memmap cannot map an empty file
+    spilled = {
+        name: (np.memmap(build / f"spill_{name}.bin", dtype=dtype, mode="r")
+               if (build / f"spill_{name}.bin").stat().st_size else np.zeros(0, dtype=dtype))
+        for name, dtype in (("terms", np.uint32), ("docs", np.uint32), ("tf", np.uint16))
+    }
+    spilled_total = len(spilled["terms"])
+
+    def chunks() -> Iterator[Tuple[np.ndarray, slice, np.ndarray]]:
+        for start in range(0, spilled_total, chunk):
+            window = slice(start, start + chunk)
+            keep = live[np.asarray(spilled["docs"][window])]
+            yield remap[np.asarray(spilled["terms"][window])][keep], window, keep
+
+    df = np.zeros(len(remap), dtype=np.uint64)
+    for terms, _, _ in chunks():
+        df += np.bincount(terms, minlength=len(remap)).astype(np.uint64)
+    term_starts = np.zeros(len(remap) + 1, dtype=np.uint64)
+    np.cumsum(df, out=term_starts[1:])
+    total = int(term_starts[-1])
+    postings_docs = np.lib.format.open_memmap(build / "postings_docs.npy", mode="w+", dtype=np.uint32,
+                                              shape=(total,))
+    postings_tf = np.lib.format.open_memmap(build / "postings_tf.npy", mode="w+", dtype=np.uint16,
+                                            shape=(total,))
+    if total:
+        cursor = term_starts[:-1].copy()
+        for terms, window, keep in chunks():
+            # Stable, so every term's postings stay in document order
+            order = np.argsort(terms, kind="stable")
+            sorted_terms = terms[order]
+            unique, first, counts = np.unique(sorted_terms, return_index=True, return_counts=True)
+            rank = np.arange(len(sorted_terms), dtype=np.uint64) - np.repeat(first, counts).astype(np.uint64)
+            positions = cursor[sorted_terms] + rank
+            postings_docs[positions] = np.asarray(spilled["docs"][window])[keep][order]
+            postings_tf[positions] = np.asarray(spilled["tf"][window])[keep][order]
+            cursor[unique] += counts.astype(np.uint64)
+    del spilled
+    postings_docs.flush()
+    postings_tf.flush()
+    del postings_docs, postings_tf
+    for name in ("terms", "docs", "tf"):
+        (build / f"spill_{name}.bin").unlink()
+
+    np.save(build / "term_starts.npy", term_starts)
+    np.save(build / "vocab_offsets.npy", np.frombuffer(vocab_offsets, dtype=np.uint64))
+    np.save(build / "offsets.npy", np.frombuffer(offsets, dtype=np.uint64))
+    np.save(build / "doc_len.npy", np.frombuffer(doc_len, dtype=np.uint32))
+    np.save(build / "year.npy", np.frombuffer(years, dtype=np.uint16))
+    np.save(build / "citations.npy", np.frombuffer(citations, dtype=np.uint32))
+    documents = int(live.sum())
+    meta = {
+        "version": FORMAT_VERSION,
+        "documents": documents,
+        "duplicates": len(live) - documents,
+        "terms": len(remap),
+        "postings": total,
+        "avg_doc_len": float(lengths[live].mean()) if documents else 0.0,
+    }
+    (build / "meta.json").write_text(json.dumps(meta, indent=2))
+
+    # Swap the finished index in; the cached reader is closed once its searches end
+    old = path.with_name(f"{path.name}.old-{os.getpid()}")
+    if path.exists():
+        path.rename(old)
+    build.rename(path)
+    shutil.rmtree(old, ignore_errors=True)
+    with _corpora_lock:
+        replaced = _corpora.pop(str(path), None)
+    if replaced is not None:
+        replaced.close()
+    print(f"Indexed {meta['documents']} papers ({meta['terms']} terms, {total} postings) in {path}")
+    return meta
+
+
+class LocalCorpus:
+    """Read-only, memory-mapped view of an ingested corpus index."""
+
+    ARRAYS = ("vocab_offsets", "term_starts", "postings_docs", "postings_tf",
+              "offsets", "doc_len", "year", "citations")
+
+    def __init__(self, path: Path, k1: float = 1.2, b: float = 0.75, citation_weight: float = 0.0):
+        self.path = Path(path)
+        self.k1 = k1
+        self.b = b
+        self.citation_weight = citation_weight
+        self.meta = json.loads((self.path / "meta.json").read_text())
+        if self.meta.get("version") != FORMAT_VERSION:
+            raise ValueError(f"{self.path} has index format {self.meta.get('version')}, expected {FORMAT_VERSION}")
+        # Every mapping this corpus owns, so close() can release them once
+        # no search is reading them
+        self._maps: List[mmap.mmap] = []
+        self._searches = 0
+        self._idle = threading.Condition()
+        self.closed = False
+        for name in self.ARRAYS:
+            setattr(self, name, self._map_array(name))
+        self._records = self._map("records.jsonl", int(self.offsets[-1]))
+        self._terms = self._map("vocab_terms.bin", int(self.vocab_offsets[-1]))
+
+    def _map(self, name: str, size: int) -> Any:
+        # mmap cannot map an empty file
+        if not size:
+            return b""
+        # The mapping keeps its own handle; the file is closed right away
+        with open(self.path / name, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._maps.append(mapped)
+        return mapped
+
+    def _map_array(self, name: str) -> np.ndarray:
+        """Map a ``.npy`` file as a read-only array backed by a mapping we own."""
+        with open(self.path / f"{name}.npy", "rb") as f:
+            version = np.lib.format.read_magic(f)
+            read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+            shape, _, dtype = read_header(f)
+            offset = f.tell()
+        count = int(np.prod(shape))
+        if not count:
+            return np.zeros(shape, dtype=dtype)
+        mapped = self._map(f"{name}.npy", offset + count * dtype.itemsize)
+        return np.frombuffer(mapped, dtype=dtype, count=count, offset=offset).reshape(shape)
+
+    def close(self) -> None:
+        """Unmap the index files once running searches finish; later searches raise ValueError."""
+        with self._idle:
+            self.closed = True
+            self._idle.wait_for(lambda: not self._searches)
+        maps, self._maps = self._maps, []
+        # Drop our views first: a mapping with live views cannot be closed
+        for name in self.ARRAYS:
+            setattr(self, name, np.zeros(0))
+        self._records = self._terms = b""
+        for mapped in maps:
+            try:
+                mapped.close()
+            except BufferError:
+                pass  # A caller still holds one of our arrays; unmapped when it lets go
+
+    def _term(self, term_id: int) -> bytes:
+        return self._terms[int(self.vocab_offsets[term_id]):int(self.vocab_offsets[term_id + 1])]
+
+    def term_id(self, term: str) -> Optional[int]:
+        """Position of a term in the sorted vocabulary, or None if it never occurs."""
+        key = term.encode("utf-8")
+        low, high = 0, len(self.vocab_offsets) - 1
+        while low < high:
+            middle = (low + high) // 2
+            if self._term(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(self.vocab_offsets) - 1 and self._term(low) == key:
+            return low
+        return None
+
+    def __len__(self) -> int:
+        return self.meta["documents"]
+
+    def record(self, doc: int) -> Dict[str, Any]:
+        """The stored result dict of one document."""
+        return json.loads(self._records[int(self.offsets[doc]):int(self.offsets[doc + 1])])
+
+    def scores(self, query: str) -> Tuple[np.ndarray, np.ndarray]:
+        """BM25 scores of every document matching at least one query term, as (docs, scores)."""
+        n_docs = len(self)
+        avg_len = self.meta["avg_doc_len"] or 1.0
+        matched_docs, matched_scores = [], []
+        for term, count in Counter(tokenize(query)).items():
+            term_id = self.term_id(term)
+            if term_id is None:
+                continue
+            start, end = int(self.term_starts[term_id]), int(self.term_starts[term_id + 1])
+            docs = np.asarray(self.postings_docs[start:end])
+            tf = self.postings_tf[start:end].astype(np.float32)
+            df = end - start
+            idf = np.log1p((n_docs - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self.doc_len[docs] / avg_len)
+            matched_docs.append(docs)
+            matched_scores.append(count * idf * tf * (self.k1 + 1) / (tf + norm))
+        if not matched_docs:
+            return np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.float32)
+        docs, inverse = np.unique(np.concatenate(matched_docs), return_inverse=True)
+        return docs, np.bincount(inverse, weights=np.concatenate(matched_scores))
+
+    def search(self, query: str, max_results: int = 10, min_year: int = 0) -> List[Dict[str, Any]]:
+        """Top papers for a query, best first, in the ``search_arxiv_func`` schema."""
+        with self._idle:
+            if self.closed:
+                raise ValueError(f"Corpus {self.path} is closed")
+            self._searches += 1
+        try:
+            return self._search(query, max_results, min_year)
+        finally:
+            with self._idle:
+                self._searches -= 1
+                self._idle.notify_all()
+
+    def _search(self, query: str, max_results: int, min_year: int) -> List[Dict[str, Any]]:
+        docs, scores = self.scores(query)
+        if min_year:
+            keep = self.year[docs] >= min_year
+            docs, scores = docs[keep], scores[keep]
+        if not len(docs) or max_results <= 0:
+            return []
+        if self.citation_weight:
+            scores = scores + self.citation_weight * np.log1p(self.citations[docs])
+        k = min(max_results, len(docs))
+        top = np.argpartition(-scores, k - 1)[:k]
+        # Highest score first; ties go to the earlier-ingested paper
+        top = top[np.lexsort((docs[top], -scores[top]))]
+        return [self.record(int(doc)) for doc in docs[top]]
+
+
+_corpora: Dict[str, LocalCorpus] = {}
+_corpora_lock = threading.Lock()
+
+
+def get_local_corpus() -> Optional[LocalCorpus]:
+    """Return the shared corpus, or None if it is disabled or nothing has been ingested."""
+    settings = get_config()["tools"]["local_corpus"]
+    if not settings["enabled"]:
+        return None
+    path = Path(settings["path"])
+    with _corpora_lock:
+        corpus = _corpora.get(str(path))
+        if corpus is None:
+            if not (path / "meta.json").exists():
+                return None
+            corpus = _corpora[str(path)] = LocalCorpus(
+                path, k1=settings["k1"], b=settings["b"], citation_weight=settings["citation_weight"]
+            )
+    return corpus
+
+
+def search_local_corpus_func(query: str, max_results: int = 10, min_year: int = 0) -> List[Dict]:
+    """Search the locally ingested paper corpus, without network access.
+
+    Args:
+        query: The search query string
+        max_results: Maximum number of results to return (default: 10)
+        min_year: Only return papers first published in or after this year (default: any)
+
+    Returns:
+        List of dictionaries with the same keys as search_arxiv_func results;
+        empty if no corpus has been ingested
+    """
+    with SEARCH_DURATION.time(source="local_corpus"):
+        # A re-ingest may close the corpus we got; the next one is the new index
+        for _ in range(2):
+            corpus = get_local_corpus()
+            if corpus is None:
+                return []
+            try:
+                return corpus.search(query, max_results, min_year)
+            except ValueError:
+                if not corpus.closed:
+                    raise
+        return []
+
+
+# Create the FunctionTool instance
+search_local_corpus = FunctionTool(
+    func=search_local_corpus_func,
+)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Build or query the local paper corpus index")
+    parser.add_argument("--path", help="Index directory (default: tools.local_corpus.path)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    ingest_parser = commands.add_parser("ingest", help="Index JSONL metadata dumps, replacing the current index")
+    ingest_parser.add_argument("dumps", nargs="+", type=Path)
+    search_parser = commands.add_parser("search", help="Run one query against the index")
+    search_parser.add_argument("query")
+    search_parser.add_argument("--max-results", type=int, default=10)
+    search_parser.add_argument("--min-year", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.command == "ingest":
+        ingest(args.dumps, Path(args.path) if args.path else None)
+        return 0
+    settings = get_config()["tools"]["local_corpus"]
+    corpus = LocalCorpus(Path(args.path or settings["path"]), k1=settings["k1"], b=settings["b"],
+                         citation_weight=settings["citation_weight"])
+    for paper in corpus.search(args.query, args.max_results, args.min_year):
+        print(f"{paper['arxiv_id']:<18} {paper['published'][:4]}  {paper['title']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+"""Utilities for turning outline_agent output into per-section work items."""
+import re
+from typing import Dict, List
+
+from config import get_config
+
+# Sections that never need their own literature query or drafting call
+NON_CONTENT_SECTIONS = {"title", "references", "bibliography", "acknowledgment", "acknowledgments"}
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "how", "in", "into",
+    "is", "it", "its", "of", "on", "or", "our", "that", "the", "their", "this", "to",
+    "we", "what", "which", "will", "with", "e.g", "i.e", "etc", "section", "discuss",
+    "describe", "overview", "key", "include", "including", "using", "use", "used",
+    "paper", "study", "work", "approach", "approaches", "provide", "briefly",
+}
+
+_MARKDOWN_HEADING = re.compile(r"^\s*#{1,6}\s+(.+?)\s*#*\s*$")
+_BOLD_HEADING = re.compile(r"^\s*\*\*(.+?)\*\*\s*:?\s*$")
+_NUMBERED_HEADING = re.compile(r"^\s*(?:[IVX]+|\d+)(?:\.\d+)*[.)]?\s+([A-Z][^.:]{1,60}):?\s*$")
+
+
+def _clean_heading(heading: str) -> str:
+    heading = re.sub(r"^(?:[IVX]+|\d+)(?:\.\d+)*[.)]?\s+", "", heading.strip())
+    return heading.strip("*:# ").strip()
+
+
+def _known_section(line: str) -> str:
+    """Return the canonical section name if the line is just a known heading."""
+    candidate = _clean_heading(line).lower()
+    for name in get_config()["paper"]["section_order"]:
+        if candidate == name.lower():
+            return name
+    return ""
+
+
+def parse_outline_sections(outline: str) -> List[Dict[str, str]]:
+    """
+    Split free-form outline text into sections.
+
+    Markdown headings, bold-only lines, numbered headings and bare section
+    names from the configured section order are all treated as headings;
+    everything else is attached to the preceding heading as talking points.
+
+    Args:
+        outline: Outline text produced by outline_agent
+
+    Returns:
+        List of {"name": ..., "text": ...} dictionaries in outline order
+    """
+    sections: List[Dict[str, str]] = []
+    current = None
+    for line in outline.splitlines():
+        heading = ""
+        for pattern in (_MARKDOWN_HEADING, _BOLD_HEADING, _NUMBERED_HEADING):
+            match = pattern.match(line)
+            if match:
+                heading = _clean_heading(match.group(1))
+                break
+        if not heading:
+            heading = _known_section(line)
+        if heading:
+            current = {"name": heading, "text": ""}
+            sections.append(current)
+        elif current is not None and line.strip():
+            current["text"] += line.strip() + "\n"
+    return sections
+
+
+def is_content_section(name: str) -> bool:
+    """True for sections that are drafted from the literature."""
+    return name.strip().lower() not in NON_CONTENT_SECTIONS
+
+
+def keywords(text: str, limit: int = 6) -> List[str]:
+    """Pick the most frequent non-stopword terms from text, in first-seen order."""
+    counts: Dict[str, int] = {}
+    for token in re.findall(r"[a-zA-Z][a-zA-Z0-9\-]{2,}", text.lower()):
+        if token not in STOPWORDS:
+            counts[token] = counts.get(token, 0) + 1
+    ranked = sorted(counts, key=lambda t: -counts[t])[:limit]
+    return [t for t in counts if t in ranked]
+
+
+def section_query(topic: str, section: Dict[str, str], extra_terms: int = 3) -> str:
+    """
+    Derive a literature search query for one outline section.
+
+    Args:
+        topic: The overall research topic
+        section: A section dictionary from parse_outline_sections
+        extra_terms: Number of talking-point keywords appended to the topic
+
+    Returns:
+        Query string combining the topic with the section's salient terms
+    """
+    topic_terms = set(topic.lower().split())
+    terms = [t for t in keywords(section["text"], limit=extra_terms * 2) if t not in topic_terms]
+    return " ".join([topic] + terms[:extra_terms])
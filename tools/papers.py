@@ -0,0 +1,244 @@
+"""Normalized paper records and a cross-source deduplication index.
+
+``search_arxiv_func`` and ``search_semantic_func`` return different schemas.
+``Paper`` maps both onto one record type, and ``PaperIndex`` merges records
+that describe the same work. Exact matches are found by arXiv ID, DOI or a
+normalized-title fingerprint; near-duplicate titles are caught with MinHash
+signatures bucketed by LSH bands, so adding n records costs O(n).
+"""
+import random
+import re
+import unicodedata
+import zlib
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+_ARXIV_NEW_ID = re.compile(r"(\d{4}\.\d{4,5})(?:v\d+)?")
+_ARXIV_OLD_ID = re.compile(
+    r"(?:^|arxiv\.org/(?:abs|pdf)/|arxiv:)([a-z\-]+(?:\.[a-z]{2})?/\d{7})(?:v\d+)?",
+    re.IGNORECASE,
+)
+
+
+def normalize_arxiv_id(value: str) -> str:
+    """Reduce an arXiv ID or URL to its versionless short form, e.g. '2101.00001'."""
+    match = _ARXIV_NEW_ID.search(value or "") or _ARXIV_OLD_ID.search(value or "")
+    return match.group(1).lower() if match else ""
+
+
+def normalize_doi(value: str) -> str:
+    """Lower-case a DOI and strip any resolver prefix."""
+    value = (value or "").strip().lower()
+    return re.sub(r"^(?:https?://(?:dx\.)?doi\.org/|doi:)", "", value)
+
+
+def title_fingerprint(title: str) -> str:
+    """Case-, accent- and punctuation-insensitive form of a title."""
+    folded = unicodedata.normalize("NFKD", title or "").encode("ascii", "ignore").decode()
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", folded.lower()).split())
+
+
+@dataclass
+class Paper:
+    """A paper record normalized across literature sources."""
+
+    title: str
+    authors: List[str] = field(default_factory=list)
+    abstract: str = ""
+    url: str = ""
+    year: Optional[int] = None
+    published_date: str = ""
+    arxiv_id: str = ""
+    doi: str = ""
+    citation_count: Optional[int] = None
+    sources: List[str] = field(default_factory=list)
+
+    @classmethod
+    def from_arxiv(cls, record: Dict[str, Any]) -> "Paper":
+        """Build a record from a ``search_arxiv_func`` result."""
+        published = record.get("published") or ""
+        return cls(
+            title=(record.get("title") or "").strip(),
+            authors=list(record.get("authors") or []),
+            abstract=record.get("summary") or "",
+            url=record.get("url") or "",
+            year=int(published[:4]) if published[:4].isdigit() else None,
+            published_date=published,
+            arxiv_id=normalize_arxiv_id(record.get("arxiv_id") or record.get("url") or ""),
+            doi=normalize_doi(record.get("doi") or ""),
+            sources=["arxiv"],
+        )
+
+    @classmethod
+    def from_semantic(cls, record: Dict[str, Any]) -> "Paper":
+        """Build a record from a ``search_semantic_func`` result."""
+        year = record.get("year")
+        return cls(
+            title=(record.get("title") or "").strip(),
+            authors=list(record.get("authors") or []),
+            abstract=record.get("abstract") or "",
+            url=record.get("url") or "",
+            year=year,
+            published_date=str(year) if year else "",
+            arxiv_id=normalize_arxiv_id(record.get("arxiv_id") or ""),
+            doi=normalize_doi(record.get("doi") or ""),
+            citation_count=record.get("citation_count"),
+            sources=["semantic_scholar"],
+        )
+
+    @classmethod
+    def from_dict(cls, record: Dict[str, Any], source: str = "") -> "Paper":
+        """Build a record from a tool result or a previously serialized Paper."""
+        if source == "arxiv" or (not source and "summary" in record):
+            return cls.from_arxiv(record)
+        if source == "local_corpus":
+            # Same schema as arXiv results, found without a network search
+            paper = cls.from_arxiv(record)
+            paper.sources = [source]
+            return paper
+        if source == "semantic_scholar" or (not source and "citation_count" in record and "sources" not in record):
+            return cls.from_semantic(record)
+        known = {name: record[name] for name in cls.__dataclass_fields__ if name in record}
+        known.setdefault("title", "")
+        return cls(**known)
+
+    def merge(self, other: "Paper") -> None:
+        """Fill gaps in this record from another record describing the same work."""
+        for name in ("abstract", "url", "published_date", "arxiv_id", "doi"):
+            if not getattr(self, name) and getattr(other, name):
+                setattr(self, name, getattr(other, name))
+        if len(other.abstract) > len(self.abstract):
+            self.abstract = other.abstract
+        if not self.authors:
+            self.authors = list(other.authors)
+        if self.year is None:
+            self.year = other.year
+        if other.citation_count is not None:
+            self.citation_count = max(self.citation_count or 0, other.citation_count)
+        for source in other.sources:
+            if source not in self.sources:
+                self.sources.append(source)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize for tool output and prompts."""
+        return asdict(self)
+
+
+class PaperIndex:
+    """Merges Paper records from any number of sources in insertion order."""
+
+    _PRIME = (1 << 31) - 1
+
+    def __init__(self, near_duplicate_threshold: float = 0.8, num_perm: int = 32, bands: int = 8,
+                 shingle_size: int = 5):
+        """
+        Args:
+            near_duplicate_threshold: Minimum shingle Jaccard similarity for two
+                titles to be considered the same paper
+            num_perm: Number of MinHash permutations per title
+            bands: Number of LSH bands; num_perm must be divisible by it
+            shingle_size: Character n-gram length used for title shingles
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.threshold = near_duplicate_threshold
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        rng = random.Random(1729)
+        self._perms = [(rng.randrange(1, self._PRIME), rng.randrange(0, self._PRIME)) for _ in range(num_perm)]
+        self._records: List[Paper] = []
+        self._shingles: List[Set[str]] = []
+        self._by_arxiv: Dict[str, int] = {}
+        self._by_doi: Dict[str, int] = {}
+        self._by_title: Dict[str, int] = {}
+        self._buckets: Dict[Tuple[int, Tuple[int, ...]], List[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def _shingle(self, fingerprint: str) -> Set[str]:
+        n = self.shingle_size
+        if len(fingerprint) <= n:
+            return {fingerprint}
+        return {fingerprint[i:i + n] for i in range(len(fingerprint) - n + 1)}
+
+    def _band_keys(self, shingles: Set[str]) -> List[Tuple[int, Tuple[int, ...]]]:
+        hashes = [zlib.crc32(s.encode()) for s in shingles]
+        signature = [min((a * h + b) % self._PRIME for h in hashes) for a, b in self._perms]
+        return [(band, tuple(signature[band * self.rows:(band + 1) * self.rows]))
+                for band in range(len(signature) // self.rows)]
+
+    def _find_exact(self, paper: Paper, fingerprint: str) -> Optional[int]:
+        if paper.arxiv_id and paper.arxiv_id in self._by_arxiv:
+            return self._by_arxiv[paper.arxiv_id]
+        if paper.doi and paper.doi in self._by_doi:
+            return self._by_doi[paper.doi]
+        if fingerprint in self._by_title and not self._conflicts(paper, self._by_title[fingerprint]):
+            return self._by_title[fingerprint]
+        return None
+
+    def _find_similar(self, paper: Paper, shingles: Set[str],
+                      band_keys: List[Tuple[int, Tuple[int, ...]]]) -> Optional[int]:
+        for key in band_keys:
+            for candidate in self._buckets.get(key, ()):
+                other = self._shingles[candidate]
+                if (len(shingles & other) / len(shingles | other) >= self.threshold
+                        and not self._conflicts(paper, candidate)):
+                    return candidate
+        return None
+
+    def _conflicts(self, paper: Paper, position: int) -> bool:
+        """Title matches never override disagreeing identifiers (e.g. Part I / Part II)."""
+        existing = self._records[position]
+        return bool(
+            (paper.arxiv_id and existing.arxiv_id and paper.arxiv_id != existing.arxiv_id)
+            or (paper.doi and existing.doi and paper.doi != existing.doi)
+        )
+
+    def add(self, paper: Paper) -> Paper:
+        """
+        Insert a record, merging it into an existing one if it is a duplicate.
+
+        Returns:
+            The canonical record now holding the paper's data
+        """
+        fingerprint = title_fingerprint(paper.title)
+        shingles: Set[str] = set()
+        band_keys: List[Tuple[int, Tuple[int, ...]]] = []
+        position = self._find_exact(paper, fingerprint)
+        if position is None and fingerprint:
+            # Signatures are only needed once every exact key has missed
+            shingles = self._shingle(fingerprint)
+            band_keys = self._band_keys(shingles)
+            position = self._find_similar(paper, shingles, band_keys)
+        if position is None:
+            position = len(self._records)
+            self._records.append(paper)
+            self._shingles.append(shingles)
+            for key in band_keys:
+                self._buckets.setdefault(key, []).append(position)
+        else:
+            self._records[position].merge(paper)
+        if paper.arxiv_id:
+            self._by_arxiv.setdefault(paper.arxiv_id, position)
+        if paper.doi:
+            self._by_doi.setdefault(paper.doi, position)
+        if fingerprint:
+            self._by_title.setdefault(fingerprint, position)
+        return self._records[position]
+
+    def extend(self, papers: Iterable[Paper]) -> None:
+        """Add every record from an iterable."""
+        for paper in papers:
+            self.add(paper)
+
+    def papers(self) -> List[Paper]:
+        """Deduplicated records in first-seen order."""
+        return list(self._records)
+
+
+def dedupe_papers(records: Iterable[Dict[str, Any]], source: str = "") -> List[Dict[str, Any]]:
+    """Deduplicate raw tool results and return them as normalized dictionaries."""
+    index = PaperIndex()
+    index.extend(Paper.from_dict(record, source) for record in records)
+    return [paper.to_dict() for paper in index.papers()]
@@ -0,0 +1,146 @@
+"""Content-addressed cache of compiled PDFs.
+
+Compiling the same LaTeX twice always yields the same PDF, and the
+formatting agent often does exactly that when it retries a tool call.
+Built PDFs are stored under the hash of everything that determines them
+(the rendered LaTeX, the template version and the TeX engine), so a repeat
+build becomes a hard link (or a copy, across filesystems) into the output
+directory. The cache directory is bounded in bytes; the least recently used
+PDFs are deleted first.
+"""
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from config import get_config
+from tools.cache import make_key
+
+# Bump to invalidate every cached PDF, e.g. after changing how documents are compiled
+BUILD_CACHE_VERSION = 1
+
+
+def _place(source: Path, dest: Path) -> None:
+    """Atomically make ``dest`` a hard link to (or a copy of) ``source``."""
+    fd, tmp = tempfile.mkstemp(dir=str(dest.parent), prefix=f".{dest.name}.", suffix=".tmp")
+    os.close(fd)
+    os.unlink(tmp)
+    try:
+        try:
+            os.link(source, tmp)
+        except OSError:
+            shutil.copy(source, tmp)
+        os.replace(tmp, dest)
+    finally:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+
+
+class PdfBuildCache:
+    """Directory of PDFs keyed by build hash, bounded by total size."""
+
+    def __init__(self, directory: str, max_bytes: int):
+        """
+        Args:
+            directory: Where cached PDFs are stored
+            max_bytes: Total size above which least recently used PDFs are evicted
+        """
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def build_key(latex: str, template_version: str = "", engine: str = "") -> str:
+        """Hash the inputs that determine a compiled PDF."""
+        return make_key("pdf", BUILD_CACHE_VERSION, engine, template_version, latex)
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.pdf"
+
+    def fetch(self, key: str, dest: Path) -> bool:
+        """
+        Place the cached PDF for ``key`` at ``dest``.
+
+        Returns:
+            True on a hit, False if nothing is cached under the key
+        """
+        path = self._path(key)
+        try:
+            _place(path, Path(dest))
+            # The access time drives eviction; many filesystems do not update it
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return False
+        with self._lock:
+            self.hits += 1
+        return True
+
+    def store(self, key: str, pdf_path: Path) -> None:
+        """Add a freshly built PDF and evict old entries beyond ``max_bytes``."""
+        _place(Path(pdf_path), self._path(key))
+        self.evict()
+
+    def evict(self) -> int:
+        """
+        Delete least recently used PDFs until the cache fits in ``max_bytes``.
+
+        Returns:
+            Number of PDFs deleted
+        """
+        with self._lock:
+            entries = []
+            for path in self.directory.glob("*.pdf"):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+            total = sum(size for _, size, _ in entries)
+            removed = 0
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+                total -= size
+                removed += 1
+            return removed
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters for this process and the cache's current size."""
+        sizes = [path.stat().st_size for path in self.directory.glob("*.pdf")]
+        lookups = self.hits + self.misses
+        return {
+            "namespace": "pdf",
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(sizes),
+            "bytes": sum(sizes),
+            "max_bytes": self.max_bytes,
+        }
+
+
+_pdf_cache: Optional[PdfBuildCache] = None
+_pdf_cache_lock = threading.Lock()
+
+
+def get_pdf_cache() -> Optional[PdfBuildCache]:
+    """Return the shared PDF build cache, or None if it is disabled."""
+    global _pdf_cache
+    settings = get_config()["tools"]["latex"]["build_cache"]
+    if not settings["enabled"]:
+        return None
+    with _pdf_cache_lock:
+        if _pdf_cache is None:
+            _pdf_cache = PdfBuildCache(settings["path"], settings["max_bytes"])
+        return _pdf_cache
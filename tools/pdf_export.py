@@ -1,15 +1,28 @@
-"""Custom ADK tool: convert paper content to PDF."""
+"""Custom ADK tool: convert paper content to PDF.
+
+Every file is written under an output directory: the shared ``outputs/``
+folder by default, or a per-job ``outputs/<job_id>/`` namespace when the
+calling session's state names one (see ``OUTPUT_DIR_STATE_KEY``) or when a
+Python caller passes ``output_dir``. Files are written to a temporary name
+and renamed into place, so concurrent jobs and readers never observe a
+partially written PDF.
+"""
 import os
-import tempfile
+import re
 import shutil
-import subprocess
+import tempfile
 import traceback
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Dict, Any, Optional
-from google.adk.tools import FunctionTool
+from typing import Dict, Any, Iterator, Optional
+from google.adk.tools import FunctionTool, ToolContext
 
+from config import get_config
+from tools.compile_pool import get_compile_pool
+from tools.fast_pdf import iter_sections, render_fast_pdf
+from tools.pdf_cache import PdfBuildCache, get_pdf_cache
 # Import the template rendering function
-from tools.template_utils import render_template
+from tools.template_utils import TEMPLATES_DIR, render_template, resolve_template, template_version
 
 # Define the outputs directory - make this an absolute path
 ROOT_DIR = Path(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Project root
@@ -19,7 +32,71 @@ print(f"PDF export module loaded. Output directory: {OUTPUT_DIR}")
 # Ensure outputs directory exists
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
-def tex_to_pdf(latex_content: str, output_filename: str = "research_paper.pdf") -> str:
+# Session state key naming the job's subdirectory of OUTPUT_DIR
+OUTPUT_DIR_STATE_KEY = "output_dir"
+# Session state key overriding paper.renderer for a job
+RENDERER_STATE_KEY = "renderer"
+
+# "latex": template + pdflatex; "fast": direct canvas rendering for previews
+RENDERERS = ("latex", "fast")
+
+_UNSAFE_FILENAME_CHARS = re.compile(r"[^A-Za-z0-9._-]+")
+_SAFE_DIR_NAME = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+def safe_filename(filename: str, default: str = "research_paper.pdf") -> str:
+    """Reduce a requested filename to a safe basename ending in .pdf."""
+    name = _UNSAFE_FILENAME_CHARS.sub("_", os.path.basename(str(filename or "")).strip()).strip("._")
+    if not name:
+        return default
+    return name if name.lower().endswith(".pdf") else f"{name}.pdf"
+
+
+def remove_job_output(job_id: str) -> None:
+    """Delete a job's output directory and everything in it."""
+    if not _SAFE_DIR_NAME.match(job_id):
+        raise ValueError(f"Invalid job output directory: {job_id!r}")
+    shutil.rmtree(OUTPUT_DIR / job_id, ignore_errors=True)
+
+
+def job_output_dir(job_id: Optional[str] = None) -> Path:
+    """Return (and create) the output directory of a job, or OUTPUT_DIR."""
+    if job_id and not _SAFE_DIR_NAME.match(job_id):
+        raise ValueError(f"Invalid job output directory: {job_id!r}")
+    output_dir = OUTPUT_DIR / job_id if job_id else OUTPUT_DIR
+    output_dir.mkdir(parents=True, exist_ok=True)
+    return output_dir
+
+
+def _context_output_dir(tool_context: Optional[ToolContext]) -> Path:
+    """Output directory named by the calling session, if any."""
+    job_dir = tool_context.state.get(OUTPUT_DIR_STATE_KEY) if tool_context is not None else None
+    return job_output_dir(job_dir)
+
+
+@contextmanager
+def _atomic_path(path: Path) -> Iterator[Path]:
+    """Yield a temporary path next to ``path`` that replaces it on success."""
+    fd, tmp = tempfile.mkstemp(dir=str(path.parent), prefix=f".{path.name}.", suffix=".tmp")
+    os.close(fd)
+    try:
+        yield Path(tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+
+
+def _write_text(path: Path, text: str) -> None:
+    with _atomic_path(path) as tmp:
+        tmp.write_text(text)
+
+
+def tex_to_pdf(
+    latex_content: str,
+    output_filename: str = "research_paper.pdf",
+    tool_context: Optional[ToolContext] = None
+) -> str:
     """
     Converts LaTeX content to PDF using pdflatex, saving it to the outputs directory.
     
@@ -30,150 +107,100 @@ def tex_to_pdf(latex_content: str, output_filename: str = "research_paper.pdf")
     Returns:
         String containing the filename of the generated PDF if successful
     """
-    # Ensure output directory exists
-    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
-    output_path = OUTPUT_DIR / output_filename
+    return compile_latex(latex_content, output_filename, _context_output_dir(tool_context))
+
+
+def compile_latex(
+    latex_content: str,
+    output_filename: str,
+    output_dir: Optional[Path] = None,
+    template_version: str = "",
+    fallback_content: Optional[Dict[str, Any]] = None
+) -> str:
+    """
+    Compile LaTeX to a PDF in ``output_dir`` (default: OUTPUT_DIR).
+    
+    A PDF built before from identical LaTeX (and template version) is taken
+    from the build cache instead of being compiled again. If compilation
+    fails, ``fallback_content`` (the paper's sections, when known) is rendered
+    without LaTeX instead.
+    
+    Returns:
+        The (sanitized) filename of the generated PDF
+    """
+    output_dir = Path(output_dir) if output_dir is not None else job_output_dir()
+    output_dir.mkdir(parents=True, exist_ok=True)
+    output_filename = safe_filename(output_filename)
+    output_path = output_dir / output_filename
     print(f"Will save PDF to: {output_path}")
     
     # Save the LaTeX source for debugging
-    latex_path = OUTPUT_DIR / f"{output_filename}.tex"
-    with open(latex_path, 'w') as f:
-        f.write(latex_content)
+    latex_path = output_dir / f"{output_filename}.tex"
+    _write_text(latex_path, latex_content)
     print(f"Saved LaTeX source to: {latex_path}")
     
-    # Create temporary directory
-    with tempfile.TemporaryDirectory() as temp_dir:
-        # Write LaTeX content to temporary file
-        tex_file = Path(temp_dir) / "paper.tex"
-        with open(tex_file, "w") as f:
-            f.write(latex_content)
-        
-        # Run pdflatex
-        try:
-            print(f"Running pdflatex in {temp_dir}")
-            process = subprocess.run(
-                ["pdflatex", "-interaction=nonstopmode", str(tex_file)],
-                cwd=temp_dir,
-                check=True,
-                capture_output=True,
-                text=True
-            )
-            
-            # Print stdout and stderr for debugging
-            print(f"pdflatex stdout: {process.stdout[:500]}...")
-            if process.stderr:
-                print(f"pdflatex stderr: {process.stderr}")
-            
-            # Second run for references
-            process = subprocess.run(
-                ["pdflatex", "-interaction=nonstopmode", str(tex_file)],
-                cwd=temp_dir,
-                check=True,
-                capture_output=True,
-                text=True
-            )
-            
-            # Copy output to desired location
-            pdf_path = Path(temp_dir) / "paper.pdf"
-            if pdf_path.exists():
-                shutil.copy(pdf_path, output_path)
-                print(f"✓ Successfully generated PDF: {output_path}")
-                # Just return the filename part, not the full path
-                return output_filename
-            else:
-                print(f"× No PDF file found at {pdf_path}")
-                # Save the log file for debugging
-                log_path = Path(temp_dir) / "paper.log"
-                if log_path.exists():
-                    shutil.copy(log_path, OUTPUT_DIR / f"{output_filename}.log")
-                    print(f"Saved LaTeX log to: {OUTPUT_DIR / f'{output_filename}.log'}")
-                raise FileNotFoundError("PDF generation failed")
-        except (subprocess.CalledProcessError, FileNotFoundError) as e:
-            print(f"× LaTeX error: {e}")
-            # Save the log file for debugging if it exists
-            log_path = Path(temp_dir) / "paper.log"
-            if log_path.exists():
-                shutil.copy(log_path, OUTPUT_DIR / f"{output_filename}.log")
-                print(f"Saved LaTeX log to: {OUTPUT_DIR / f'{output_filename}.log'}")
-            
-            # Fallback to reportlab for simple PDF generation if pdflatex fails
-            return _generate_fallback_pdf(output_filename, f"LaTeX compilation failed: {e}", paper_content={
-                "title": "PDF Generation Error",
-                "content": f"Failed to generate PDF with LaTeX: {e}",
-                "paper_content": latex_content[:500] + "..." if len(latex_content) > 500 else latex_content
-            })
+    compile_pool = get_compile_pool()
+    pdf_cache = get_pdf_cache()
+    cache_key = PdfBuildCache.build_key(latex_content, template_version, compile_pool.compiler.command)
+    if pdf_cache is not None and pdf_cache.fetch(cache_key, output_path):
+        print(f"✓ Reused cached PDF build: {output_path}")
+        return output_filename
+    
+    try:
+        # Runs on the bounded compile pool; this thread waits for the result
+        result = compile_pool.compile(latex_content, output_path)
+    except Exception as e:
+        print(f"× LaTeX error: {e}")
+        error = str(e)
+    else:
+        if result.ok:
+            print(f"✓ Successfully generated PDF: {output_path}")
+            if pdf_cache is not None:
+                try:
+                    pdf_cache.store(cache_key, output_path)
+                except OSError as e:
+                    print(f"Could not cache PDF build: {e}")
+            # Just return the filename part, not the full path
+            return output_filename
+        print(f"× LaTeX exited with status {result.returncode}")
+        error = f"pdflatex exited with status {result.returncode}"
+        # Save the log file for debugging
+        if result.log:
+            _write_text(output_dir / f"{output_filename}.log", result.log)
+            print(f"Saved LaTeX log to: {output_dir / f'{output_filename}.log'}")
+    
+    # Fallback to reportlab for simple PDF generation if pdflatex fails
+    return _generate_fallback_pdf(output_filename, f"LaTeX compilation failed: {error}", output_dir=output_dir, paper_content=fallback_content or {
+        "title": "PDF Generation Error",
+        "content": f"Failed to generate PDF with LaTeX: {error}",
+        "paper_content": latex_content[:500] + "..." if len(latex_content) > 500 else latex_content
+    })
 
-def _generate_fallback_pdf(output_filename: str, error_message: str, paper_content: Dict[str, Any]) -> str:
-    """Generate a simple PDF using ReportLab when LaTeX fails"""
+def _generate_fallback_pdf(
+    output_filename: str,
+    error_message: str,
+    paper_content: Dict[str, Any],
+    output_dir: Optional[Path] = None
+) -> str:
+    """Generate a simple PDF with the fast canvas renderer when LaTeX fails"""
+    output_dir = Path(output_dir) if output_dir is not None else job_output_dir()
     try:
-        from reportlab.pdfgen import canvas
-        from reportlab.lib.pagesizes import letter
-        from reportlab.lib.styles import getSampleStyleSheet
-        from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-        from reportlab.lib import colors
-        
-        output_path = OUTPUT_DIR / output_filename
+        output_path = output_dir / output_filename
         print(f"Generating fallback PDF at {output_path}")
-        
-        # Create the PDF document
-        doc = SimpleDocTemplate(str(output_path), pagesize=letter)
-        styles = getSampleStyleSheet()
-        flowables = []
-        
-        # Add title
-        title = paper_content.get("title", "Research Paper")
-        flowables.append(Paragraph(f"<b>{title}</b>", styles["Title"]))
-        flowables.append(Spacer(1, 12))
-        
-        # Add error message
-        flowables.append(Paragraph("<b>Error:</b>", styles["Heading1"]))
-        flowables.append(Paragraph(error_message, styles["Normal"]))
-        flowables.append(Spacer(1, 12))
-        
-        # Check if we have more structured content
-        sections_to_include = [
-            "abstract", "introduction", "related_work", "methodology", 
-            "experiments", "results", "discussion", "conclusion", "references"
-        ]
-        
-        # Add a note about fallback mode
-        flowables.append(Paragraph("<b>Note:</b> This is a fallback PDF generated because the LaTeX template processing failed. The content below may be incomplete.", styles["Normal"]))
-        flowables.append(Spacer(1, 12))
-        
-        # Add sections from paper_content
-        for section in sections_to_include:
-            content = paper_content.get(section, "")
-            if content:
-                flowables.append(Paragraph(f"<b>{section.replace('_', ' ').title()}</b>", styles["Heading1"]))
-                flowables.append(Spacer(1, 6))
-                
-                if isinstance(content, dict):
-                    for k, v in content.items():
-                        flowables.append(Paragraph(f"<b>{k}:</b>", styles["Heading2"]))
-                        flowables.append(Paragraph(str(v), styles["Normal"]))
-                else:
-                    # Split long text into paragraphs
-                    paragraphs = str(content).split('\n\n')
-                    for para in paragraphs:
-                        if para.strip():
-                            flowables.append(Paragraph(para, styles["Normal"]))
-                            flowables.append(Spacer(1, 6))
-                
-                flowables.append(Spacer(1, 12))
-        
-        # Build the PDF
-        doc.build(flowables)
-        print(f"✓ Generated fallback PDF: {output_path}")
+        pages = render_fast_pdf(paper_content, output_path, notices=[
+            f"Error: {error_message}",
+            "Note: This is a fallback PDF generated because the LaTeX template processing failed. "
+            "The content below may be incomplete.",
+        ])
+        print(f"✓ Generated fallback PDF ({pages} pages): {output_path}")
         
         # Save the fallback content for debugging
-        with open(OUTPUT_DIR / f"{output_filename}.txt", 'w') as f:
-            f.write(f"Fallback PDF content for {title}\n\n")
-            f.write(f"Error: {error_message}\n\n")
-            for section in sections_to_include:
-                content = paper_content.get(section, "")
-                if content:
-                    f.write(f"## {section.upper()}\n\n")
-                    f.write(f"{content}\n\n")
+        title = paper_content.get("title", "Research Paper")
+        lines = [f"Fallback PDF content for {title}\n\n", f"Error: {error_message}\n\n"]
+        for section, content in iter_sections(paper_content):
+            lines.append(f"## {section.upper()}\n\n")
+            lines.append(f"{content}\n\n")
+        _write_text(output_dir / f"{output_filename}.txt", "".join(lines))
         
         # Return just the filename part
         return output_filename
@@ -182,11 +209,12 @@ def _generate_fallback_pdf(output_filename: str, error_message: str, paper_conte
         traceback.print_exc()
         # Create an extremely simple text file as absolute last resort
         try:
-            with open(OUTPUT_DIR / output_filename, 'w') as f:
-                f.write(f"ERROR: Failed to generate PDF\n\n")
-                f.write(f"Error message: {error_message}\n\n")
-                f.write("Paper content:\n")
-                f.write(str(paper_content)[:1000])
+            _write_text(
+                output_dir / output_filename,
+                f"ERROR: Failed to generate PDF\n\n"
+                f"Error message: {error_message}\n\n"
+                "Paper content:\n" + str(paper_content)[:1000]
+            )
             return output_filename
         except:
             # If all else fails, return the error
@@ -194,30 +222,54 @@ def _generate_fallback_pdf(output_filename: str, error_message: str, paper_conte
 
 def paper_to_pdf(
     paper_content: Dict[str, Any],
-    template_name: str = "paper_template.tex",
-    output_filename: str = "research_paper.pdf"
+    template_name: str = "",
+    output_filename: str = "research_paper.pdf",
+    tool_context: Optional[ToolContext] = None
 ) -> str:
     """
     Converts structured paper content to PDF using a LaTeX template.
     
     Args:
         paper_content: Dictionary containing paper sections and metadata
-        template_name: Name of the template to use
+        template_name: Paper style: "ieee", "acm" or "arxiv" (empty for the configured default)
         output_filename: Name for the output PDF file
         
     Returns:
         String containing the filename of the generated PDF
     """
+    renderer = tool_context.state.get(RENDERER_STATE_KEY) if tool_context is not None else None
+    return render_paper(paper_content, template_name, output_filename, _context_output_dir(tool_context), renderer)
+
+
+def render_paper(
+    paper_content: Dict[str, Any],
+    template_name: Optional[str] = None,
+    output_filename: str = "research_paper.pdf",
+    output_dir: Optional[Path] = None,
+    renderer: Optional[str] = None
+) -> str:
+    """
+    Render paper content into a PDF in ``output_dir`` (default: OUTPUT_DIR).
+    
+    ``renderer`` (default: paper.renderer) selects LaTeX or the fast canvas
+    renderer, which skips the template and pdflatex entirely.
+    
+    Returns:
+        The (sanitized) filename of the generated PDF
+    """
+    output_dir = Path(output_dir) if output_dir is not None else job_output_dir()
+    output_filename = safe_filename(output_filename)
+    template_name = resolve_template(template_name)
+    renderer = renderer or get_config()["paper"]["renderer"]
     print(f"Starting paper_to_pdf generation for {output_filename}")
-    print(f"Template: {template_name}")
+    print(f"Template: {template_name}, renderer: {renderer}")
     print(f"Content keys: {', '.join(paper_content.keys())}")
     
     # Save the raw input for debugging
-    debug_path = OUTPUT_DIR / f"{output_filename}.input.json"
+    debug_path = output_dir / f"{output_filename}.input.json"
     try:
         import json
-        with open(debug_path, 'w') as f:
-            json.dump(paper_content, f, indent=2)
+        _write_text(debug_path, json.dumps(paper_content, indent=2))
         print(f"Saved input content to: {debug_path}")
     except:
         print("Could not save input JSON for debugging")
@@ -245,13 +297,20 @@ def paper_to_pdf(
     full_paper_content = {**default_content, **paper_content}
     
     try:
+        if renderer == "fast":
+            pages = render_fast_pdf(full_paper_content, output_dir / output_filename)
+            print(f"✓ Rendered {pages} pages with the fast renderer: {output_dir / output_filename}")
+            return output_filename
+        
         # Check for the template file
-        template_path = ROOT_DIR / "templates" / template_name
+        template_path = TEMPLATES_DIR / template_name
         if not os.path.exists(template_path):
             print(f"Template file not found at: {template_path}")
             # Check if we need to generate a simple template
-            with open(OUTPUT_DIR / f"{output_filename}.template-missing.log", 'w') as f:
-                f.write(f"Template {template_name} not found at {template_path}\n")
+            _write_text(
+                output_dir / f"{output_filename}.template-missing.log",
+                f"Template {template_name} not found at {template_path}\n"
+            )
             raise FileNotFoundError(f"Template file not found: {template_path}")
             
         # Render the template with the paper content
@@ -259,7 +318,13 @@ def paper_to_pdf(
         latex_content = render_template(template_name, full_paper_content)
         
         # Generate PDF from the rendered LaTeX
-        return tex_to_pdf(latex_content, output_filename)
+        return compile_latex(
+            latex_content,
+            output_filename,
+            output_dir,
+            template_version(template_name),
+            fallback_content=full_paper_content
+        )
         
     except Exception as e:
         print(f"Error during paper_to_pdf: {e}")
@@ -269,5 +334,6 @@ def paper_to_pdf(
         return _generate_fallback_pdf(
             output_filename, 
             f"Error rendering template: {e}", 
-            paper_content=paper_content
+            paper_content=paper_content,
+            output_dir=output_dir
         )
\ No newline at end of file
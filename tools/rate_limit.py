@@ -0,0 +1,309 @@
+"""Process-wide request pacing and failure handling for external literature APIs.
+
+Every upstream (``tools.<source>`` in the config) gets one token bucket that
+all jobs share. The bucket is kept in its GCRA form: the state is a single
+"theoretical arrival time". Each caller reserves the next free slot under a
+lock and then waits for it outside the lock. Callers are therefore served
+in arrival order, and a burst of concurrent jobs is spread out instead of
+all of them retrying together. When ``tools.rate_limit.shared_dir`` is set,
+that state lives in a file under an ``flock``, so several server processes
+on one host share the same limit.
+
+``call_upstream`` wraps a request in the rest of the policy:
+- Throttling (429 or 503) pauses the shared bucket. The pause lasts for the
+  Retry-After time, or for a jittered exponential backoff when there is no
+  Retry-After, so every job backs off together.
+- Other transient failures retry after a backoff of their own.
+- Too many consecutive failed calls (each one has exhausted its retries),
+  or a Retry-After longer than ``backoff_max_seconds``, open a circuit breaker. While it is open,
+  calls fail immediately for a cooling-off period. After that, a single
+  probe request decides whether the breaker closes again.
+"""
+import asyncio
+import random
+import threading
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Tuple, TypeVar
+
+import aiohttp
+
+from callbacks.metrics import SEARCH_RETRIES
+from config import get_config
+from tools.http_client import HttpError
+
+try:
+    import fcntl
+except ImportError:  # Windows: buckets stay process-local
+    fcntl = None
+
+T = TypeVar("T")
+
+THROTTLED = {429, 503}
+RETRYABLE = THROTTLED | {500, 502, 504}
+
+
+class RateLimiter:
+    """Token bucket refilling one token every ``min_interval`` seconds, holding up to ``burst``."""
+
+    clock = staticmethod(time.monotonic)
+
+    def __init__(self, min_interval: float, burst: int = 1):
+        self.min_interval = min_interval
+        self.burst = max(1, burst)
+        self._lock = threading.Lock()
+        self._tat = 0.0
+
+    def _transact(self, update: Callable[[float, float], Tuple[float, Any]]) -> Any:
+        # update(tat, now) -> (new tat, result)
+        with self._lock:
+            self._tat, result = update(self._tat, self.clock())
+        return result
+
+    def reserve(self) -> float:
+        """Claim the next token and return how many seconds to wait for it."""
+        tolerance = (self.burst - 1) * self.min_interval
+
+        def update(tat: float, now: float) -> Tuple[float, float]:
+            start = max(now, tat - tolerance)
+            return max(tat, start) + self.min_interval, start - now
+        return self._transact(update)
+
+    def pause(self, seconds: float) -> None:
+        """Hand out no tokens for the next ``seconds`` (e.g. after a 429)."""
+        tolerance = (self.burst - 1) * self.min_interval
+        self._transact(lambda tat, now: (max(tat, now + seconds + tolerance), None))
+
+    def acquire(self) -> None:
+        """Block until the caller may issue its request."""
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self) -> None:
+        """Wait, without blocking the event loop, until the caller may issue its request."""
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class SharedRateLimiter(RateLimiter):
+    """Token bucket whose state is a file under ``flock``, shared by every process on the host."""
+
+    clock = staticmethod(time.time)
+
+    def __init__(self, path: Path, min_interval: float, burst: int = 1):
+        super().__init__(min_interval, burst)
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def _transact(self, update: Callable[[float, float], Tuple[float, Any]]) -> Any:
+        with self._lock, open(self.path, "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)  # Released when the file is closed
+            f.seek(0)
+            text = f.read().strip()
+            tat, result = update(float(text) if text else 0.0, self.clock())
+            f.seek(0)
+            f.truncate()
+            f.write(repr(tat))
+        return result
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling an upstream whose circuit breaker is open."""
+
+    def __init__(self, source: str, retry_in: float):
+        super().__init__(f"{source} is unavailable after repeated failures; retrying in {retry_in:.0f}s")
+        self.source = source
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """Fails fast after ``failure_threshold`` consecutive failed calls, for ``reset_seconds``."""
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, source: str, failure_threshold: int = 5, reset_seconds: float = 60.0):
+        self.source = source
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._open_until = 0.0
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state(time.monotonic())
+
+    def _state(self, now: float) -> str:
+        if self._failures < self.failure_threshold:
+            return self.CLOSED
+        return self.OPEN if now < self._open_until else self.HALF_OPEN
+
+    def check(self, retrying: bool = False) -> None:
+        """Let a call through, or raise ``CircuitOpenError``.
+
+        Once the cooling-off period is over, exactly one caller is let
+        through as a probe; the rest keep failing fast until it reports.
+
+        Args:
+            retrying: The call was let through before and is retrying; it
+                only stops if the breaker has opened since
+        """
+        with self._lock:
+            now = time.monotonic()
+            state = self._state(now)
+            if state == self.CLOSED or (retrying and state == self.HALF_OPEN):
+                return
+            if state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+            retry_in = max(0.0, self._open_until - now)
+        raise CircuitOpenError(self.source, retry_in)
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.failure_threshold:
+                # A failed probe starts a new cooling-off period
+                self._open_until = time.monotonic() + self.reset_seconds
+            self._probing = False
+
+    def trip(self, seconds: float) -> None:
+        """Open the breaker for at least ``seconds``, e.g. for a long Retry-After."""
+        with self._lock:
+            self._failures = max(self._failures, self.failure_threshold)
+            self._open_until = max(self._open_until, time.monotonic() + seconds)
+            self._probing = False
+
+    def release(self) -> None:
+        """End a probe that neither succeeded nor failed (e.g. a 404)."""
+        with self._lock:
+            self._probing = False
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Exponential backoff with full jitter for the given 0-based retry attempt."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def is_retryable(error: Exception) -> bool:
+    """Whether a failed request is worth repeating (throttling, 5xx, network)."""
+    if isinstance(error, HttpError):
+        return error.status in RETRYABLE
+    return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError, ConnectionError))
+
+
+def _settings(source: str) -> Dict[str, Any]:
+    tools = get_config()["tools"]
+    return {**tools["rate_limit"], **tools[source]}
+
+
+_limiters: Dict[str, Tuple[Tuple, RateLimiter]] = {}
+_breakers: Dict[str, Tuple[Tuple, CircuitBreaker]] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(source: str) -> RateLimiter:
+    """Return the shared limiter for a source configured under ``tools.<source>``.
+
+    The limiter is rebuilt when its settings change, so ``update_config``
+    takes effect for later calls.
+    """
+    settings = _settings(source)
+    shared_dir = settings.get("shared_dir") if fcntl is not None else None
+    key = (settings.get("min_interval_seconds", 0.0), settings.get("burst", 1), shared_dir)
+    with _limiters_lock:
+        cached = _limiters.get(source)
+        if cached is None or cached[0] != key:
+            interval, burst, _ = key
+            if shared_dir:
+                limiter = SharedRateLimiter(Path(shared_dir) / f"{source}.bucket", interval, burst)
+            else:
+                limiter = RateLimiter(interval, burst)
+            cached = _limiters[source] = (key, limiter)
+        return cached[1]
+
+
+def get_circuit_breaker(source: str) -> CircuitBreaker:
+    """Return the shared circuit breaker for a source.
+
+    Like the limiter, the breaker is rebuilt (closed) when its settings change.
+    """
+    settings = _settings(source)
+    key = (settings["breaker_failures"], settings["breaker_reset_seconds"])
+    with _limiters_lock:
+        cached = _breakers.get(source)
+        if cached is None or cached[0] != key:
+            cached = _breakers[source] = (key, CircuitBreaker(source, *key))
+        return cached[1]
+
+
+def circuit_states() -> Dict[str, str]:
+    """State of every circuit breaker created so far, by source."""
+    with _limiters_lock:
+        breakers = dict(_breakers)
+    return {source: breaker.state for source, (_, breaker) in breakers.items()}
+
+
+async def call_upstream(source: str, request: Callable[[], Awaitable[T]]) -> T:
+    """
+    Run ``request`` against an upstream under its rate limit, retries and breaker.
+
+    Args:
+        source: Upstream name, configured under ``tools.<source>``
+        request: Makes one attempt; called again for every retry
+
+    Raises:
+        CircuitOpenError: The upstream has been failing and is cooling off
+        HttpError: A non-retryable status, or the last retryable one
+    """
+    settings = _settings(source)
+    limiter = get_rate_limiter(source)
+    breaker = get_circuit_breaker(source)
+    max_retries = settings["max_retries"]
+    attempt = 0
+    while True:
+        breaker.check(retrying=attempt > 0)
+        await limiter.acquire_async()
+        try:
+            result = await request()
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
+        except Exception as e:
+            if not is_retryable(e):
+                breaker.release()
+                raise
+            delay = backoff_delay(attempt, settings["backoff_base_seconds"], settings["backoff_max_seconds"])
+            throttled = isinstance(e, HttpError) and e.status in THROTTLED
+            if throttled and e.retry_after is not None:
+                delay = e.retry_after
+            if delay > settings["backoff_max_seconds"]:
+                # Too long to hold a job; fail fast everywhere until then
+                breaker.trip(delay)
+                raise
+            if throttled:
+                # Everyone waits, not just this caller
+                limiter.pause(delay)
+            if attempt >= max_retries:
+                # The breaker counts failed calls, not attempts: one call's
+                # retries alone never open it
+                breaker.record_failure()
+                raise
+            attempt += 1
+            reason = f"http_{e.status}" if isinstance(e, HttpError) else type(e).__name__
+            SEARCH_RETRIES.inc(source=source, reason=reason)
+            print(f"{source} request failed ({e}); retry {attempt}/{max_retries} in {delay:.1f}s")
+            if not throttled:
+                await asyncio.sleep(delay)
+            continue
+        breaker.record_success()
+        return result
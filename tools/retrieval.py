@@ -0,0 +1,206 @@
+"""Custom ADK tool: pick the most relevant source papers for one outline section.
+
+Passing the full 50-paper list to every drafting call multiplies prompt
+tokens by the number of sections. The literature fan-out stores its result
+list in the job's session state; ``select_papers_func`` ranks that list
+against a section with BM25 over titles and abstracts and returns only the
+top-k papers. The index is built once per paper list, can keep growing while
+papers stream in, and is scored with vectorized NumPy operations.
+"""
+import re
+import threading
+from bisect import bisect_left
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from google.adk.tools import FunctionTool, ToolContext
+
+from config import get_config
+from tools.cache import make_key
+from tools.outline_utils import STOPWORDS
+
+# Session state key holding the job's literature list
+PAPERS_STATE_KEY = "literature_papers"
+
+_TOKEN = re.compile(r"[a-z][a-z0-9\-]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-case word tokens with stopwords removed."""
+    return [t for t in _TOKEN.findall((text or "").lower()) if t not in STOPWORDS]
+
+
+class BM25Index:
+    """Okapi BM25 over a growing list of documents.
+
+    Documents are kept as per-term postings, so ``add`` costs only the new
+    documents and a query only touches the postings of its own terms. A
+    document's text can be replaced with ``update`` (e.g. once a duplicate
+    search hit has filled in its abstract). Adding, updating and scoring may
+    happen from different threads, e.g. while literature results are still
+    streaming in.
+    """
+
+    def __init__(self, documents: Optional[List[str]] = None, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        # term -> (document ids, term frequencies)
+        self._postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        self._doc_len: List[int] = []
+        # Term counts of each document, to find its postings again on update
+        self._doc_terms: List[Counter] = []
+        self._lock = threading.Lock()
+        if documents:
+            self.add(documents)
+
+    def __len__(self) -> int:
+        return len(self._doc_len)
+
+    def add(self, documents: List[str]) -> None:
+        """Append documents to the index."""
+        tokenized = [Counter(tokenize(document)) for document in documents]
+        with self._lock:
+            for terms in tokenized:
+                doc = len(self._doc_len)
+                for term, count in terms.items():
+                    docs, tfs = self._postings.setdefault(term, ([], []))
+                    docs.append(doc)
+                    tfs.append(count)
+                self._doc_len.append(sum(terms.values()))
+                self._doc_terms.append(terms)
+
+    def update(self, doc: int, document: str) -> None:
+        """Replace the text of an indexed document, touching only its own postings."""
+        terms = Counter(tokenize(document))
+        with self._lock:
+            # Postings stay sorted by document id
+            for term in self._doc_terms[doc].keys() - terms.keys():
+                docs, tfs = self._postings[term]
+                i = bisect_left(docs, doc)
+                del docs[i], tfs[i]
+                if not docs:
+                    del self._postings[term]
+            for term, count in terms.items():
+                docs, tfs = self._postings.setdefault(term, ([], []))
+                i = bisect_left(docs, doc)
+                if i < len(docs) and docs[i] == doc:
+                    tfs[i] = count
+                else:
+                    docs.insert(i, doc)
+                    tfs.insert(i, count)
+            self._doc_len[doc] = sum(terms.values())
+            self._doc_terms[doc] = terms
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every document for the query."""
+        query_terms = Counter(tokenize(query))
+        with self._lock:
+            n_docs = len(self._doc_len)
+            doc_len = np.asarray(self._doc_len, dtype=np.float32)
+            postings = [
+                (count, np.asarray(docs[:], dtype=np.intp), np.asarray(tfs[:], dtype=np.float32))
+                for term, count in query_terms.items()
+                if term in self._postings
+                for docs, tfs in [self._postings[term]]
+            ]
+        scores = np.zeros(n_docs, dtype=np.float32)
+        if not n_docs:
+            return scores
+        avg_len = float(doc_len.mean()) or 1.0
+        for count, docs, tf in postings:
+            df = len(docs)
+            idf = np.float32(np.log1p((n_docs - df + 0.5) / (df + 0.5)))
+            norm = self.k1 * (1 - self.b + self.b * doc_len[docs] / avg_len)
+            scores[docs] += count * idf * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+
+    def top_k(self, query: str, k: int) -> List[int]:
+        """Indices of the k best-scoring documents, best first."""
+        scores = self.scores(query)
+        k = min(k, len(scores))
+        if k <= 0:
+            return []
+        best = np.argpartition(-scores, k - 1)[:k]
+        return [int(i) for i in best[np.argsort(-scores[best], kind="stable")]]
+
+
+def paper_document(paper: Dict[str, Any]) -> str:
+    """Text indexed for a paper; the title is repeated to weight it above the abstract."""
+    title = paper.get("title") or ""
+    abstract = paper.get("abstract") or paper.get("summary") or ""
+    return f"{title} {title} {abstract}"
+
+
+class PaperRetriever:
+    """Ranks a paper list against free-text section descriptions."""
+
+    def __init__(self, papers: List[Dict[str, Any]]):
+        settings = get_config()["tools"]["retrieval"]
+        self.papers = list(papers)
+        self.index = BM25Index([paper_document(p) for p in self.papers], k1=settings["k1"], b=settings["b"])
+
+    def top_k(self, query: str, k: int) -> List[Dict[str, Any]]:
+        """The k most relevant papers for the query, best first."""
+        return [self.papers[i] for i in self.index.top_k(query, k)]
+
+
+_retrievers: "OrderedDict[str, PaperRetriever]" = OrderedDict()
+_retrievers_lock = threading.Lock()
+_MAX_RETRIEVERS = 32
+
+
+def get_retriever(papers: List[Dict[str, Any]]) -> PaperRetriever:
+    """Return a retriever for this exact paper list, building it only once."""
+    key = make_key([(p.get("title"), p.get("arxiv_id"), p.get("doi")) for p in papers])
+    with _retrievers_lock:
+        retriever = _retrievers.get(key)
+        if retriever is not None:
+            _retrievers.move_to_end(key)
+            return retriever
+    retriever = PaperRetriever(papers)
+    with _retrievers_lock:
+        _retrievers[key] = retriever
+        while len(_retrievers) > _MAX_RETRIEVERS:
+            _retrievers.popitem(last=False)
+    return retriever
+
+
+def remember_papers(tool_context: Optional[ToolContext], papers: List[Dict[str, Any]]) -> None:
+    """Store the job's literature list in session state for later retrieval."""
+    if tool_context is not None:
+        tool_context.state[PAPERS_STATE_KEY] = papers
+
+
+def select_papers_func(
+    section_name: str,
+    section_outline: str = "",
+    k: int = 0,
+    tool_context: Optional[ToolContext] = None,
+) -> Dict[str, Any]:
+    """Select the source papers most relevant to one paper section.
+
+    Args:
+        section_name: Name of the section, e.g. "Related Work"
+        section_outline: The section's talking points from the outline
+        k: Number of papers to return (default: configured top_k)
+
+    Returns:
+        Dictionary with the selected "papers", or an "error" message if no
+        literature list has been gathered for this job yet
+    """
+    papers = tool_context.state.get(PAPERS_STATE_KEY) if tool_context is not None else None
+    if not papers:
+        return {
+            "status": "error",
+            "message": "No literature list stored for this job; pass the full source list to drafting instead.",
+        }
+    k = k or get_config()["tools"]["retrieval"]["top_k"]
+    selected = get_retriever(papers).top_k(f"{section_name} {section_outline}", k)
+    return {"status": "success", "section": section_name, "papers": selected}
+
+
+# Create the FunctionTool instance
+select_papers = FunctionTool(
+    func=select_papers_func,
+)
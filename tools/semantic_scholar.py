@@ -1,19 +1,35 @@
 """Custom ADK tool: search Semantic Scholar and return structured metadata."""
 from typing import List, Dict
-import semanticscholar as sch
 from google.adk.tools import FunctionTool
 
+from callbacks.metrics import SEARCH_DURATION
+from config import get_config
+from tools.http_client import get_http_client
+from tools.rate_limit import call_upstream
+
+FIELDS = "title,url,abstract,authors,year,citationCount,externalIds"
+
 def search_semantic_func(query: str, max_results: int = 10) -> List[Dict]:
     """Search Semantic Scholar for papers related to a query."""
-    client = sch.SemanticScholar()
-    results = client.search_paper(query, limit=max_results)
-    
+    return get_http_client().run(search_semantic_async(query, max_results))
+
+async def search_semantic_async(query: str, max_results: int = 10) -> List[Dict]:
+    """Search Semantic Scholar on the shared HTTP client's loop, with retries (see ``call_upstream``)."""
+    url = get_config()["tools"]["semantic_scholar"]["api_url"].rstrip("/") + "/graph/v1/paper/search"
+    params = {"query": query, "offset": 0, "limit": max_results, "fields": FIELDS}
+
+    async def request() -> Dict:
+        with SEARCH_DURATION.time(source="semantic_scholar"):
+            return await get_http_client().get_json(url, params)
+    response = await call_upstream("semantic_scholar", request)
+
     out = []
-    for paper in results:
+    for paper in (response.get('data') or [])[:max_results]:
         # Extract relevant information
-        authors = [author.get('name', '') for author in paper.get('authors', [])]
+        authors = [author.get('name', '') for author in paper.get('authors') or []]
         year = paper.get('year')
-        
+        external_ids = paper.get('externalIds') or {}
+
         out.append({
             "title": paper.get('title', ''),
             "url": paper.get('url', ''),
@@ -21,13 +37,15 @@ def search_semantic_func(query: str, max_results: int = 10) -> List[Dict]:
             "authors": authors,
             "year": year,
             "citation_count": paper.get('citationCount', 0),
+            "arxiv_id": external_ids.get('ArXiv', ''),
+            "doi": external_ids.get('DOI', ''),
         })
-    
-    return out 
+
+    return out
 
 # Create the FunctionTool instance
 search_semantic = FunctionTool(
     func=search_semantic_func, # Reverted 'function' back to 'func'
-    # name="search_semantic", 
+    # name="search_semantic",
     # description="Search Semantic Scholar for papers related to a query"
-)
\ No newline at end of file
+)
@@ -1,55 +1,142 @@
 """Utilities for working with LaTeX templates for paper generation."""
-import os
+import hashlib
+import re
+import threading
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 import jinja2
 
+from config import get_config
+
 # Get the base directory
 BASE_DIR = Path(__file__).parent.parent.absolute()
 TEMPLATES_DIR = BASE_DIR / "templates"
 
-def get_template(template_name: str = "paper_template.tex") -> jinja2.Template:
+_LATEX_SPECIALS = {
+    "\\": r"\textbackslash{}",
+    "&": r"\&",
+    "%": r"\%",
+    "$": r"\$",
+    "#": r"\#",
+    "_": r"\_",
+    "{": r"\{",
+    "}": r"\}",
+    "~": r"\textasciitilde{}",
+    "^": r"\textasciicircum{}",
+}
+_LATEX_SPECIALS_RE = re.compile("|".join(re.escape(c) for c in _LATEX_SPECIALS))
+
+def escape_latex(text: str) -> str:
     """
-    Load a LaTeX template by name.
+    Escape characters that have special meaning in LaTeX.
     
     Args:
-        template_name: Name of the template file
+        text: Plain text, e.g. drafted section content
         
     Returns:
-        Jinja2 Template object
+        Text safe to insert into a LaTeX document body
+    """
+    return _LATEX_SPECIALS_RE.sub(lambda m: _LATEX_SPECIALS[m.group()], text)
+
+# Paper styles selectable by name, mapped to their template files
+TEMPLATES: Dict[str, str] = {
+    "ieee": "paper_template.tex",
+    "acm": "acm_template.tex",
+    "arxiv": "arxiv_template.tex",
+}
+DEFAULT_TEMPLATE = "ieee"
+
+_environment: Optional[jinja2.Environment] = None
+_environment_lock = threading.Lock()
+
+
+def _get_environment() -> jinja2.Environment:
+    """Return the shared Jinja2 environment, creating it on first use."""
+    global _environment
+    with _environment_lock:
+        if _environment is None:
+            _environment = jinja2.Environment(
+                loader=jinja2.FileSystemLoader(TEMPLATES_DIR),
+                block_start_string='\\BLOCK{',
+                block_end_string='}',
+                variable_start_string='{{',
+                variable_end_string='}}',
+                comment_start_string='\\#{',
+                comment_end_string='}',
+                line_statement_prefix='%%',
+                line_comment_prefix='%#',
+                trim_blocks=True,
+                autoescape=False,
+                # Compiled templates are cached; with auto_reload a template is
+                # recompiled when its file's mtime changes (edit-and-rerun in dev)
+                auto_reload=get_config()["paper"]["template_auto_reload"],
+                cache_size=-1,
+            )
+        return _environment
+
+
+def reset_template_cache() -> None:
+    """Drop every compiled template, e.g. after changing the template settings."""
+    global _environment
+    with _environment_lock:
+        _environment = None
+
+
+def resolve_template(template_name: Optional[str] = None) -> str:
     """
-    template_path = TEMPLATES_DIR / template_name
+    Map a style name ("ieee", "acm", "arxiv") to its template file.
     
-    if not template_path.exists():
-        raise FileNotFoundError(f"Template {template_name} not found at {template_path}")
+    Args:
+        template_name: Style name or template filename (default: paper.template)
+        
+    Returns:
+        Template filename relative to the templates directory
+    """
+    template_name = template_name or get_config()["paper"]["template"]
+    return TEMPLATES.get(template_name.lower(), template_name)
+
+
+def available_templates() -> List[str]:
+    """Return the names of the templates that can be selected."""
+    return sorted(TEMPLATES)
+
+
+def template_version(template_name: Optional[str] = None) -> str:
+    """Return a short hash of a template's source; it changes whenever the file does."""
+    source = (TEMPLATES_DIR / resolve_template(template_name)).read_bytes()
+    return hashlib.sha256(source).hexdigest()[:16]
+
+
+def get_template(template_name: Optional[str] = None) -> jinja2.Template:
+    """
+    Load a LaTeX template by style name or filename.
     
-    # Create Jinja2 environment
-    env = jinja2.Environment(
-        loader=jinja2.FileSystemLoader(TEMPLATES_DIR),
-        block_start_string='\\BLOCK{',
-        block_end_string='}',
-        variable_start_string='{{',
-        variable_end_string='}}',
-        comment_start_string='\\#{',
-        comment_end_string='}',
-        line_statement_prefix='%%',
-        line_comment_prefix='%#',
-        trim_blocks=True,
-        autoescape=False,
-    )
+    Templates are compiled once and served from the shared environment's cache.
     
-    return env.get_template(template_name)
+    Args:
+        template_name: Style name (see TEMPLATES) or template filename
+        
+    Returns:
+        Jinja2 Template object
+    """
+    template_file = resolve_template(template_name)
+    try:
+        return _get_environment().get_template(template_file)
+    except jinja2.TemplateNotFound:
+        raise FileNotFoundError(
+            f"Template {template_name} not found at {TEMPLATES_DIR / template_file}"
+        ) from None
 
-def render_template(template_name: str, context: Dict[str, Any]) -> str:
+def render_template(template_name: Optional[str], context: Dict[str, Any]) -> str:
     """
     Render a template with the given context.
     
     Args:
-        template_name: Name of the template file
+        template_name: Style name or template filename (None for the default)
         context: Dictionary of variables to render in the template
         
     Returns:
         Rendered template as a string
     """
     template = get_template(template_name)
-    return template.render(**context) 
\ No newline at end of file
+    return template.render(**context)